@@ -164,6 +164,15 @@ else:
         }
     }
 
+# Shared by every worker on the server: the service detail cache is evicted and the other caches are versioned
+# through it. The default database cache needs `python manage.py createcachetable` once. Local runs and tests are
+# a single process and keep the in-memory cache.
+CACHES = {
+    'default': env.cache(
+        'CACHE_URL', default='dbcache://django_cache' if ENVIRONMENT == 'server' else 'locmemcache://'
+    )
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -0,0 +1,120 @@
+import random
+import uuid
+
+from django.core.cache import cache
+
+from src.core.helpers import AbsoluteURLRequest
+from src.services.services.api.filters import DEFAULT_SEARCH_RADIUS_KM
+from src.services.services.bll import filter_services_by_distance, get_recommended_service_ids
+from src.services.services.models import Service, ServiceCategory, FavoriteService
+from .serializers import ServiceCategorySerializer, ServiceHomeSerializer
+
+HOME_FEED_VERSION_KEY = 'home-feed:version'
+HOME_FEED_TIMEOUT = 60 * 60
+HOME_FEED_SECTIONS = ('top_categories', 'my_interest', 'popular_services')
+HOME_FEED_SIZES = {'top_categories': 10, 'my_interest': 10, 'popular_services': 5, 'for_you': 10, 'near_you': 10}
+
+
+def serialize_services(services, request):
+    return ServiceHomeSerializer(services, many=True, context={'request': request}).data
+
+
+def get_home_services():
+    return ServiceHomeSerializer.setup_eager_loading(Service.objects.filter(is_active=True))
+
+
+def sample_service_ids(size):
+    """
+    Picks up to `size` distinct active services uniformly at random from the list of their ids, read in one query
+    without sorting the table. Only the feed build calls it, not the requests.
+    """
+    service_ids = list(Service.objects.filter(is_active=True).order_by().values_list('pk', flat=True))
+    return random.sample(service_ids, min(size, len(service_ids)))
+
+
+""" ---------------------Shared Sections--------------------- """
+
+
+def build_home_feed():
+    """Serializes the shared home sections and publishes them under a new cache version"""
+    request = AbsoluteURLRequest()
+    services = get_home_services()
+
+    sample_ids = sample_service_ids(HOME_FEED_SIZES['my_interest'])
+    sample = sorted(services.filter(pk__in=sample_ids), key=lambda service: sample_ids.index(service.pk))
+    categories = ServiceCategory.objects.filter(is_active=True)[:HOME_FEED_SIZES['top_categories']]
+
+    sections = {
+        'top_categories': ServiceCategorySerializer(categories, many=True, context={'request': request}).data,
+        'my_interest': serialize_services(sample, request),
+        'popular_services': serialize_services(
+            services.order_by('-rank_score', 'id')[:HOME_FEED_SIZES['popular_services']], request
+        ),
+    }
+
+    version = uuid.uuid4().hex
+    cache.set_many({f'home-feed:{version}:{name}': section for name, section in sections.items()}, HOME_FEED_TIMEOUT)
+    cache.set(HOME_FEED_VERSION_KEY, version, None)
+    return sections
+
+
+def get_home_feed():
+    """The shared home sections from the current cache version, rebuilt when missing or expired"""
+    version = cache.get(HOME_FEED_VERSION_KEY)
+    if version:
+        cached = cache.get_many([f'home-feed:{version}:{name}' for name in HOME_FEED_SECTIONS])
+        if len(cached) == len(HOME_FEED_SECTIONS):
+            return {name: cached[f'home-feed:{version}:{name}'] for name in HOME_FEED_SECTIONS}
+    return build_home_feed()
+
+
+""" ---------------------Personalized Sections--------------------- """
+
+
+def get_for_you_services(user):
+    """
+    Services recommended from the user's favorites and requests, or without recommendations yet, the best rated
+    services in the categories the user favorited. The user's own services are left out.
+    """
+    service_ids = get_recommended_service_ids(user, HOME_FEED_SIZES['for_you'])
+    if service_ids:
+        services = get_home_services().filter(pk__in=service_ids)
+        return sorted(services, key=lambda service: service_ids.index(service.pk))
+
+    category_ids = (
+        FavoriteService.objects.filter(user=user, service__category__isnull=False)
+        .order_by('-created_at').values_list('service__category_id', flat=True)[:20]
+    )
+    return (
+        get_home_services().filter(category_id__in=list(category_ids)).exclude(provider=user)
+        .order_by('-rank_score', 'id')[:HOME_FEED_SIZES['for_you']]
+    )
+
+
+def get_near_you_services(user):
+    """Nearest services to the user's address"""
+    address = getattr(user, 'address', None)
+    if address is None or address.latitude is None or address.longitude is None:
+        return []
+
+    services = filter_services_by_distance(
+        get_home_services(), float(address.latitude), float(address.longitude), DEFAULT_SEARCH_RADIUS_KM
+    )
+    return services.order_by('distance', 'id')[:HOME_FEED_SIZES['near_you']]
+
+
+def get_home_payload(request):
+    """
+    The home sections: the cached shared ones plus, for signed in users, `for_you` and `near_you` serialized for
+    them. Sections without personal results fall back to the shared sample.
+    """
+    payload = dict(get_home_feed())
+    payload['for_you'] = payload['near_you'] = payload['my_interest']
+
+    user = request.user
+    if user.is_authenticated:
+        for name, services in (('for_you', get_for_you_services(user)), ('near_you', get_near_you_services(user))):
+            services = list(services)
+            if services:
+                payload[name] = serialize_services(services, request)
+    return payload
@@ -0,0 +1,62 @@
+import gzip
+import hashlib
+import json
+
+from cities_light.models import Region, SubRegion
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.utils.encoders import JSONEncoder
+
+from src.core.cache import bump_cache_version, get_cache_version
+from src.core.models import Country, Language
+from src.services.services.models import ServiceCategory
+from .serializers import CountrySerializer, LanguageSerializer, RegionSerializer, ServiceCategorySerializer, \
+    SubRegionSerializer
+
+REFERENCE_BUNDLE_CACHE = 'reference-bundle'
+REFERENCE_BUNDLE_TIMEOUT = 60 * 60 * 24
+
+
+def get_reference_bundle_key(version):
+    return f'{REFERENCE_BUNDLE_CACHE}:{version}'
+
+
+def build_reference_bundle(version=None):
+    """
+    Serializes the helper reference data once into JSON bytes, a gzipped copy and a content hash used as ETag,
+    and stores them in the cache under the generation read before the data. A rebuild overlapping a change of the
+    source models lands in the generation the change left behind, and is never served.
+    """
+    if version is None:
+        version = get_cache_version(REFERENCE_BUNDLE_CACHE)
+    data = {
+        'country': CountrySerializer(Country.objects.all(), many=True).data,
+        'category': ServiceCategorySerializer(ServiceCategory.objects.all(), many=True).data,
+        'sub_region': SubRegionSerializer(
+            SubRegion.objects.select_related('region__country'), many=True
+        ).data,
+        'province': RegionSerializer(Region.objects.select_related('country'), many=True).data,
+        'language': LanguageSerializer(Language.objects.all(), many=True).data,
+    }
+    body = json.dumps(data, cls=JSONEncoder, separators=(',', ':')).encode('utf-8')
+    bundle = {
+        'etag': hashlib.sha256(body).hexdigest()[:32],
+        'body': body,
+        'gzip': gzip.compress(body, mtime=0),
+    }
+    cache.set(get_reference_bundle_key(version), bundle, REFERENCE_BUNDLE_TIMEOUT)
+    return bundle
+
+
+def get_reference_bundle():
+    version = get_cache_version(REFERENCE_BUNDLE_CACHE)
+    return cache.get(get_reference_bundle_key(version)) or build_reference_bundle(version)
+
+
+def invalidate_reference_bundle():
+    """
+    Moves the bundle to a new generation, the next request rebuilds it with a new ETag. Bumped again on commit, so
+    a rebuild that read the rows before the commit isn't served either.
+    """
+    bump_cache_version(REFERENCE_BUNDLE_CACHE)
+    transaction.on_commit(lambda: bump_cache_version(REFERENCE_BUNDLE_CACHE))
@@ -3,9 +3,10 @@ from cities_light.models import SubRegion, Region, Country
 from rest_framework import serializers
 from src.core.models import Language, Country
 from src.core.models import Country as GlobalCountry
+from src.core.prefetch import EagerLoadingSerializerMixin, prefixed_prefetch
 from src.services.services.api.serializers import UserProfileSerializer
 from src.services.services.models import ServiceCategory, Service, \
-    ServiceCurrency
+    ServiceCurrency, ServiceAvailability
 
 """ ---------------------Helper Serializers--------------------- """
 
@@ -52,9 +53,10 @@ class ServiceCategoryListSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'parent', 'thumbnail', 'description', 'is_active', 'subcategories']
 
     def get_subcategories(self, obj):
-        if obj.subcategories.exists():
-            return ServiceCategorySerializer(obj.subcategories.all(), many=True, context=self.context).data
-        return []
+        children = getattr(obj, 'tree_children', None)
+        if children is None:
+            children = obj.subcategories.filter(is_active=True)
+        return ServiceCategoryListSerializer(children, many=True, context=self.context).data
 
 
 """ ---------------------Service Serializers--------------------- """
@@ -72,7 +74,7 @@ class ServiceCurrentSerializer(serializers.ModelSerializer):
         fields = ['id', 'name']
 
 
-class ServiceHomeSerializer(serializers.ModelSerializer):
+class ServiceHomeSerializer(EagerLoadingSerializerMixin, serializers.ModelSerializer):
     provider = UserProfileSerializer()
     category = serializers.SerializerMethodField()
     rating = serializers.SerializerMethodField()
@@ -85,6 +87,19 @@ class ServiceHomeSerializer(serializers.ModelSerializer):
                   'price_type', 'price', 'discount', 'currency', 'rating',
                   'is_active']
 
+    select_related_fields = (
+        'provider__address__country', 'provider__service_provider_profile', 'category', 'currency'
+    )
+
+    @classmethod
+    def get_prefetch_related(cls, prefix=''):
+        return [
+            prefixed_prefetch(
+                prefix, 'availability_slots', queryset=ServiceAvailability.objects.filter(is_active=True),
+                to_attr='active_availability_slots'
+            ),
+        ]
+
     def get_rating(self, obj):
         return obj.get_total_rating()
 
@@ -92,7 +107,9 @@ class ServiceHomeSerializer(serializers.ModelSerializer):
         return obj.category.name if obj.category else None
 
     def get_schedule(self, obj):
-        schedules = obj.get_service_schedule()
+        schedules = getattr(obj, 'active_availability_slots', None)
+        if schedules is None:
+            schedules = obj.get_service_schedule()
         data = []
         for schedule in schedules:
             data.append({
@@ -1,80 +1,79 @@
 # views.py
-from cities_light.models import Region, SubRegion
-from django.db import models
-from django.db.models import Avg, Count
+import uuid
+
+from django.http import HttpResponse
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import ListAPIView
-from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, AllowAny
+from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from src.services.services.models import Service, ServiceCategory
-from .serializers import (
-    ServiceHomeListSerializer,
-    ServiceCategorySerializer, SubRegionSerializer, RegionSerializer, LanguageSerializer, CountrySerializer,
-    ServiceCategoryListSerializer
-)
-from ...core.models import Language, Country
+from src.services.services.bll import get_category_tree
+from .feed import get_home_payload
+from .reference import get_reference_bundle
+from .serializers import ServiceHomeListSerializer, ServiceCategoryListSerializer
 
 
 class HomeAPIView(ListAPIView):
+    """
+    Home sections. The shared ones are serialized ahead and read from the cache (see feed.build_home_feed), only
+    `for_you` and `near_you` are serialized per signed in user. serializer_class describes the payload.
+    """
     serializer_class = ServiceHomeListSerializer
     permission_classes = [AllowAny]
 
-    def get_queryset(self):
-        popular_services = (
-            Service.objects.filter(is_active=True)
-            .annotate(
-                average_rating=Avg('reviews__rating', filter=models.Q(reviews__is_active=True)),
-                reviews_count=Count('reviews', filter=models.Q(reviews__is_active=True))
-            )
-            .order_by('-average_rating')[:5]
-        )
-        my_interest = Service.objects.filter(is_active=True).order_by('?')[:10]
-        top_categories = ServiceCategory.objects.filter(is_active=True)[:10]
-
-        data = {
-            'top_categories': top_categories,
-            'my_interest': my_interest,
-            'popular_services': popular_services,
-            'for_you': my_interest,
-            'near_you': my_interest,
-
-        }
-        return data
-
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset)
-        return Response(serializer.data)
+        return Response(get_home_payload(request))
 
 
 """-------------------Helper-------------------"""
 
 
 class ServiceCategoryListAPIView(ListAPIView):
+    """Active category tree from the in-process cache, or the subtree below `?parent=<id>`"""
     serializer_class = ServiceCategoryListSerializer
     permission_classes = [AllowAny]
 
     def get_queryset(self):
-        return ServiceCategory.objects.filter(is_active=True).order_by('name')
+        tree = get_category_tree()
+        parent = self.request.query_params.get('parent')
+        if not parent:
+            return tree.roots
+        try:
+            category = tree.nodes.get(uuid.UUID(parent))
+        except ValueError:
+            raise ValidationError({'parent': 'Must be a valid UUID.'})
+        return category.tree_children if category else []
 
 
 class CategorySubRegionProvinceLanguageApiView(APIView):
+    """
+    Reference data bundle, prebuilt and cached (see reference.py). Served gzipped when the client accepts it, and
+    with an ETag so clients holding the current version get an empty 304.
+    """
     permission_classes = [IsAuthenticatedOrReadOnly]
 
     def get(self, request, *args, **kwargs):
-        category = ServiceCategory.objects.all()
-        sub_region = SubRegion.objects.all()
-        province = Region.objects.all()
-        language = Language.objects.all()
-        country = Country.objects.all()
-        context = {
-            'country': CountrySerializer(country, many=True).data,
-            'category': ServiceCategorySerializer(category, many=True).data,
-            'sub_region': SubRegionSerializer(sub_region, many=True).data,
-            'province': RegionSerializer(province, many=True).data,
-            'language': LanguageSerializer(language, many=True).data
-
-        }
-        return Response(data=context, status=status.HTTP_200_OK)
+        bundle = get_reference_bundle()
+        etag = f'"{bundle["etag"]}"'
+
+        if_none_match = self.get_if_none_match(request)
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        elif 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            response = HttpResponse(bundle['gzip'], content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(bundle['body'], content_type='application/json')
+
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+    @staticmethod
+    def get_if_none_match(request):
+        values = request.META.get('HTTP_IF_NONE_MATCH', '')
+        tags = {value.strip() for value in values.split(',') if value.strip()}
+        return {tag[2:] if tag.startswith('W/') else tag for tag in tags}
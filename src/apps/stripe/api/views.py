@@ -8,6 +8,7 @@ from stripe import AuthenticationError
 from src.apps.stripe.api.serializers import TransferSerializer, PayoutSerializer, ConnectWalletSerializer
 from src.apps.stripe.bll import stripe_connect_account_create, stripe_connect_account_link, get_connect_wallet_balance
 from src.apps.stripe.models import Transfer, Payout
+from src.core.pagination import CreatedCursorPagination
 
 
 class ConnectWalletCreateAPIView(APIView):
@@ -104,6 +105,7 @@ class TransferListAPIView(ListAPIView):
     model = Transfer
     serializer_class = TransferSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedCursorPagination
 
     def get_queryset(self):
         return Transfer.objects.filter(user=self.request.user)
@@ -116,6 +118,7 @@ class PayoutListAPIView(ListAPIView):
     model = Payout
     serializer_class = PayoutSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedCursorPagination
 
     def get_queryset(self):
         return Payout.objects.filter(user=self.request.user)
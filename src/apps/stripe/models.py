@@ -194,6 +194,9 @@ class Transfer(models.Model):
         get_latest_by = "created"
         ordering = ["-created"]
         verbose_name_plural = "Transfers"
+        indexes = [
+            models.Index(fields=['user', 'created', 'id'], name='transfer_user_created_idx')
+        ]
 
     def __str__(self):
         return f"Transfer {self.id}"
@@ -268,6 +271,9 @@ class Payout(models.Model):
 
     class Meta:
         ordering = ["-created"]
+        indexes = [
+            models.Index(fields=['user', 'created', 'id'], name='payout_user_created_idx')
+        ]
 
     def __str__(self):
         return f"Payout {self.id}"
@@ -0,0 +1,43 @@
+import time
+
+from django.core.cache import cache
+
+
+def get_cache_version(name):
+    """
+    Current generation of a named group of cache entries, used as part of their keys. A missing counter (first use,
+    eviction, flush) starts from the current time, so it never repeats a generation handed out before.
+    """
+    version = cache.get(f'version:{name}')
+    if version is None:
+        cache.add(f'version:{name}', time.time_ns(), None)
+        version = cache.get(f'version:{name}')
+    return version
+
+
+def bump_cache_version(name):
+    """Moves a named group of cache entries to a new generation, orphaning the entries of the previous one"""
+    try:
+        return cache.incr(f'version:{name}')
+    except ValueError:
+        return get_cache_version(name)
+
+
+def record_cache_access(name, hit):
+    """Counts a hit or a miss of a named cache"""
+    key = f'stats:{name}:{"hits" if hit else "misses"}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def get_cache_stats(name):
+    counts = cache.get_many([f'stats:{name}:hits', f'stats:{name}:misses'])
+    hits, misses = counts.get(f'stats:{name}:hits', 0), counts.get(f'stats:{name}:misses', 0)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+    }
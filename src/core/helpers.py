@@ -1,7 +1,16 @@
 from datetime import datetime
+from urllib.parse import urljoin
 
 import pytz
+from django.conf import settings
 
 
 def get_current_datetime():
     return datetime.now(pytz.utc)
+
+
+class AbsoluteURLRequest:
+    """Stands in for a request while rendering outside of one, so file fields still get absolute URLs"""
+
+    def build_absolute_uri(self, location=None):
+        return urljoin(settings.BASE_URL, location or '/')
@@ -0,0 +1,115 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from src.core.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_TTL = timedelta(hours=24)
+
+
+class IdempotencyConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'A request with this Idempotency-Key is still being processed, retry later.'
+    default_code = 'idempotency_conflict'
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used with a different request body.'
+    default_code = 'idempotency_key_reused'
+
+
+def get_request_fingerprint(request):
+    """sha256 of the parsed request data, so the same payload matches whatever its key order"""
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = {key: values for key, values in data.lists()}
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def get_idempotency_expiry():
+    return timezone.now() - IDEMPOTENCY_TTL
+
+
+def purge_expired_idempotency_keys():
+    """Deletes the keys older than IDEMPOTENCY_TTL, returns how many"""
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=get_idempotency_expiry()).delete()
+    return deleted
+
+
+class IdempotencyStore:
+    """
+    Responses of the requests made with an idempotency key, one IdempotencyKey row per key scoped to the user,
+    method and path, so every worker sees them. A key counts for IDEMPOTENCY_TTL, older rows are ignored and purged
+    by the purge_idempotency_keys command.
+    """
+
+    def __init__(self, request, key):
+        self.scope = hashlib.sha256(f'{request.user.pk}:{request.method}:{request.path}:{key}'.encode()).hexdigest()
+        self.fingerprint = get_request_fingerprint(request)
+
+    def get(self):
+        return IdempotencyKey.objects.filter(scope=self.scope, created_at__gte=get_idempotency_expiry()).first()
+
+    def claim(self):
+        """
+        Inserts the key without a response. The unique scope makes a concurrent insert of the same key wait for this
+        transaction and then fail, so only one request runs the create. Returns False when the key is taken.
+        """
+        IdempotencyKey.objects.filter(scope=self.scope, created_at__lt=get_idempotency_expiry()).delete()
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(scope=self.scope, fingerprint=self.fingerprint)
+        except IntegrityError:
+            return False
+        return True
+
+    def save(self, response):
+        IdempotencyKey.objects.filter(scope=self.scope).update(status_code=response.status_code, response=response.data)
+
+    def release(self):
+        IdempotencyKey.objects.filter(scope=self.scope).delete()
+
+
+class IdempotentCreateMixin:
+    """
+    Makes POST on a create view safe to retry. With an Idempotency-Key header, the first response is recorded in the
+    transaction of the create and later requests with the same key get it back, marked with Idempotent-Replayed,
+    without running the create again. Only successful responses are recorded, so a failed request can be retried
+    with the same key.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return super().create(request, *args, **kwargs)
+        if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise ValidationError({IDEMPOTENCY_HEADER: f'Must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters.'})
+
+        store = IdempotencyStore(request, key)
+        stored = store.get()
+        if stored is None:
+            with transaction.atomic():
+                if store.claim():
+                    response = super().create(request, *args, **kwargs)
+                    if status.is_success(response.status_code):
+                        store.save(response)
+                    else:
+                        store.release()
+                    return response
+            # Another request holding the key committed in the meantime, read what it stored
+            stored = store.get()
+
+        if stored is None or stored.status_code is None:
+            raise IdempotencyConflict()
+        if stored.fingerprint != store.fingerprint:
+            raise IdempotencyKeyReused()
+        return Response(stored.response, status=stored.status_code, headers={'Idempotent-Replayed': 'true'})
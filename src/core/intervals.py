@@ -0,0 +1,104 @@
+"""Helpers for half-open [start, end) intervals over any ordered values (minutes, datetimes, ...)."""
+
+
+def merge_intervals(intervals):
+    """Sorts the intervals and merges the overlapping or touching ones"""
+    merged = []
+    for start, end in sorted(intervals):
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def find_overlap(intervals):
+    """
+    Returns the first two overlapping items of [(start, end, item)], or None. Touching intervals don't overlap.
+    """
+    previous = None
+    for start, end, item in sorted(intervals, key=lambda interval: (interval[0], interval[1])):
+        if previous is not None and start < previous[1]:
+            return previous[2], item
+        if previous is None or end > previous[1]:
+            previous = (start, end, item)
+    return None
+
+
+def subtract_intervals(intervals, removed):
+    """Parts of the merged `intervals` not covered by any of the `removed` intervals"""
+    removed = merge_intervals(removed)
+    result = []
+    index = 0
+    for start, end in merge_intervals(intervals):
+        while index < len(removed) and removed[index][1] <= start:
+            index += 1
+        cursor = start
+        position = index
+        while position < len(removed) and removed[position][0] < end:
+            removed_start, removed_end = removed[position]
+            if removed_start > cursor:
+                result.append((cursor, removed_start))
+            cursor = max(cursor, removed_end)
+            position += 1
+        if cursor < end:
+            result.append((cursor, end))
+    return result
+
+
+class IntervalTree:
+    """
+    Static interval tree over [(start, end, item)]: intervals sorted by start form an implicit balanced binary
+    search tree (the middle of each range is its root), each node keeping the largest end of its subtree.
+    Finding the intervals overlapping a range costs O(log n + k) for k results.
+    """
+
+    def __init__(self, intervals=()):
+        self.intervals = sorted(intervals, key=lambda interval: (interval[0], interval[1]))
+        self.max_end = [None] * len(self.intervals)
+        self._build(0, len(self.intervals))
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def _build(self, low, high):
+        if low >= high:
+            return None
+        middle = (low + high) // 2
+        max_end = self.intervals[middle][1]
+        for child in (self._build(low, middle), self._build(middle + 1, high)):
+            if child is not None and child > max_end:
+                max_end = child
+        self.max_end[middle] = max_end
+        return max_end
+
+    def overlapping(self, start, end):
+        """Intervals overlapping [start, end), sorted by start"""
+        found = []
+        stack = [(0, len(self.intervals))]
+        while stack:
+            low, high = stack.pop()
+            if low >= high:
+                continue
+            middle = (low + high) // 2
+            if self.max_end[middle] <= start:
+                continue
+            interval_start, interval_end, item = self.intervals[middle]
+            if interval_start < end:
+                stack.append((middle + 1, high))
+                if interval_end > start:
+                    found.append(self.intervals[middle])
+            stack.append((low, middle))
+        return sorted(found, key=lambda interval: (interval[0], interval[1]))
+
+
+def max_concurrency(intervals):
+    """Largest number of the [(start, end, ...)] intervals covering a single point"""
+    events = sorted([(interval[0], 1) for interval in intervals] + [(interval[1], -1) for interval in intervals])
+    current = highest = 0
+    for _, change in events:
+        current += change
+        highest = max(highest, current)
+    return highest
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from src.core.idempotency import purge_expired_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = "Deletes the idempotency keys older than their TTL"
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_idempotency_keys()
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired idempotency keys"))
@@ -1,4 +1,5 @@
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 from phonenumber_field.modelfields import PhoneNumberField
@@ -101,3 +102,15 @@ class Language(models.Model):
     def __str__(self):
         return self.name
 
+
+
+class IdempotencyKey(models.Model):
+    """The response of a create request made with an Idempotency-Key, see src.core.idempotency"""
+    scope = models.CharField(max_length=64, unique=True, help_text='sha256 of the user, method, path and key')
+    fingerprint = models.CharField(max_length=64, help_text='sha256 of the request data')
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.scope
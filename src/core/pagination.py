@@ -0,0 +1,121 @@
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination keyed on every field of the ordering, e.g. (created_at, id), rather than DRF's
+    position-plus-offset cursor. Each page is a `WHERE (created_at, id) < (x, y) ORDER BY created_at, id LIMIT n`
+    range scan, so pages stay stable while rows are being inserted and deep pages cost the same as the first one.
+
+    An explicit ordering already applied to the queryset (e.g. by the `ordering` filter or a distance/rank search)
+    takes precedence over `ordering`, with the primary key appended as the tie breaker.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_keyset_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = bool(self.cursor and self.cursor.reverse)
+        ordering = [self.invert(field) for field in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+
+        if self.cursor and self.cursor.position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(ordering, self.decode_position(self.cursor.position)))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_keyset_ordering(self, request, queryset, view):
+        ordering = [field for field in queryset.query.order_by]
+        if not ordering or not all(self.is_keyset_field(field) for field in ordering):
+            return tuple(self.get_ordering(request, queryset, view))
+
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering.append('-id' if ordering[0].startswith('-') else 'id')
+        return tuple(ordering)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.encode_position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.encode_position(self.page[0])))
+
+    @staticmethod
+    def is_keyset_field(field):
+        return isinstance(field, str) and field != '?' and '__' not in field
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def get_keyset_filter(ordering, values):
+        """(a, b, c) after (x, y, z) => a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)"""
+        keyset_filter, equal = Q(), {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            keyset_filter |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return keyset_filter
+
+    def encode_position(self, instance):
+        values = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            if isinstance(value, (datetime, date, time)):
+                value = value.isoformat()
+            elif isinstance(value, (Decimal, UUID)):
+                value = str(value)
+            values.append(value)
+        return json.dumps(values, separators=(',', ':'))
+
+    def decode_position(self, position):
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+
+class CreatedAtCursorPagination(KeysetCursorPagination):
+    ordering = ('-created_at', '-id')
+
+
+class CreatedCursorPagination(KeysetCursorPagination):
+    ordering = ('-created', '-id')
+
+
+class TitleCursorPagination(KeysetCursorPagination):
+    ordering = ('title', 'id')
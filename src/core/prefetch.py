@@ -0,0 +1,44 @@
+from django.db.models import Prefetch
+
+
+class EagerLoadingSerializerMixin:
+    """
+    Lets a serializer declare the relations it reads, so list views can load them up front instead of one query per
+    row. `select_related_fields` are joined into the main query, `get_prefetch_related` returns many-valued relations
+    as lookups or Prefetch objects. Both accept a prefix for when the serializer is nested under a relation.
+    """
+    select_related_fields = ()
+
+    @classmethod
+    def get_select_related(cls, prefix=''):
+        return [f'{prefix}{field}' for field in cls.select_related_fields]
+
+    @classmethod
+    def get_prefetch_related(cls, prefix=''):
+        return []
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, prefix=''):
+        select_related = cls.get_select_related(prefix)
+        prefetch_related = cls.get_prefetch_related(prefix)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
+
+def prefixed_prefetch(prefix, lookup, queryset=None, to_attr=None):
+    """Builds a Prefetch for `lookup` under an optional relation prefix"""
+    return Prefetch(f'{prefix}{lookup}', queryset=queryset, to_attr=to_attr)
+
+
+class EagerLoadingMixin:
+    """View mixin applying the eager loading declared by the view's serializer to its queryset"""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        if issubclass(serializer_class, EagerLoadingSerializerMixin):
+            queryset = serializer_class.setup_eager_loading(queryset)
+        return queryset
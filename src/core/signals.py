@@ -0,0 +1,18 @@
+from cities_light.models import Country as CitiesLightCountry, Region, SubRegion
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from src.api.v1.reference import invalidate_reference_bundle
+from src.core.models import Country, Language
+from src.services.services.models import ServiceCategory
+
+
+@receiver([post_save, post_delete], sender=ServiceCategory, dispatch_uid="reference_bundle_update")
+@receiver([post_save, post_delete], sender=SubRegion, dispatch_uid="reference_bundle_update")
+@receiver([post_save, post_delete], sender=Region, dispatch_uid="reference_bundle_update")
+@receiver([post_save, post_delete], sender=CitiesLightCountry, dispatch_uid="reference_bundle_update")
+@receiver([post_save, post_delete], sender=Language, dispatch_uid="reference_bundle_update")
+@receiver([post_save, post_delete], sender=Country, dispatch_uid="reference_bundle_update")
+def reference_bundle_update(sender, **kwargs):
+    """Any change to the reference models invalidates the helpers bundle."""
+    invalidate_reference_bundle()
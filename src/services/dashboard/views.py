@@ -41,7 +41,7 @@ class DashboardView(TemplateView):
             'rad_data' : d,
             'indexes': i,
             'month': now.strftime("%B"),
-            'object_list': Order.objects.order_by("-created_at")[:9]
+            'object_list': Order.objects.select_related('user', 'service').order_by("-created_at")[:9]
         })
 
         return context
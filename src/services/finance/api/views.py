@@ -4,6 +4,8 @@ from rest_framework.permissions import IsAuthenticated
 
 from src.services.finance.api.serializers import WalletSerializer, BankAccountSerializer, WithdrawalSerializer, \
     TransactionSerializer, ChargeSerializer
+from src.core.idempotency import IdempotentCreateMixin
+from src.core.pagination import CreatedAtCursorPagination
 from src.services.finance.models import Wallet, BankAccount, Withdrawal, Transaction, Charge
 
 
@@ -37,10 +39,11 @@ class BankAccountDeleteAPIView(RetrieveAPIView):
         return get_object_or_404(BankAccount, user=self.request.user, pk=self.kwargs['pk'])
 
 
-class WithdrawalListCreateAPIView(ListCreateAPIView):
+class WithdrawalListCreateAPIView(IdempotentCreateMixin, ListCreateAPIView):
     queryset = Withdrawal.objects.all()
     serializer_class = WithdrawalSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         return Withdrawal.objects.filter(user=self.request.user)
@@ -53,6 +56,7 @@ class TransactionListAPIView(ListAPIView):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
 
 class ChargeListAPIView(ListAPIView):
@@ -181,6 +181,9 @@ class Withdrawal(models.Model):
     class Meta:
         verbose_name_plural = 'Withdrawals'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='withdrawal_user_created_idx')
+        ]
 
     def __str__(self):
         return f'{self.user} - {self.amount} - {self.status}'
@@ -279,6 +282,10 @@ class Transaction(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = "Transactions"
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='transaction_user_created_idx'),
+            models.Index(fields=['created_at', 'id'], name='transaction_created_idx'),
+        ]
 
     def __str__(self):
         return str(self.pk)
@@ -1,7 +1,10 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
 
+from src.services.order.bll import update_order
 from src.services.order.models import AdvertisementRequest, Advertisement, Payment, ServiceBookingRequest, SpecialOffer, \
-    Order
+    Order, AdvertisementMatch
+from src.services.order.transitions import ORDER_STATUS_FIELDS, TransitionError, check_transition
 
 
 class ServiceAdvertisementAdmin(admin.ModelAdmin):
@@ -19,6 +22,13 @@ class ServiceAdvertisementRequestAdmin(admin.ModelAdmin):
     ordering = ('-created_at',)
 
 
+class AdvertisementMatchAdmin(admin.ModelAdmin):
+    list_display = ('advertisement_id', 'provider', 'service', 'score', 'notified_at', 'created_at')
+    list_filter = ('notified_at', 'created_at')
+    list_select_related = ('provider', 'service')
+    ordering = ('-created_at',)
+
+
 class ServiceBookingRequestAdmin(admin.ModelAdmin):
     """Admin panel for managing service booking requests."""
     list_display = ('user', 'service', 'start_datetime', 'end_datetime', 'status')
@@ -28,15 +38,47 @@ class ServiceBookingRequestAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
 
 
+class OrderAdminForm(forms.ModelForm):
+    class Meta:
+        model = Order
+        fields = '__all__'
+
+    def clean(self):
+        """Status edits of an existing order must follow the transition rules"""
+        cleaned_data = super().clean()
+        if self.instance.pk is not None:
+            for field in ORDER_STATUS_FIELDS:
+                if field in self.changed_data and cleaned_data.get(field):
+                    try:
+                        check_transition(self.instance, cleaned_data[field], field)
+                    except TransitionError as error:
+                        self.add_error(field, str(error))
+        return cleaned_data
+
+
 class ServiceOrderAdmin(admin.ModelAdmin):
     """Admin panel for managing service orders."""
+    form = OrderAdminForm
     list_display = (
-        'user', 'payment_type', 'total_price', 'paid_price', 'order_status', 'payment_status')
+        'user', 'service', 'provider', 'payment_type', 'total_price', 'paid_price', 'order_status', 'payment_status')
     list_filter = ('order_status', 'payment_status', 'payment_type')
-    search_fields = ('user__username',)
+    list_select_related = ('user', 'service', 'provider')
+    search_fields = ('user__username', 'service__title')
+    raw_id_fields = ('service', 'provider')
     ordering = ('-created_at',)
     readonly_fields = ('created_at', 'updated_at')
 
+    def save_model(self, request, obj, form, change):
+        """Edits go through update_order, so a payment or completion moves the provider's wallet like the API"""
+        if not change:
+            return super().save_model(request, obj, form, change)
+        for field in ORDER_STATUS_FIELDS:
+            setattr(obj, field, form.initial[field])
+        try:
+            update_order(obj, {name: form.cleaned_data[name] for name in form.changed_data})
+        except TransitionError as error:
+            self.message_user(request, str(error), messages.ERROR)
+
 
 class ServicePaymentAdmin(admin.ModelAdmin):
     """Admin panel for managing service payments."""
@@ -60,5 +102,6 @@ admin.site.register(Order, ServiceOrderAdmin)
 admin.site.register(Payment, ServicePaymentAdmin)
 admin.site.register(Advertisement, ServiceAdvertisementAdmin)
 admin.site.register(AdvertisementRequest, ServiceAdvertisementRequestAdmin)
+admin.site.register(AdvertisementMatch, AdvertisementMatchAdmin)
 admin.site.register(ServiceBookingRequest, ServiceBookingRequestAdmin)
 admin.site.register(SpecialOffer, SpecialOfferAdmin)
@@ -1,6 +1,10 @@
 from rest_framework import serializers
 
-from src.services.order.models import ServiceBookingRequest, Advertisement, AdvertisementRequest, Order, SpecialOffer
+from src.core.prefetch import EagerLoadingSerializerMixin
+
+from src.services.order.bll import BookingConflictError, check_booking_conflicts
+from src.services.order.models import ServiceBookingRequest, Advertisement, AdvertisementRequest, Order, SpecialOffer, \
+    AdvertisementMatch
 from src.services.services.api.serializers import UserProfileSerializer, ServiceSerializer
 
 
@@ -16,6 +20,14 @@ class ServiceBookingRequestSerializer(serializers.ModelSerializer):
     def validate(self, data):
         if data['start_datetime'] > data['end_datetime']:
             raise serializers.ValidationError("End date should be greater than start date.")
+        booking = ServiceBookingRequest(
+            pk=self.instance.pk if self.instance else None, service=data['service'],
+            start_datetime=data['start_datetime'], end_datetime=data['end_datetime']
+        )
+        try:
+            check_booking_conflicts(booking)
+        except BookingConflictError as error:
+            raise serializers.ValidationError(str(error))
         return data
 
 
@@ -26,11 +38,25 @@ class ServiceBookingRequestUpdateSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+class ServiceBookingRequestBulkStatusSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=100)
+    status = serializers.ChoiceField(choices=ServiceBookingRequest.REQUEST_STATUS_CHOICES)
+
+
 class AdvertisementSerializer(serializers.ModelSerializer):
     class Meta:
         model = Advertisement
-        fields = ['id', 'user', 'service_type', 'service', 'start_datetime', 'end_datetime', 'created_at']
-        read_only_fields = ['id', 'user', 'created_at']
+        fields = ['id', 'user', 'service_type', 'service', 'start_datetime', 'end_datetime', 'requests_count',
+                  'created_at']
+        read_only_fields = ['id', 'user', 'requests_count', 'created_at']
+
+
+class AdvertisementMatchSerializer(serializers.ModelSerializer):
+    advertisement = AdvertisementSerializer(read_only=True)
+
+    class Meta:
+        model = AdvertisementMatch
+        fields = ['id', 'advertisement', 'service', 'score', 'created_at']
 
 
 class AdvertisementRequestSerializer(serializers.ModelSerializer):
@@ -74,14 +100,15 @@ class SpecialOfferUpdateSerializer(serializers.ModelSerializer):
 class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
-        fields = ['id', 'user', 'service_booking_request', 'service_advertisement_request', 'special_offer',
+        fields = ['id', 'user', 'service', 'provider', 'service_booking_request', 'service_advertisement_request',
+                  'special_offer',
                   'payment_type',
                   'total_price', 'paid_price', 'tip',
                   'order_status', 'payment_status', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'user', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'user', 'service', 'provider', 'created_at', 'updated_at']
 
 
-class OrderDetailSerializer(serializers.ModelSerializer):
+class OrderDetailSerializer(EagerLoadingSerializerMixin, serializers.ModelSerializer):
     service_booking_request = ServiceBookingRequestSerializer(read_only=True)
     service_advertisement_request = AdvertisementRequestSerializer(read_only=True)
     user = UserProfileSerializer(read_only=True)
@@ -94,8 +121,31 @@ class OrderDetailSerializer(serializers.ModelSerializer):
                   'total_price', 'paid_price', 'tip',
                   'order_status', 'payment_status', 'created_at', 'updated_at']
 
+    # Users are read through UserProfileSerializer, which needs their address and provider profile
+    select_related_fields = (
+        'user__address__country', 'user__service_provider_profile',
+        'service_booking_request__user__address__country', 'service_booking_request__user__service_provider_profile',
+        'service_advertisement_request__advertisement',
+    )
+
+    @classmethod
+    def get_select_related(cls, prefix=''):
+        return super().get_select_related(prefix) + [
+            *ServiceSerializer.get_select_related(f'{prefix}service__'),
+            *ServiceSerializer.get_select_related(f'{prefix}service_advertisement_request__service__'),
+        ]
+
+    @classmethod
+    def get_prefetch_related(cls, prefix=''):
+        return [
+            *ServiceSerializer.get_prefetch_related(f'{prefix}service__'),
+            *ServiceSerializer.get_prefetch_related(f'{prefix}service_advertisement_request__service__'),
+        ]
+
 
 class OrderUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['total_price', 'paid_price', 'tip', 'order_status', 'payment_status']
+        # Moved through update_order by the admin, never by the ordering customer
+        read_only_fields = ['payment_status']
@@ -5,7 +5,8 @@ from src.services.order.api.views import AdvertisementListCreateAPIView, Adverti
     OrderRetrieveUpdateAPIView, ServiceBookingRequestListCreateAPIView, ServiceBookingRequestUpdateAPIView, \
     AdvertisementDeleteAPIView, ProviderAdvertisementRequestListAPIView, ProviderAdvertisementRequestDeleteAPIView, \
     ServiceBookingRequestDeleteAPIView, ServiceSpecialOfferListAPIView, ProviderSpecialOfferCreateAPIView, \
-    ServiceSpecialOfferUpdateAPIView, ServiceBookingListView
+    ServiceSpecialOfferUpdateAPIView, ServiceBookingListView, ProviderInboxAPIView, \
+    ServiceBookingRequestBulkStatusAPIView, ProviderOrderListAPIView, ProviderAdvertisementMatchListAPIView
 
 app_name = "order-api"
 
@@ -34,11 +35,18 @@ urlpatterns += [
          ProviderAdvertisementRequestDeleteAPIView.as_view(),
          name='provider-advertisement-request-delete'),
 
+    path('v1/provider/advertisement-matches/',
+         ProviderAdvertisementMatchListAPIView.as_view(),
+         name='provider-advertisement-match-list'),
+
 ]
 
 urlpatterns += [
     path('v1/provider/service/service-booking-requests/', ServiceBookingRequestListCreateAPIView.as_view(),
          name='service-booking-request-list-create'),
+    path('v1/provider/service/service-booking-requests/bulk-status/',
+         ServiceBookingRequestBulkStatusAPIView.as_view(),
+         name='service-booking-request-bulk-status'),
     path('v1/provider/service/service-booking-requests/<str:pk>/', ServiceBookingRequestUpdateAPIView.as_view(),
          name='service-booking-request-update'),
 
@@ -47,6 +55,8 @@ urlpatterns += [
 
     path('v1/service/service-booking-requests/', ServiceBookingListView.as_view(),
          name='service-booking-request-user-list'),
+
+    path('v1/provider/inbox/', ProviderInboxAPIView.as_view(), name='provider-inbox'),
 ]
 
 urlpatterns += [
@@ -63,5 +73,6 @@ urlpatterns += [
 
     path('v1/orders/', OrderListCreateAPIView.as_view(), name='service-order-list-create'),
     path('v1/orders/<str:pk>/', OrderRetrieveUpdateAPIView.as_view(), name='order-retrieve-update'),
+    path('v1/provider/orders/', ProviderOrderListAPIView.as_view(), name='provider-order-list'),
 
 ]
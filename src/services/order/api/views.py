@@ -1,18 +1,42 @@
+from django.utils.dateparse import parse_datetime
 from django.views.generic import DeleteView
 from rest_framework import status
 from rest_framework.generics import ListCreateAPIView, ListAPIView, CreateAPIView, UpdateAPIView, RetrieveUpdateAPIView, \
     get_object_or_404, DestroyAPIView
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
-
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+
+from src.core.idempotency import IdempotentCreateMixin
+from src.core.pagination import CreatedAtCursorPagination
+from src.core.prefetch import EagerLoadingMixin
+from src.services.order.bll import BookingConflictError, accept_booking_request, update_order
+from src.services.order.inbox import InvalidInboxCursor, get_inbox_page
+from src.services.order.transitions import TransitionError, bulk_transition, get_transition_sources, transition
 from src.services.order.api.serializers import AdvertisementSerializer, AdvertisementRequestSerializer, \
     AdvertisementRequestCreateSerializer, AdvertisementRequestUpdateSerializer, ServiceBookingRequestSerializer, \
     ServiceBookingRequestUpdateSerializer, OrderSerializer, OrderDetailSerializer, OrderUpdateSerializer, \
-    SpecialOfferSerializer, SpecialOfferUpdateSerializer
-from src.services.order.models import Advertisement, AdvertisementRequest, ServiceBookingRequest, Order, SpecialOffer
+    SpecialOfferSerializer, SpecialOfferUpdateSerializer, ServiceBookingRequestBulkStatusSerializer, \
+    AdvertisementMatchSerializer
+from src.services.order.models import Advertisement, AdvertisementRequest, ServiceBookingRequest, Order, SpecialOffer, \
+    AdvertisementMatch
 from src.services.users.models import User
 
 
+class StatusTransitionMixin:
+    """Status updates go through the transition rules with a conditional update instead of a plain save"""
+
+    def perform_update(self, serializer):
+        if 'status' not in serializer.validated_data:
+            return
+        try:
+            transition(serializer.instance, serializer.validated_data['status'])
+        except TransitionError as error:
+            raise ValidationError({'status': str(error)})
+
+
 class AdvertisementListCreateAPIView(ListCreateAPIView):
     queryset = Advertisement.objects.all()
     serializer_class = AdvertisementSerializer
@@ -42,13 +66,14 @@ class AdvertisementRequestListAPIView(ListAPIView):
     queryset = AdvertisementRequest.objects.all()
     serializer_class = AdvertisementRequestSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         return AdvertisementRequest.objects.filter(advertisement__user=self.request.user,
                                                    advertisement_id=self.kwargs.get('advertisement_id'))
 
 
-class AdvertisementRequestUpdateAPIView(UpdateAPIView):
+class AdvertisementRequestUpdateAPIView(StatusTransitionMixin, UpdateAPIView):
     """STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('accepted', 'Accepted'),
@@ -96,11 +121,23 @@ class ProviderAdvertisementRequestListAPIView(ListAPIView):
     queryset = AdvertisementRequest.objects.all()
     permission_classes = [IsAuthenticated]
     serializer_class = AdvertisementRequestSerializer
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         return AdvertisementRequest.objects.filter(service_provider__user=self.request.user)
 
 
+class ProviderAdvertisementMatchListAPIView(ListAPIView):
+    """Advertisements matched to the services of the provider, newest first"""
+    queryset = AdvertisementMatch.objects.all()
+    permission_classes = [IsAuthenticated]
+    serializer_class = AdvertisementMatchSerializer
+    pagination_class = CreatedAtCursorPagination
+
+    def get_queryset(self):
+        return AdvertisementMatch.objects.filter(provider=self.request.user).select_related('advertisement')
+
+
 class ProviderAdvertisementRequestDeleteAPIView(BaseAdvertisementRequestDeleteAPIView):
 
     def get_object(self):
@@ -108,7 +145,7 @@ class ProviderAdvertisementRequestDeleteAPIView(BaseAdvertisementRequestDeleteAP
                                  pk=self.kwargs.get('pk'))
 
 
-class ServiceBookingRequestListCreateAPIView(ListCreateAPIView):
+class ServiceBookingRequestListCreateAPIView(IdempotentCreateMixin, ListCreateAPIView):
     """
     List and create booking requests for the service provider.
     Remove The User from the CreateApi Request
@@ -116,6 +153,7 @@ class ServiceBookingRequestListCreateAPIView(ListCreateAPIView):
     queryset = ServiceBookingRequest.objects.all()
     serializer_class = ServiceBookingRequestSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -131,6 +169,7 @@ class ServiceBookingListView(ListAPIView):
     queryset = ServiceBookingRequest.objects.all()
     serializer_class = ServiceBookingRequestSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         return ServiceBookingRequest.objects.filter(user=self.request.user)
@@ -155,6 +194,51 @@ class ServiceBookingRequestUpdateAPIView(UpdateAPIView):
     def get_object(self):
         return get_object_or_404(ServiceBookingRequest, service__provider=self.request.user, pk=self.kwargs.get('pk'))
 
+    def perform_update(self, serializer):
+        new_status = serializer.validated_data.get('status')
+        if new_status is None:
+            return
+        try:
+            if new_status == 'accepted' and serializer.instance.status != 'accepted':
+                accept_booking_request(serializer.instance)
+            else:
+                transition(serializer.instance, new_status)
+        except (BookingConflictError, TransitionError) as error:
+            raise ValidationError({'status': str(error)})
+
+
+class ServiceBookingRequestBulkStatusAPIView(APIView):
+    """
+    Changes the status of several booking requests of the provider at once, POST {"ids": [...], "status": "..."}.
+    Acceptances are checked for conflicts one by one, other statuses are applied with a single update. Requests
+    that can't be moved are listed in `failed` with the reason.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = ServiceBookingRequestBulkStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = [str(pk) for pk in dict.fromkeys(serializer.validated_data['ids'])]
+        new_status = serializer.validated_data['status']
+        bookings = ServiceBookingRequest.objects.filter(service__provider=request.user, pk__in=ids)
+
+        failed = {}
+        if new_status == 'accepted':
+            updated = []
+            for booking in bookings.filter(status__in=get_transition_sources(ServiceBookingRequest, new_status)):
+                try:
+                    accept_booking_request(booking)
+                    updated.append(str(booking.pk))
+                except (BookingConflictError, TransitionError) as error:
+                    failed[str(booking.pk)] = str(error)
+        else:
+            updated = [str(booking.pk) for booking in bulk_transition(bookings, new_status)]
+
+        for pk in ids:
+            if pk not in updated and pk not in failed:
+                failed[pk] = f'Not found or can not be changed to {new_status}.'
+        return Response({'updated': updated, 'failed': failed})
+
 
 class ServiceBookingRequestDeleteAPIView(DestroyAPIView):
     queryset = ServiceBookingRequest.objects.all()
@@ -170,6 +254,39 @@ class ServiceBookingRequestDeleteAPIView(DestroyAPIView):
         return Response(status=status.HTTP_200_OK, data={'message': 'Service Booking Request deleted successfully'})
 
 
+class ProviderInboxAPIView(APIView):
+    """
+    Booking requests, advertisement requests and special offers of the provider in one stream, newest first.
+    `next` is the cursor link of the following page. `since` (ISO datetime, e.g. the `created_at` of the newest item
+    already downloaded) only returns items created after it.
+    """
+    permission_classes = [IsAuthenticated]
+    page_size = 20
+    max_page_size = 100
+
+    def get(self, request, *args, **kwargs):
+        try:
+            page_size = min(max(int(request.query_params.get('page_size', self.page_size)), 1), self.max_page_size)
+        except ValueError:
+            raise ValidationError({'page_size': 'page_size must be an integer.'})
+
+        since = request.query_params.get('since')
+        if since:
+            since = parse_datetime(since)
+            if since is None:
+                raise ValidationError({'since': 'since must be an ISO 8601 datetime.'})
+
+        try:
+            results, cursor = get_inbox_page(
+                request.user, cursor=request.query_params.get('cursor'), since=since or None, limit=page_size
+            )
+        except InvalidInboxCursor:
+            raise NotFound('Invalid cursor')
+
+        next_link = replace_query_param(request.build_absolute_uri(), 'cursor', cursor) if cursor else None
+        return Response({'next': next_link, 'results': results})
+
+
 class ProviderSpecialOfferCreateAPIView(CreateAPIView):
     queryset = SpecialOffer.objects.all()
     serializer_class = SpecialOfferSerializer
@@ -188,6 +305,7 @@ class ServiceSpecialOfferListAPIView(ListAPIView):
     queryset = SpecialOffer.objects.all()
     serializer_class = SpecialOfferSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         user_id = self.kwargs.get('user_id')
@@ -195,7 +313,7 @@ class ServiceSpecialOfferListAPIView(ListAPIView):
         return SpecialOffer.objects.filter(user_id=user_id, service__provider_id=provider_id)
 
 
-class ServiceSpecialOfferUpdateAPIView(UpdateAPIView):
+class ServiceSpecialOfferUpdateAPIView(StatusTransitionMixin, UpdateAPIView):
     """
     Update the status of the booking request.
       REQUEST_STATUS_CHOICES = [
@@ -213,10 +331,12 @@ class ServiceSpecialOfferUpdateAPIView(UpdateAPIView):
         return get_object_or_404(SpecialOffer, user=self.request.user, pk=self.kwargs.get('pk'))
 
 
-class OrderListCreateAPIView(ListCreateAPIView):
+class OrderListCreateAPIView(IdempotentCreateMixin, ListCreateAPIView):
     """
     Tracks Orders made for services
 
+    Send an Idempotency-Key header to make retries safe: a repeated key returns the response of the first request.
+
     If You user buy service using booking request then you can use service_booking_request field , if user buy service
     through advertisement then you can use service_advertisement_request field and if the user want to buy it from
     special offer then you can use special_offer field.
@@ -243,6 +363,7 @@ class OrderListCreateAPIView(ListCreateAPIView):
     model = Order
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         return Order.objects.filter(user=self.request.user)
@@ -251,7 +372,18 @@ class OrderListCreateAPIView(ListCreateAPIView):
         serializer.save(user=self.request.user)
 
 
-class OrderRetrieveUpdateAPIView(RetrieveUpdateAPIView):
+class ProviderOrderListAPIView(EagerLoadingMixin, ListAPIView):
+    """Orders placed for the services of the provider, newest first"""
+    queryset = Order.objects.all()
+    serializer_class = OrderDetailSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
+
+    def get_queryset(self):
+        return super().get_queryset().filter(provider=self.request.user)
+
+
+class OrderRetrieveUpdateAPIView(EagerLoadingMixin, RetrieveUpdateAPIView):
     model = Order
     queryset = Order.objects.all()
     permission_classes = [IsAuthenticated]
@@ -262,4 +394,11 @@ class OrderRetrieveUpdateAPIView(RetrieveUpdateAPIView):
         return OrderUpdateSerializer
 
     def get_object(self):
-        return get_object_or_404(Order, user=self.request.user, pk=self.kwargs.get('pk'))
+        return get_object_or_404(self.get_queryset(), user=self.request.user, pk=self.kwargs.get('pk'))
+
+    def perform_update(self, serializer):
+        """The order status goes through the transition rules, payment_status is read-only here"""
+        try:
+            update_order(serializer.instance, serializer.validated_data)
+        except TransitionError as error:
+            raise ValidationError({'order_status': str(error)})
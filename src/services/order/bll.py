@@ -0,0 +1,162 @@
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from src.core.cache import bump_cache_version, get_cache_version
+from src.core.intervals import IntervalTree, max_concurrency
+from src.services.order.models import Advertisement, AdvertisementRequest, Order, ServiceBookingRequest, SpecialOffer
+from src.services.order.transitions import ORDER_STATUS_FIELDS, transition
+from src.services.services.models import Service
+from src.services.users.models import User
+
+""" ---------------------Booking Conflicts--------------------- """
+
+BOOKING_INDEX_LIMIT = 1000
+_booking_indexes = OrderedDict()
+
+
+class BookingConflictError(Exception):
+    pass
+
+
+def get_booking_index_cache(provider_id):
+    return f'provider-bookings:{provider_id}'
+
+
+def get_accepted_bookings(provider_id):
+    return ServiceBookingRequest.objects.filter(
+        service__provider_id=provider_id, status='accepted', start_datetime__isnull=False, end_datetime__isnull=False
+    )
+
+
+class ProviderBookingIndex:
+    """
+    Accepted bookings of one provider in an interval tree of (start, end, (booking_id, service_id)), with the
+    count and latest update of the loaded rows to tell whether the database moved on since.
+    """
+
+    def __init__(self, provider_id, version):
+        bookings = list(get_accepted_bookings(provider_id).values_list(
+            'id', 'service_id', 'start_datetime', 'end_datetime', 'updated_at'
+        ))
+        self.version = version
+        self.fingerprint = (len(bookings), max((booking[4] for booking in bookings), default=None))
+        self.tree = IntervalTree((start, end, (pk, service_id)) for pk, service_id, start, end, _ in bookings)
+
+    def overlapping(self, start, end, exclude=None):
+        return [interval for interval in self.tree.overlapping(start, end) if interval[2][0] != exclude]
+
+
+def get_provider_booking_index(provider_id, verify=False):
+    """
+    The provider's accepted bookings, loaded on first use and kept in process memory until a booking of the provider
+    changes. With `verify`, one aggregate query confirms the loaded rows still match the database, which matters
+    under a row lock where a write from another process may not have reached this process' cache yet.
+    """
+    version = get_cache_version(get_booking_index_cache(provider_id))
+    index = _booking_indexes.get(provider_id)
+    if index is not None and index.version == version and verify:
+        current = get_accepted_bookings(provider_id).aggregate(count=Count('id'), updated_at=Max('updated_at'))
+        if (current['count'], current['updated_at']) != index.fingerprint:
+            index = None
+
+    if index is None or index.version != version:
+        index = ProviderBookingIndex(provider_id, version)
+        _booking_indexes[provider_id] = index
+        if len(_booking_indexes) > BOOKING_INDEX_LIMIT:
+            _booking_indexes.popitem(last=False)
+    _booking_indexes.move_to_end(provider_id)
+    return index
+
+
+def invalidate_provider_bookings(provider_id):
+    bump_cache_version(get_booking_index_cache(provider_id))
+
+
+def check_booking_conflicts(booking, service=None, verify=False):
+    """
+    Raises BookingConflictError when the booking overlaps an accepted booking of another service of the same
+    provider, or when it would take the service past `number_of_people` concurrent accepted bookings.
+    """
+    start, end = booking.start_datetime, booking.end_datetime
+    if start is None or end is None:
+        return
+
+    service = service or booking.service
+    index = get_provider_booking_index(service.provider_id, verify=verify)
+    overlapping = index.overlapping(start, end, exclude=booking.pk)
+
+    if any(service_id != service.pk for _, _, (_, service_id) in overlapping):
+        raise BookingConflictError("The provider already has an accepted booking at this time.")
+
+    capacity = service.number_of_people or 1
+    clipped = [(max(interval_start, start), min(interval_end, end)) for interval_start, interval_end, _ in overlapping]
+    if max_concurrency(clipped + [(start, end)]) > capacity:
+        raise BookingConflictError("The service is fully booked at this time.")
+
+
+def accept_booking_request(booking):
+    """
+    Accepts the booking with the service and its provider locked, so a concurrent acceptance of an overlapping
+    booking waits for this one to commit and then sees it.
+    """
+    with transaction.atomic():
+        service = Service.objects.select_for_update().get(pk=booking.service_id)
+        list(User.objects.select_for_update().filter(pk=service.provider_id).values_list('pk', flat=True))
+        check_booking_conflicts(booking, service=service, verify=True)
+        transition(booking, 'accepted')
+    return booking
+
+
+""" ---------------------Orders--------------------- """
+
+
+def update_order(order, values):
+    """
+    Writes `values` to the order. The payment and order statuses go through their transitions, so the provider's
+    wallet moves once per status change, and the other fields are saved with update_fields only, so the statuses the
+    transitions checked are never saved over. Raises TransitionError for a status the order can't move to.
+    """
+    values = dict(values)
+    with transaction.atomic():
+        for field in ORDER_STATUS_FIELDS:
+            if field in values:
+                transition(order, values.pop(field), field=field)
+        if values:
+            for name, value in values.items():
+                setattr(order, name, value)
+            order.save(update_fields=[*values, 'updated_at'])
+    return order
+
+
+def populate_order_services():
+    """
+    Fills the service and provider of orders created before they were stored on the order, with one UPDATE per
+    kind of source. Returns the number of orders updated.
+    """
+    updated = 0
+    for field, model in (('service_booking_request', ServiceBookingRequest),
+                         ('service_advertisement_request', AdvertisementRequest),
+                         ('special_offer', SpecialOffer)):
+        source = model.objects.filter(pk=OuterRef(f'{field}_id'))
+        updated += Order.objects.filter(service__isnull=True, **{f'{field}__isnull': False}).update(
+            service_id=Subquery(source.values('service_id')[:1]),
+            provider_id=Subquery(source.values('service__provider_id')[:1]),
+        )
+    return updated
+
+
+""" ---------------------Advertisements--------------------- """
+
+
+def refresh_advertisement_requests_count(advertisement_ids=None):
+    """Recounts the requests of the given advertisements (all when None) in one UPDATE"""
+    counts = AdvertisementRequest.objects.filter(advertisement=OuterRef('pk')).order_by().values(
+        'advertisement'
+    ).annotate(count=Count('pk')).values('count')
+    advertisements = Advertisement.objects.all()
+    if advertisement_ids is not None:
+        advertisements = advertisements.filter(pk__in=advertisement_ids)
+    return advertisements.update(requests_count=Coalesce(Subquery(counts), 0))
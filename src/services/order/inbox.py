@@ -0,0 +1,122 @@
+import base64
+import heapq
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+
+from src.services.order.models import AdvertisementRequest, ServiceBookingRequest, SpecialOffer
+
+# Sources in tie-break order: items created at the same instant are listed booking requests first
+INBOX_SOURCES = ('booking_request', 'advertisement_request', 'special_offer')
+INBOX_DETAIL_FIELDS = {
+    'booking_request': ('start_datetime', 'end_datetime', 'message'),
+    'advertisement_request': ('advertisement_id', 'advertisement__service', 'message'),
+    'special_offer': ('service_day', 'start_time', 'end_time', 'service_fee', 'currency__code'),
+}
+
+
+class InvalidInboxCursor(Exception):
+    pass
+
+
+def get_inbox_querysets(user):
+    """Per source, what reaches the provider's inbox, as flat rows read straight from the source's index"""
+    querysets = {
+        'booking_request': ServiceBookingRequest.objects.filter(service__provider=user),
+        'advertisement_request': AdvertisementRequest.objects.filter(service_provider__user=user),
+        'special_offer': SpecialOffer.objects.filter(service__provider=user),
+    }
+    return {
+        kind: queryset.values(
+            'id', 'status', 'created_at', 'service_id', 'service__title', *INBOX_DETAIL_FIELDS[kind],
+            **get_counterpart_fields(kind)
+        )
+        for kind, queryset in querysets.items()
+    }
+
+
+def get_counterpart_fields(kind):
+    """The customer on the other side: who asked for the booking, posted the advertisement or got the offer"""
+    prefix = 'advertisement__user' if kind == 'advertisement_request' else 'user'
+    return {'counterpart_id': F(f'{prefix}_id'), 'counterpart_username': F(f'{prefix}__username')}
+
+
+def serialize_inbox_item(kind, row):
+    return {
+        'type': kind,
+        'id': str(row['id']),
+        'status': row['status'],
+        'created_at': row['created_at'],
+        'service': {'id': row['service_id'], 'title': row['service__title']},
+        'user': {'id': row['counterpart_id'], 'username': row['counterpart_username']},
+        'details': {field.replace('__', '_'): row[field] for field in INBOX_DETAIL_FIELDS[kind]},
+    }
+
+
+""" ---------------------Cursor--------------------- """
+
+
+def encode_inbox_cursor(created_at, rank, item_id):
+    position = json.dumps([created_at.isoformat(), rank, str(item_id)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_inbox_cursor(cursor):
+    """(created_at, source rank, id) of the last item of the previous page"""
+    try:
+        created_at, rank, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_at = parse_datetime(created_at)
+    except (TypeError, ValueError):
+        raise InvalidInboxCursor()
+    if created_at is None or not isinstance(rank, int) or not 0 <= rank < len(INBOX_SOURCES):
+        raise InvalidInboxCursor()
+    return created_at, rank, item_id
+
+
+def get_cursor_filter(queryset, rank, cursor):
+    """
+    Rows of the source `rank` after the cursor in the merged order, newest first then by source then by id:
+    older rows, plus same-instant rows of later sources, plus same-instant lower ids of the cursor's source.
+    """
+    created_at, cursor_rank, item_id = cursor
+    if rank > cursor_rank:
+        return Q(created_at__lte=created_at)
+    if rank < cursor_rank:
+        return Q(created_at__lt=created_at)
+    try:
+        item_id = queryset.model._meta.pk.to_python(item_id)
+    except ValidationError:
+        raise InvalidInboxCursor()
+    return Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=item_id)
+
+
+""" ---------------------Merge--------------------- """
+
+
+def get_inbox_page(user, cursor=None, since=None, limit=20):
+    """
+    One page of the provider's inbox, newest first, and the cursor of the next page (None on the last one).
+    Each source is read with one index range scan of at most `limit + 1` rows after the cursor (and after `since`
+    for delta fetches), then the sorted streams are k-way merged.
+    """
+    position = decode_inbox_cursor(cursor) if cursor else None
+    querysets = get_inbox_querysets(user)
+    streams = []
+    for rank, kind in enumerate(INBOX_SOURCES):
+        queryset = querysets[kind]
+        if since is not None:
+            queryset = queryset.filter(created_at__gt=since)
+        if position is not None:
+            queryset = queryset.filter(get_cursor_filter(queryset, rank, position))
+        rows = queryset.order_by('-created_at', '-id')[:limit + 1]
+        streams.append([(row['created_at'], -rank, row['id'], kind, row) for row in rows])
+
+    merged = list(heapq.merge(*streams, key=lambda item: item[:3], reverse=True))
+    page = merged[:limit]
+    next_cursor = None
+    if len(merged) > limit:
+        created_at, rank, item_id, _, _ = page[-1]
+        next_cursor = encode_inbox_cursor(created_at, -rank, item_id)
+    return [serialize_inbox_item(kind, row) for _, _, _, kind, row in page], next_cursor
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from src.services.order.matching import dispatch_advertisement_matches, match_pending_advertisements
+from src.services.order.notifier import notify_providers_advertisement_matches
+
+
+class Command(BaseCommand):
+    help = "Matches the new advertisements and notifies providers of the ones matched to their services"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        matched = match_pending_advertisements()
+        self.stdout.write(f"Matched {matched} new advertisements")
+        sent = dispatch_advertisement_matches(notify_providers_advertisement_matches, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} advertisement matches"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from src.services.order.bll import populate_order_services
+
+
+class Command(BaseCommand):
+    help = "Stores the ordered service and its provider on orders created before they were kept on the order"
+
+    def handle(self, *args, **options):
+        updated = populate_order_services()
+        self.stdout.write(self.style.SUCCESS(f"Populated the service of {updated} orders"))
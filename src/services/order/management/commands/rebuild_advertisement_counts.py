@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from src.services.order.bll import refresh_advertisement_requests_count
+
+
+class Command(BaseCommand):
+    help = "Recounts the provider requests stored on every advertisement"
+
+    def handle(self, *args, **options):
+        updated = refresh_advertisement_requests_count()
+        self.stdout.write(self.style.SUCCESS(f"Recounted the requests of {updated} advertisements"))
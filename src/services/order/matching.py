@@ -0,0 +1,150 @@
+import logging
+from functools import reduce
+from operator import or_
+
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from src.services.order.models import Advertisement, AdvertisementMatch
+from src.services.services.models import Service, ServiceLocation
+from src.services.services.search import get_search_backend, tokenize
+
+logger = logging.getLogger(__name__)
+
+ADVERTISEMENT_MATCH_LIMIT = 50
+ADVERTISEMENT_CANDIDATE_LIMIT = 500
+LOCATION_BOOST = 1.5
+# Service types able to serve each kind of advertisement
+MATCHING_SERVICE_TYPES = {
+    'online': ('online', 'both'),
+    'offline': ('onside', 'both'),
+}
+
+""" ---------------------Candidates--------------------- """
+
+
+def search_candidate_services(tokens, limit=ADVERTISEMENT_CANDIDATE_LIMIT):
+    """
+    {service_id: relevance in (0, 1]} of the services sharing any token with the advertisement, through the service
+    search index (title, category and materials). Without an index every title or category match counts as 1.
+    """
+    backend = get_search_backend()
+    if backend is not None:
+        try:
+            with transaction.atomic():
+                ranks = backend.search(tokens, limit=limit, match_any=True)
+        except DatabaseError:
+            logger.exception("Service search index unavailable, matching advertisements with a table scan")
+        else:
+            best = max((rank for _, rank in ranks), default=0)
+            return {service_id: rank / best if best > 0 else 1.0 for service_id, rank in ranks}
+
+    condition = reduce(or_, (Q(title__icontains=token) | Q(category__name__icontains=token) for token in tokens))
+    return dict.fromkeys(Service.objects.filter(condition).values_list('pk', flat=True)[:limit], 1.0)
+
+
+def get_advertiser_city(advertisement):
+    address = advertisement.user.get_address()
+    return address.city if address is not None and address.city else None
+
+
+def find_advertisement_matches(advertisement, limit=ADVERTISEMENT_MATCH_LIMIT):
+    """
+    [(provider_id, service_id, score)] of the providers best placed to answer the advertisement, best first. Each
+    provider counts once with its best active service of a fitting type. Onsite services located in the city of
+    the advertiser score LOCATION_BOOST times higher.
+    """
+    tokens = tokenize(advertisement.service)
+    if not tokens:
+        return []
+
+    scores = search_candidate_services(tokens)
+    services = Service.objects.filter(
+        pk__in=list(scores), is_active=True,
+        service_type__in=MATCHING_SERVICE_TYPES.get(advertisement.service_type, ('online', 'onside', 'both')),
+    ).exclude(provider_id=advertisement.user_id).values_list('pk', 'provider_id')
+
+    city = get_advertiser_city(advertisement) if advertisement.service_type == 'offline' else None
+    local = set()
+    if city:
+        local = set(ServiceLocation.objects.filter(
+            service_id__in=list(scores), city__iexact=city, is_active=True
+        ).values_list('service_id', flat=True))
+
+    best = {}
+    for service_id, provider_id in services:
+        score = scores[service_id] * (LOCATION_BOOST if service_id in local else 1.0)
+        if provider_id not in best or score > best[provider_id][1]:
+            best[provider_id] = (service_id, score)
+
+    ranked = sorted(best.items(), key=lambda item: -item[1][1])[:limit]
+    return [(provider_id, service_id, score) for provider_id, (service_id, score) in ranked]
+
+
+""" ---------------------Queue--------------------- """
+
+
+def match_advertisement(advertisement, limit=ADVERTISEMENT_MATCH_LIMIT):
+    """Stores the matches of the advertisement, queued for notification, and marks it matched. Returns how many."""
+    matches = find_advertisement_matches(advertisement, limit=limit)
+    with transaction.atomic():
+        AdvertisementMatch.objects.bulk_create([
+            AdvertisementMatch(advertisement=advertisement, provider_id=provider_id, service_id=service_id, score=score)
+            for provider_id, service_id, score in matches
+        ], ignore_conflicts=True)
+        Advertisement.objects.filter(pk=advertisement.pk).update(matched_at=timezone.now())
+    return len(matches)
+
+
+def match_pending_advertisements(batch_size=100):
+    """
+    Matches the advertisements not matched yet, oldest first, in batches of `batch_size`. New advertisements wait
+    here instead of being matched while their request is served. Returns the number of advertisements matched.
+    """
+    matched = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Advertisement.objects.filter(matched_at__isnull=True).order_by('created_at')
+                .select_for_update(skip_locked=True, of=('self',)).select_related('user')[:batch_size]
+            )
+            if not batch:
+                return matched
+            for advertisement in batch:
+                match_advertisement(advertisement)
+        matched += len(batch)
+
+
+def dispatch_advertisement_matches(notify, batch_size=500):
+    """
+    Sends the queued matches in batches of `batch_size`, oldest first, and returns the number of matches sent.
+    `notify` receives the matches of one provider. A batch is claimed with SKIP LOCKED where supported and marked
+    as sent before any notification goes out, so concurrent dispatchers and reruns don't notify twice. The matches
+    of a provider whose notification fails are put back in the queue for the next run.
+    """
+    sent, failed = 0, set()
+    while True:
+        with transaction.atomic():
+            pending = AdvertisementMatch.objects.filter(notified_at__isnull=True).exclude(pk__in=failed)
+            batch = list(
+                pending.order_by('created_at').select_for_update(skip_locked=True, of=('self',))
+                .select_related('advertisement__user', 'provider', 'service')[:batch_size]
+            )
+            if not batch:
+                return sent
+            AdvertisementMatch.objects.filter(pk__in=[match.pk for match in batch]).update(notified_at=timezone.now())
+
+        by_provider = {}
+        for match in batch:
+            by_provider.setdefault(match.provider_id, []).append(match)
+        for provider_id, provider_matches in by_provider.items():
+            match_ids = [match.pk for match in provider_matches]
+            try:
+                notify(provider_matches)
+            except Exception:
+                logger.exception("Failed to notify provider %s of advertisement matches", provider_id)
+                AdvertisementMatch.objects.filter(pk__in=match_ids).update(notified_at=None)
+                failed.update(match_ids)
+            else:
+                sent += len(provider_matches)
@@ -21,6 +21,11 @@ class Advertisement(models.Model):
         help_text="The ending date and time for the service.",
         null=True, blank=True
     )
+    requests_count = models.PositiveIntegerField(default=0, editable=False,
+                                                 help_text="Number of provider requests, kept by signals.")
+    # Empty while queued for matching, see src.services.order.matching
+    matched_at = models.DateTimeField(null=True, blank=True, editable=False,
+                                      help_text="When the advertisement was matched to providers.")
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -29,10 +34,13 @@ class Advertisement(models.Model):
         return f"{self.service} for {self.service.title}"
 
     def get_total_requests(self):
-        return AdvertisementRequest.objects.filter(advertisement=self).count()
+        return self.requests_count
 
     class Meta:
         ordering = ['service']
+        indexes = [
+            models.Index(fields=['matched_at', 'created_at'], name='advertisement_match_queue_idx'),
+        ]
 
 
 class AdvertisementRequest(models.Model):
@@ -53,6 +61,10 @@ class AdvertisementRequest(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['service_provider', 'created_at', 'id'], name='ad_request_provider_idx'),
+            models.Index(fields=['advertisement', 'created_at', 'id'], name='ad_request_ad_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.advertisement.service} - {self.service_provider}"
@@ -60,6 +72,31 @@ class AdvertisementRequest(models.Model):
     def get_service_name(self):
         return self.advertisement.service
 
+
+class AdvertisementMatch(models.Model):
+    """A provider whose service matches an advertisement, waiting to be notified while notified_at is empty"""
+    advertisement = models.ForeignKey(Advertisement, on_delete=models.CASCADE, related_name='matches')
+    provider = models.ForeignKey(User, on_delete=models.CASCADE, related_name='advertisement_matches')
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='advertisement_matches',
+                                help_text="Best matching service of the provider.")
+    score = models.FloatField(help_text="Relevance of the service to the advertisement, higher is better.")
+    notified_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['advertisement', 'provider'], name='unique_advertisement_match'),
+        ]
+        indexes = [
+            models.Index(fields=['notified_at', 'created_at'], name='ad_match_queue_idx'),
+            models.Index(fields=['provider', 'created_at', 'id'], name='ad_match_provider_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.advertisement_id} - {self.provider_id} ({self.score:.2f})"
+
 # SER
 class ServiceBookingRequest(models.Model):
     """Tracks requests made for services"""
@@ -88,6 +125,13 @@ class ServiceBookingRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='booking_user_created_idx'),
+            models.Index(fields=['service', 'created_at', 'id'], name='booking_service_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username}'s request for {self.service.title}"
 
@@ -115,6 +159,10 @@ class SpecialOffer(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='special_offer_user_created_idx'),
+            models.Index(fields=['service', 'created_at', 'id'], name='special_offer_service_idx'),
+        ]
 
 # ORD
 class Order(models.Model):
@@ -146,6 +194,11 @@ class Order(models.Model):
                                                       blank=True, related_name='service_advertisement_request')
     special_offer = models.ForeignKey(SpecialOffer, on_delete=models.SET_NULL, null=True, blank=True,
                                       related_name='special_offer')
+    service = models.ForeignKey(Service, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders',
+                                help_text="Ordered service, copied from the booking request, advertisement request "
+                                          "or special offer on creation.")
+    provider = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='provider_orders', help_text="Provider of the ordered service.")
 
     payment_type = models.CharField(max_length=50, choices=PAYMENT_TYPE_CHOICES, default='full',
                                     help_text="Payment type for the service payment.")
@@ -161,16 +214,39 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+            models.Index(fields=['provider', 'created_at', 'id'], name='order_provider_created_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.user.username}'s order for {self.get_service}"
+        return f"{self.user.username}'s order {self.pk}"
+
+    def save(self, *args, **kwargs):
+        if self.service_id is None and not kwargs.get('update_fields'):
+            self.set_service()
+        super().save(*args, **kwargs)
+
+    def set_service(self):
+        """Copies the service and provider of whichever of booking request, advertisement request or offer is set"""
+        for field, model in (('service_booking_request', ServiceBookingRequest),
+                             ('service_advertisement_request', AdvertisementRequest),
+                             ('special_offer', SpecialOffer)):
+            source_id = getattr(self, f'{field}_id')
+            if source_id is not None:
+                self.service_id, self.provider_id = model.objects.filter(pk=source_id).values_list(
+                    'service_id', 'service__provider_id'
+                ).get()
+                return
 
     def remaining_price(self):
         return self.total_price - self.paid_price
 
     @property
     def get_service(self):
-        if self.service_booking_request:
+        if self.service_id is not None:
+            return self.service
+        elif self.service_booking_request:
             return self.service_booking_request.service
         elif self.service_advertisement_request:
             return self.service_advertisement_request.service
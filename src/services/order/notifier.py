@@ -0,0 +1,22 @@
+from src.apps.whisper.main import NotificationService
+
+
+def notify_providers_advertisement_matches(matches):
+    """One notification per provider listing the given advertisements that match their services"""
+    by_provider = {}
+    for match in matches:
+        by_provider.setdefault(match.provider_id, []).append(match)
+
+    for provider_matches in by_provider.values():
+        provider = provider_matches[0].provider
+        services = ', '.join(match.advertisement.service for match in provider_matches[:3])
+        if len(provider_matches) > 3:
+            services += f' and {len(provider_matches) - 3} more'
+        description = f'New requests match your services: {services}. Send your offer before others do.'
+
+        notify = NotificationService(
+            heading='New matching requests!', description=description,
+            obj=provider_matches[0].advertisement, recipient_list=[provider]
+        )
+        notify.send_app_notification(actor=provider_matches[0].advertisement.user)
+        notify.send_push_notification()
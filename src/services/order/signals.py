@@ -1,28 +1,82 @@
 from django.apps import apps
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
-from src.services.order.models import Order
+from src.services.order.bll import invalidate_provider_bookings, refresh_advertisement_requests_count
+from src.services.order.models import AdvertisementRequest, Order, ServiceBookingRequest, SpecialOffer
+from src.services.order.transitions import status_changed
+from src.services.services.models import Service
+from src.services.services.occurrences import invalidate_service_occurrences
 
 
-@receiver(post_save, sender=Order)
-def handle_order_payment(sender, instance, created, **kwargs):
-    """Handles the wallet balance when order is created and Payment is completed."""
-    if instance.order_status == 'pending' and instance.payment_status == 'completed':
-        wallet = apps.get_model('finance', 'Wallet')
-        provider_wallet = wallet.objects.get(user=instance.service_request.service.provider)
-        provider_wallet.balance_pending += instance.paid_price
+def add_pending_balance(order):
+    """Puts the paid price of the order in the pending balance of its provider."""
+    wallet = apps.get_model('finance', 'Wallet')
+    provider_wallet = wallet.objects.get(user_id=order.provider_id)
+    provider_wallet.balance_pending += float(order.paid_price or 0)
+    provider_wallet.save()
+
+
+def release_pending_balance(order):
+    """Transfers the pending balance of the order's provider to the available balance."""
+    wallet = apps.get_model('finance', 'Wallet')
+    provider_wallet = wallet.objects.get(user_id=order.provider_id)
+    if provider_wallet.balance_pending > 0:
+        provider_wallet.balance_available += provider_wallet.balance_pending
+        provider_wallet.balance_pending = 0
         provider_wallet.save()
 
 
 @receiver(post_save, sender=Order)
-def transfer_pending_to_balance(sender, instance, created, **kwargs):
-    """Transfers the pending balance to available balance once the order is completed."""
-    if instance.order_status == 'completed' and instance.payment_status == 'completed':
-        wallet = apps.get_model('finance', 'Wallet')
-        provider_wallet = wallet.objects.get(user=instance.service_request.service.provider)
-        if provider_wallet.balance_pending > 0:
-            provider_wallet.balance_available += provider_wallet.balance_pending
-            provider_wallet.balance_pending = 0
-            provider_wallet.save()
+def handle_order_payment(sender, instance, created, **kwargs):
+    """
+    Handles the wallet balance when an order is created already paid. Later saves don't move money again, payments
+    completed afterwards go through the status transitions (update_order, used by the API and the admin).
+    """
+    if created and instance.provider_id is not None and instance.payment_status == 'completed':
+        add_pending_balance(instance)
+        if instance.order_status == 'completed':
+            release_pending_balance(instance)
+
+
+@receiver(status_changed, sender=Order, dispatch_uid="order_status_wallet_update")
+def transfer_pending_to_balance(sender, instance, field, new, **kwargs):
+    """Moves the wallet balance once per transition: on payment completion, then on order completion."""
+    if instance.provider_id is None or new != 'completed':
+        return
+    if field == 'payment_status':
+        add_pending_balance(instance)
+        if instance.order_status == 'completed':
+            release_pending_balance(instance)
+    elif field == 'order_status' and instance.payment_status == 'completed':
+        release_pending_balance(instance)
+
+
+@receiver([post_save, post_delete], sender=ServiceBookingRequest, dispatch_uid="booking_request_occurrences_update")
+@receiver([post_save, post_delete], sender=SpecialOffer, dispatch_uid="special_offer_occurrences_update")
+@receiver(status_changed, sender=ServiceBookingRequest, dispatch_uid="booking_request_status_occurrences_update")
+@receiver(status_changed, sender=SpecialOffer, dispatch_uid="special_offer_status_occurrences_update")
+def service_occurrences_update(sender, instance, **kwargs):
+    """Accepted bookings and offers take time out of the service's free occurrences."""
+    invalidate_service_occurrences(instance.service_id)
+
+
+@receiver([post_save, post_delete], sender=ServiceBookingRequest, dispatch_uid="booking_request_conflicts_update")
+@receiver(status_changed, sender=ServiceBookingRequest, dispatch_uid="booking_request_status_conflicts_update")
+def provider_bookings_update(sender, instance, **kwargs):
+    """Any booking change may add or drop an accepted interval of the provider."""
+    provider_id = Service.objects.filter(pk=instance.service_id).values_list('provider_id', flat=True).first()
+    if provider_id is not None:
+        invalidate_provider_bookings(provider_id)
+
+
+@receiver(post_save, sender=AdvertisementRequest, dispatch_uid="advertisement_request_count_create")
+def advertisement_requests_count_create(sender, instance, created, **kwargs):
+    """Keeps Advertisement.requests_count so advertisement lists need no count per row"""
+    if created:
+        refresh_advertisement_requests_count([instance.advertisement_id])
+
 
+@receiver(post_delete, sender=AdvertisementRequest, dispatch_uid="advertisement_request_count_delete")
+def advertisement_requests_count_delete(sender, instance, **kwargs):
+    refresh_advertisement_requests_count([instance.advertisement_id])
@@ -1,3 +1,375 @@
-from django.test import TestCase
+from datetime import datetime, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+import pytz
+from django.contrib import admin
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from src.core.idempotency import IDEMPOTENCY_TTL, IdempotencyStore, purge_expired_idempotency_keys
+from src.core.intervals import IntervalTree
+from src.core.models import IdempotencyKey
+from src.services.finance.models import Wallet
+from src.services.order.admin import ServiceOrderAdmin
+from src.services.order.bll import BookingConflictError, check_booking_conflicts, populate_order_services, update_order
+from src.services.order.matching import dispatch_advertisement_matches, match_pending_advertisements
+from src.services.order.models import Advertisement, AdvertisementMatch, AdvertisementRequest, Order, \
+    ServiceBookingRequest, SpecialOffer
+from src.services.order.transitions import TransitionConflict, transition
+from src.services.services.models import Service
+from src.services.services.search import rebuild_search_index
+from src.services.testcases import ServiceAPITestCase
+
+
+class BookingTestCase(ServiceAPITestCase):
+    """Bookings of the first provider's services by the second provider, one accepted from 12 to 14"""
+
+    def setUp(self):
+        cache.clear()
+        self.service, self.other = Service.objects.filter(provider=self.providers[0])[:2]
+        self.customer = self.providers[1]
+        self.accepted = self.book(self.service, 12, 14, status='accepted')
+
+    def book(self, service, start_hour, end_hour, status='pending'):
+        return ServiceBookingRequest.objects.create(
+            user=self.customer, service=service, status=status,
+            start_datetime=datetime(2026, 10, 19, start_hour, tzinfo=pytz.utc),
+            end_datetime=datetime(2026, 10, 19, end_hour, tzinfo=pytz.utc),
+        )
+
+
+class BookingConflictTestCase(BookingTestCase):
+
+    def accept(self, booking):
+        self.client.force_authenticate(self.providers[0])
+        url = reverse('order:order-api:service-booking-request-update', args=[booking.pk])
+        return self.client.patch(url, {'status': 'accepted'})
+
+    def test_interval_tree_overlaps(self):
+        tree = IntervalTree([(0, 5, 'a'), (3, 8, 'b'), (10, 12, 'c'), (1, 2, 'd')])
+        self.assertEqual([item for _, _, item in tree.overlapping(4, 11)], ['a', 'b', 'c'])
+        self.assertEqual(tree.overlapping(8, 10), [])
+
+    def test_capacity_is_enforced(self):
+        response = self.accept(self.book(self.service, 13, 15))
+        self.assertEqual(response.status_code, 400)
+        self.service.number_of_people = 2
+        self.service.save()
+        self.assertEqual(self.accept(self.book(self.service, 13, 15)).status_code, 200)
+
+    def test_provider_cannot_be_double_booked(self):
+        self.other.number_of_people = 5
+        self.other.save()
+        self.assertEqual(self.accept(self.book(self.other, 13, 15)).status_code, 400)
+        self.assertEqual(self.accept(self.book(self.other, 14, 15)).status_code, 200)
+
+    def test_status_changes_invalidate_the_index(self):
+        booking = self.book(self.service, 13, 15)
+        with self.assertRaises(BookingConflictError):
+            check_booking_conflicts(booking)
+        self.accepted.status = 'canceled'
+        self.accepted.save()
+        check_booking_conflicts(booking)
+
+
+class ProviderInboxTestCase(ServiceAPITestCase):
+
+    def setUp(self):
+        self.provider, self.customer = self.providers
+        self.service = Service.objects.filter(provider=self.provider).first()
+        for hour in range(9, 14):
+            ServiceBookingRequest.objects.create(
+                user=self.customer, service=self.service,
+                start_datetime=datetime(2026, 10, 19, hour, tzinfo=pytz.utc),
+                end_datetime=datetime(2026, 10, 19, hour + 1, tzinfo=pytz.utc),
+            )
+        for day in range(19, 23):
+            SpecialOffer.objects.create(user=self.customer, service=self.service, service_day=f'2026-10-{day}',
+                                        start_time=time(9), end_time=time(10), service_fee=15)
+        self.client.force_authenticate(self.provider)
+        self.url = reverse('order:order-api:provider-inbox')
+
+    def test_pages_merge_every_source_newest_first(self):
+        items, url = [], self.url + '?page_size=3'
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+            self.assertEqual(len(context.captured_queries), 3)
+            items += response.data['results']
+            url = response.data['next']
+
+        self.assertEqual(len(items), 9)
+        self.assertEqual(len({(item['type'], item['id']) for item in items}), 9)
+        created = [item['created_at'] for item in items]
+        self.assertEqual(created, sorted(created, reverse=True))
+        self.assertEqual({item['type'] for item in items}, {'booking_request', 'special_offer'})
+
+    def test_since_only_returns_newer_items(self):
+        newest = self.client.get(self.url).data['results'][0]['created_at']
+        self.assertEqual(self.client.get(self.url, {'since': newest.isoformat()}).data['results'], [])
+        booking = ServiceBookingRequest.objects.create(user=self.customer, service=self.service)
+        results = self.client.get(self.url, {'since': newest.isoformat()}).data['results']
+        self.assertEqual([item['id'] for item in results], [str(booking.pk)])
+
+    def test_other_providers_see_nothing(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get(self.url).data['results'], [])
+
+
+class BookingTransitionTestCase(BookingTestCase):
+
+    def test_illegal_transition_is_rejected(self):
+        booking = self.book(self.other, 9, 10, status='completed')
+        self.client.force_authenticate(self.providers[0])
+        url = reverse('order:order-api:service-booking-request-update', args=[booking.pk])
+        self.assertEqual(self.client.patch(url, {'status': 'pending'}).status_code, 400)
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'completed')
+
+    def test_stale_transition_conflicts(self):
+        booking = self.book(self.other, 9, 10)
+        stale = ServiceBookingRequest.objects.get(pk=booking.pk)
+        transition(booking, 'rejected')
+        with self.assertRaises(TransitionConflict):
+            transition(stale, 'canceled')
+
+    def test_bulk_status(self):
+        pending = [self.book(self.other, hour, hour + 1) for hour in range(6, 9)]
+        ids = [str(booking.pk) for booking in pending + [self.accepted]]
+        self.client.force_authenticate(self.providers[0])
+        url = reverse('order:order-api:service-booking-request-bulk-status')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {'ids': ids, 'status': 'rejected'}, format='json')
+
+        self.assertEqual(sorted(response.data['updated']), sorted(ids[:3]))
+        self.assertEqual(list(response.data['failed']), [str(self.accepted.pk)])
+        self.assertEqual(ServiceBookingRequest.objects.filter(pk__in=ids[:3], status='rejected').count(), 3)
+
+    def test_bulk_accept_checks_conflicts(self):
+        ids = [str(self.book(self.service, 13, 15).pk), str(self.book(self.service, 15, 16).pk)]
+        self.client.force_authenticate(self.providers[0])
+        url = reverse('order:order-api:service-booking-request-bulk-status')
+        response = self.client.post(url, {'ids': ids, 'status': 'accepted'}, format='json')
+        self.assertEqual(response.data['updated'], [ids[1]])
+        self.assertEqual(list(response.data['failed']), [ids[0]])
+
+
+class OrderGraphTestCase(ServiceAPITestCase):
+
+    def setUp(self):
+        self.provider, self.customer = self.providers
+        self.service = Service.objects.filter(provider=self.provider).first()
+
+    def order(self):
+        booking = ServiceBookingRequest.objects.create(user=self.customer, service=self.service)
+        return Order.objects.create(user=self.customer, service_booking_request=booking, total_price=10)
+
+    def test_service_and_provider_are_stored_on_creation(self):
+        order = self.order()
+        self.assertEqual((order.service_id, order.provider_id), (self.service.pk, self.provider.pk))
+
+        Order.objects.filter(pk=order.pk).update(service=None, provider=None)
+        self.assertEqual(populate_order_services(), 1)
+        order.refresh_from_db()
+        self.assertEqual((order.service_id, order.provider_id), (self.service.pk, self.provider.pk))
+
+    def test_provider_orders_load_in_fixed_queries(self):
+        self.order()
+        self.client.force_authenticate(self.provider)
+        url = reverse('order:order-api:provider-order-list')
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        queries = len(context.captured_queries)
+
+        for _ in range(3):
+            self.order()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(len(context.captured_queries), queries)
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertEqual(response.data['results'][0]['service']['id'], str(self.service.pk))
+
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get(url).data['results'], [])
+
+    def test_customers_update_the_order_status_but_not_the_payment(self):
+        order = self.order()
+        self.client.force_authenticate(self.customer)
+        url = reverse('order:order-api:order-retrieve-update', args=[order.pk])
+        data = {'order_status': 'completed', 'payment_status': 'completed', 'tip': 2}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.patch(url, data, format='json').status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual((order.order_status, order.payment_status, order.tip), ('completed', 'pending', 2))
+
+        self.assertEqual(self.client.patch(url, {'order_status': 'cancelled'}, format='json').status_code, 400)
+
+
+class OrderPaymentTestCase(ServiceAPITestCase):
+
+    def setUp(self):
+        self.provider, self.customer = self.providers
+        booking = ServiceBookingRequest.objects.create(
+            user=self.customer, service=Service.objects.filter(provider=self.provider).first()
+        )
+        self.order = Order.objects.create(user=self.customer, service_booking_request=booking, total_price=10,
+                                          paid_price=10)
+
+    def get_wallet(self):
+        return Wallet.objects.get(user=self.provider)
+
+    def admin_change(self, **changes):
+        model_admin = ServiceOrderAdmin(Order, admin.site)
+        request = RequestFactory().post('/')
+        form_class = model_admin.get_form(request, self.order, change=True)
+        initial = form_class(instance=self.order).initial
+        data = {name: value for name, value in initial.items() if value is not None}
+        form = form_class({**data, **changes}, instance=self.order)
+        if form.is_valid():
+            with self.captureOnCommitCallbacks(execute=True):
+                model_admin.save_model(request, form.save(commit=False), form, True)
+        return form
+
+    def test_a_later_payment_credits_the_wallet_once(self):
+        self.assertEqual(self.get_wallet().balance_pending, 0)
+        self.assertTrue(self.admin_change(payment_status='completed').is_valid())
+        self.assertEqual(self.get_wallet().balance_pending, 10)
+
+        # Saving the paid order again, by the admin or in code, moves no money
+        self.assertTrue(self.admin_change(tip=2).is_valid())
+        with self.captureOnCommitCallbacks(execute=True):
+            update_order(self.order, {'payment_status': 'completed'})
+            self.order.save()
+        self.assertEqual(self.get_wallet().balance_pending, 10)
+
+        self.assertTrue(self.admin_change(order_status='completed').is_valid())
+        wallet = self.get_wallet()
+        self.assertEqual((wallet.balance_pending, wallet.balance_available), (0, 10))
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.order_status, self.order.payment_status, self.order.tip),
+                         ('completed', 'completed', 2))
+
+    def test_admin_status_edits_follow_the_transitions(self):
+        self.assertTrue(self.admin_change(order_status='cancelled').is_valid())
+        form = self.admin_change(order_status='completed')
+        self.assertIn('order_status', form.errors)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.order_status, 'cancelled')
+        self.assertEqual(self.get_wallet().balance_pending, 0)
+
+
+class AdvertisementMatchTestCase(ServiceAPITestCase):
+
+    def setUp(self):
+        self.provider, self.customer = self.providers
+        self.service = Service.objects.filter(provider=self.provider).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.title = 'Deep carpet cleaning'
+            self.service.save()
+        rebuild_search_index()
+
+    def advertise(self, text):
+        return Advertisement.objects.create(user=self.customer, service=text, service_type='offline')
+
+    def test_matches_are_queued_once_per_provider(self):
+        advertisement = self.advertise('carpet cleaning')
+        self.assertFalse(AdvertisementMatch.objects.exists())
+        self.assertEqual(match_pending_advertisements(), 1)
+        self.assertEqual(match_pending_advertisements(), 0)
+        matches = list(AdvertisementMatch.objects.filter(advertisement=advertisement))
+        self.assertEqual([match.provider_id for match in matches], [self.provider.pk])
+        self.assertEqual(matches[0].service_id, self.service.pk)
+
+        batches = []
+        self.assertEqual(dispatch_advertisement_matches(batches.append, batch_size=10), 1)
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(dispatch_advertisement_matches(batches.append), 0)
+
+    def test_failed_notifications_stay_queued(self):
+        self.advertise('carpet cleaning')
+        match_pending_advertisements()
+
+        def fail(matches):
+            raise ConnectionError()
+
+        self.assertEqual(dispatch_advertisement_matches(fail), 0)
+        self.assertTrue(AdvertisementMatch.objects.filter(notified_at__isnull=True).exists())
+        self.assertEqual(dispatch_advertisement_matches(lambda matches: None), 1)
+
+    def test_unrelated_advertisements_match_nobody(self):
+        advertisement = self.advertise('guitar lessons')
+        match_pending_advertisements()
+        self.assertFalse(AdvertisementMatch.objects.filter(advertisement=advertisement).exists())
+        advertisement.refresh_from_db()
+        self.assertIsNotNone(advertisement.matched_at)
+
+    def test_requests_count_is_kept(self):
+        advertisement = self.advertise('carpet cleaning')
+        request = AdvertisementRequest.objects.create(
+            advertisement=advertisement, service=self.service,
+            service_provider=self.provider.service_provider_profile
+        )
+        advertisement.refresh_from_db()
+        self.assertEqual(advertisement.get_total_requests(), 1)
+        request.delete()
+        advertisement.refresh_from_db()
+        self.assertEqual(advertisement.requests_count, 0)
+
+
+class IdempotentOrderTestCase(ServiceAPITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.provider, self.customer = self.providers
+        service = Service.objects.filter(provider=self.provider).first()
+        self.booking = ServiceBookingRequest.objects.create(user=self.customer, service=service)
+        self.client.force_authenticate(self.customer)
+        self.url = reverse('order:order-api:service-order-list-create')
+
+    def post(self, key, total_price=10):
+        data = {'service_booking_request': str(self.booking.pk), 'total_price': total_price}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.url, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retries_replay_the_first_response(self):
+        first = self.post('order-1')
+        self.assertEqual(first.status_code, 201)
+        with CaptureQueriesContext(connection) as context:
+            replay = self.post('order-1')
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.data['id'], first.data['id'])
+        self.assertEqual(Order.objects.filter(user=self.customer).count(), 1)
+
+        self.assertEqual(self.post('order-2').status_code, 201)
+        self.assertEqual(Order.objects.filter(user=self.customer).count(), 2)
+
+    def test_key_reuse_with_another_body_is_rejected(self):
+        self.post('order-1')
+        self.assertEqual(self.post('order-1', total_price=20).status_code, 422)
+
+    def test_keys_are_shared_between_workers_and_expire(self):
+        first = self.post('order-1')
+        # Another worker has its own cache, the key must still be found
+        cache.clear()
+        self.assertEqual(self.post('order-1').data['id'], first.data['id'])
+        self.assertEqual(Order.objects.filter(user=self.customer).count(), 1)
+
+        IdempotencyKey.objects.update(created_at=timezone.now() - IDEMPOTENCY_TTL - timedelta(minutes=1))
+        self.assertEqual(purge_expired_idempotency_keys(), 1)
+        self.assertEqual(self.post('order-1').status_code, 201)
+        self.assertEqual(Order.objects.filter(user=self.customer).count(), 2)
+
+    def test_a_key_claimed_meanwhile_replays_the_stored_response(self):
+        first = self.post('order-1')
+        # The first read missed the key, the claim then finds it taken and reads it again
+        with mock.patch.object(IdempotencyStore, 'get', side_effect=[None, IdempotencyKey.objects.get()]):
+            replay = self.post('order-1')
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.data['id'], first.data['id'])
+        self.assertEqual(Order.objects.filter(user=self.customer).count(), 1)
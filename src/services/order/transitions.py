@@ -0,0 +1,123 @@
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from src.services.order.models import AdvertisementRequest, Order, ServiceBookingRequest, SpecialOffer
+
+# Sent once the transaction of a transition commits, with `instance`, `field`, `old` and `new`
+status_changed = Signal()
+
+# Legal moves per model and status field, {field: {from: {to, ...}}}
+TRANSITIONS = {
+    ServiceBookingRequest: {
+        'status': {
+            'pending': {'accepted', 'rejected', 'canceled'},
+            'accepted': {'completed', 'canceled'},
+        },
+    },
+    AdvertisementRequest: {
+        'status': {
+            'pending': {'accepted', 'rejected'},
+        },
+    },
+    SpecialOffer: {
+        'status': {
+            'pending': {'accepted', 'rejected'},
+        },
+    },
+    Order: {
+        'order_status': {
+            'pending': {'completed', 'cancelled'},
+        },
+        'payment_status': {
+            'pending': {'processing', 'completed', 'cancelled'},
+            'processing': {'accepted', 'rejected', 'completed', 'cancelled'},
+            'accepted': {'completed', 'cancelled'},
+            'rejected': {'pending'},
+            'completed': {'refunded'},
+        },
+    },
+}
+
+# Status fields of an order, in the order they are moved when both change at once
+ORDER_STATUS_FIELDS = ('payment_status', 'order_status')
+
+
+class TransitionError(Exception):
+    pass
+
+
+class TransitionConflict(TransitionError):
+    pass
+
+
+def get_transition_sources(model, status, field='status'):
+    """The statuses `status` can be reached from"""
+    return [old for old, targets in TRANSITIONS[model][field].items() if status in targets]
+
+
+def check_transition(instance, status, field='status'):
+    current = getattr(instance, field)
+    if status not in TRANSITIONS[type(instance)][field].get(current, ()):
+        raise TransitionError(f"Cannot change {field.replace('_', ' ')} from {current} to {status}.")
+
+
+def get_transition_values(model, field, status):
+    values = {field: status}
+    if any(model_field.name == 'updated_at' for model_field in model._meta.concrete_fields):
+        values['updated_at'] = timezone.now()
+    return values
+
+
+def queue_status_changed(model, instances, field, old_statuses, status):
+    def send():
+        for instance in instances:
+            status_changed.send(sender=model, instance=instance, field=field, old=old_statuses[instance.pk], new=status)
+
+    transaction.on_commit(send)
+
+
+def transition(instance, status, field='status'):
+    """
+    Moves the instance to `status` with `UPDATE ... WHERE pk = <pk> AND <field> = <status it was loaded with>`, so
+    of two concurrent moves from the same status only the first one applies and the other raises TransitionConflict.
+    No save() runs, status_changed is sent after commit instead of post_save.
+    """
+    model = type(instance)
+    current = getattr(instance, field)
+    if status == current:
+        return instance
+
+    check_transition(instance, status, field)
+    values = get_transition_values(model, field, status)
+    if not model.objects.filter(pk=instance.pk, **{field: current}).update(**values):
+        raise TransitionConflict("It was changed in the meantime, reload it and try again.")
+
+    for name, value in values.items():
+        setattr(instance, name, value)
+    queue_status_changed(model, [instance], field, {instance.pk: current}, status)
+    return instance
+
+
+def bulk_transition(queryset, status, field='status'):
+    """
+    Moves every row of the queryset whose status can reach `status` with one locked read and one UPDATE, and
+    returns the moved instances. Rows in any other status are left as they are.
+    """
+    model = queryset.model
+    with transaction.atomic():
+        instances = list(
+            queryset.select_for_update(of=('self',))
+            .filter(**{f'{field}__in': get_transition_sources(model, status, field)})
+        )
+        if not instances:
+            return []
+
+        values = get_transition_values(model, field, status)
+        model.objects.filter(pk__in=[instance.pk for instance in instances]).update(**values)
+        old_statuses = {instance.pk: getattr(instance, field) for instance in instances}
+        for instance in instances:
+            for name, value in values.items():
+                setattr(instance, name, value)
+        queue_status_changed(model, instances, field, old_statuses, status)
+    return instances
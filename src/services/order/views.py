@@ -47,6 +47,9 @@ class AdvertisementRequestsListView(ListView):
 class OrderListView(ListView):
     model = Order
 
+    def get_queryset(self):
+        return Order.objects.select_related('user', 'service')
+
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super(OrderListView, self).get_context_data(**kwargs)
         order_filter = OrderFilter(self.request.GET, queryset=self.get_queryset())
@@ -2,7 +2,7 @@ from django.contrib import admin
 from .models import (
     ServiceCategory, Service, ServiceImage,
     ServiceAvailability, ServiceReview, FavoriteService,
-    ServiceCurrency, ServiceLocation, ServiceLanguage, ServiceRule, ServiceRuleInstruction)
+    ServiceCurrency, ServiceLocation, ServiceLanguage, ServiceRule, ServiceRuleInstruction, MaterialTag)
 
 
 class ServiceImageInline(admin.TabularInline):
@@ -45,7 +45,7 @@ class ServiceCategoryAdmin(admin.ModelAdmin):
 
 class ServiceCurrencyAdmin(admin.ModelAdmin):
     """Admin interface for ServiceCurrency"""
-    list_display = ('name', 'code', 'symbol', 'is_active', 'created_at', 'updated_at')
+    list_display = ('name', 'code', 'symbol', 'exchange_rate', 'is_active', 'created_at', 'updated_at')
     search_fields = ('name', 'code', 'symbol')
     list_filter = ('is_active',)
 
@@ -59,6 +59,12 @@ class ServiceAdmin(admin.ModelAdmin):
     list_filter = ('is_active', 'category', 'currency')
     inlines = [ServiceImageInline, ServiceAvailabilityInline, ServiceLocationInline, ServiceReviewInline]
 
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.save_edits()
+        else:
+            obj.save()
+
 
 class ServiceImageAdmin(admin.ModelAdmin):
     """Admin interface for ServiceImage"""
@@ -111,6 +117,12 @@ class ServiceRuleInstructionAdmin(admin.ModelAdmin):
     list_display = ['id', 'service_rule', 'required_material', 'created_at', 'updated_at']
 
 
+class MaterialTagAdmin(admin.ModelAdmin):
+    """Admin configuration for MaterialTag model"""
+    list_display = ['name', 'label', 'created_at']
+    search_fields = ['name', 'label']
+
+
 admin.site.register(ServiceCategory, ServiceCategoryAdmin)
 admin.site.register(ServiceCurrency, ServiceCurrencyAdmin)
 admin.site.register(Service, ServiceAdmin)
@@ -122,3 +134,4 @@ admin.site.register(ServiceReview, ServiceReviewAdmin)
 admin.site.register(FavoriteService, FavoriteServiceAdmin)
 admin.site.register(ServiceRule, ServiceRuleAdmin)
 admin.site.register(ServiceRuleInstruction, ServiceRuleInstructionAdmin)
+admin.site.register(MaterialTag, MaterialTagAdmin)
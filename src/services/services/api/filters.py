@@ -1,78 +1,130 @@
 import django_filters
-from django.db.models import Avg, Q
 
+from src.services.services.bll import get_available_service_filter, get_material_service_filter, \
+    filter_services_by_distance, get_category_path
 from src.services.services.models import Service
+from src.services.services.search import search_service_queryset
+from src.services.services.utils import WEEK_DAYS, datetime_range_to_utc_intervals, local_slot_to_utc_intervals, \
+    validate_timezone
+
+DEFAULT_SEARCH_RADIUS_KM = 50
+MAX_SEARCH_RADIUS_KM = 500
 
 
 class ServiceFilter(django_filters.FilterSet):
     search = django_filters.CharFilter(method='search_services', field_name='search By Title ')
-    category = django_filters.UUIDFilter(field_name="category__id")
+    category = django_filters.UUIDFilter(method='filter_by_category', help_text='Category and its subcategories.')
     average_rating = django_filters.NumberFilter(method='filter_by_average_rating')
+    service_type = django_filters.ChoiceFilter(choices=Service.SERVICE_TYPE_CHOICES)
+    min_price = django_filters.NumberFilter(field_name='base_price', lookup_expr='gte',
+                                            help_text='Minimum price after discount, in the base currency.')
+    max_price = django_filters.NumberFilter(field_name='base_price', lookup_expr='lte',
+                                            help_text='Maximum price after discount, in the base currency.')
     date = django_filters.CharFilter(method='filter_by_date_and_time')
     start_time = django_filters.TimeFilter(method='filter_by_date_and_time')
     end_time = django_filters.TimeFilter(method='filter_by_date_and_time')
+    timezone = django_filters.CharFilter(method='filter_by_date_and_time', validators=[validate_timezone],
+                                         help_text='Timezone of start_time and end_time, UTC by default.')
+    available_from = django_filters.IsoDateTimeFilter(method='filter_by_availability')
+    available_to = django_filters.IsoDateTimeFilter(method='filter_by_availability')
 
     address = django_filters.CharFilter(field_name='location__address', lookup_expr='icontains')
     city = django_filters.CharFilter(field_name='location__city', lookup_expr='icontains')
     region = django_filters.CharFilter(field_name='location__region', lookup_expr='icontains')
     country = django_filters.CharFilter(field_name='location__country__name', lookup_expr='icontains')
 
-    latitude = django_filters.CharFilter(method='filter_by_latitude')
-    longitude = django_filters.CharFilter(method='filter_by_longitude')
+    latitude = django_filters.NumberFilter(method='filter_by_distance')
+    longitude = django_filters.NumberFilter(method='filter_by_distance')
+    radius = django_filters.NumberFilter(method='filter_by_distance', help_text='Search radius in km.')
 
     # ✅ NEW: Filter for materials/tags
-    materials = django_filters.CharFilter(method='filter_by_materials')
+    materials = django_filters.CharFilter(method='filter_by_materials', help_text='Comma separated material names.')
+    materials_match = django_filters.ChoiceFilter(
+        method='filter_by_materials', choices=(('any', 'Any'), ('all', 'All')),
+        help_text='Whether services need any (default) or all of the materials.'
+    )
+
+    # `-popular` lists the highest rank first, like every other `-` ordering
+    ordering = django_filters.OrderingFilter(
+        fields=(
+            ('rank_score', 'popular'),
+            ('rating_avg', 'rating'),
+            ('rating_count', 'reviews'),
+            ('base_price', 'price'),
+            ('created_at', 'created_at'),
+            ('title', 'title'),
+        )
+    )
 
     class Meta:
         model = Service
         fields = ['category', 'average_rating', 'date', 'start_time', 'end_time', 'materials']
 
+    def filter_by_category(self, queryset, name, value):
+        path = get_category_path(value)
+        if not path:
+            return queryset.filter(category__id=value)
+        return queryset.filter(category__path__startswith=path)
+
     def filter_by_average_rating(self, queryset, name, value):
-        return queryset.annotate(average_rating=Avg('reviews__rating')).filter(average_rating=value)
+        return queryset.filter(rating_avg=value)
 
     def filter_by_date_and_time(self, queryset, name, value):
-        date = self.data.get('date')
-        start_time = self.data.get('start_time')
-        end_time = self.data.get('end_time')
-
-        if date and start_time and end_time:
-            queryset = queryset.filter(
-                availability_slots__day_of_week=date,
-                availability_slots__start_time__lte=start_time,
-                availability_slots__end_time__gte=end_time,
-                availability_slots__is_active=True
-            )
-
-        return queryset
-
-    def filter_by_latitude(self, queryset, name, value):
-        longitude = self.data.get('longitude')
-
-        if value and longitude:
-            return queryset.filter(
-                location__latitude__range=(float(value) - 5, float(value) + 5),
-                location__longitude__range=(float(longitude) - 5, float(longitude) + 5)
-            )
-        return queryset
-
-    def filter_by_longitude(self, queryset, name, value):
-        latitude = self.data.get('latitude')
-
-        if value and latitude:
-            return queryset.filter(
-                location__longitude__range=(float(value) - 5, float(value) + 5),
-                location__latitude__range=(float(latitude) - 5, float(latitude) + 5)
-            )
-        return queryset
+        """Services with availability covering start_time to end_time on the given day of the week."""
+        if name != 'date':
+            # date, start_time, end_time and timezone are applied together, only once.
+            return queryset
+
+        start_time = self.form.cleaned_data.get('start_time')
+        end_time = self.form.cleaned_data.get('end_time')
+        if value not in WEEK_DAYS or not start_time or not end_time:
+            return queryset
+
+        timezone = self.form.cleaned_data.get('timezone') or 'UTC'
+        intervals = local_slot_to_utc_intervals(value, start_time, end_time, timezone)
+        return queryset.filter(get_available_service_filter(intervals, contained=True))
+
+    def filter_by_availability(self, queryset, name, value):
+        """Services available at some point between available_from and available_to."""
+        if name != 'available_from':
+            return queryset
+
+        available_to = self.form.cleaned_data.get('available_to')
+        if value is None or available_to is None:
+            return queryset
+
+        intervals = datetime_range_to_utc_intervals(value, available_to)
+        if not intervals:
+            return queryset.none()
+        return queryset.filter(get_available_service_filter(intervals))
+
+    def filter_by_distance(self, queryset, name, value):
+        """Services within `radius` km of (latitude, longitude), nearest first, with a `distance` annotation."""
+        if name != 'latitude':
+            # latitude, longitude and radius are applied together, only once.
+            return queryset
+
+        longitude = self.form.cleaned_data.get('longitude')
+        if value is None or longitude is None:
+            return queryset
+
+        radius = self.form.cleaned_data.get('radius') or DEFAULT_SEARCH_RADIUS_KM
+        radius = min(float(radius), MAX_SEARCH_RADIUS_KM)
+
+        queryset = filter_services_by_distance(queryset, float(value), float(longitude), radius)
+        return queryset.order_by('distance', 'id')
 
     def search_services(self, queryset, name, value):
-        return queryset.filter(Q(title__icontains=value) | Q(description__icontains=value))
+        """Full-text match on the search index, best match first, with a `search_rank` annotation."""
+        return search_service_queryset(queryset, value)
 
     def filter_by_materials(self, queryset, name, value):
-        materials = [m.strip() for m in value.split(',') if m.strip()]
-        q = Q()
+        if name != 'materials':
+            return queryset
 
-        for material in materials:
-            q |= Q(servicerule__serviceruleinstruction__required_material__icontains=material)
+        materials = [m.strip() for m in value.split(',') if m.strip()]
+        if not materials:
+            return queryset
 
-        return queryset.filter(q).distinct()
\ No newline at end of file
+        match_all = self.form.cleaned_data.get('materials_match') == 'all'
+        return queryset.filter(get_material_service_filter(materials, match_all=match_all))
\ No newline at end of file
@@ -1,8 +1,11 @@
+import pytz
 from django.apps import apps
 from rest_framework import serializers
 
+from src.core.prefetch import EagerLoadingSerializerMixin, prefixed_prefetch
 from src.services.services.models import ServiceCategory, Service, ServiceImage, ServiceAvailability, ServiceReview, \
-    ServiceCurrency, ServiceLocation, FavoriteService, ServiceLanguage, ServiceRule, ServiceRuleInstruction, UserReview
+    ServiceCurrency, ServiceLocation, FavoriteService, ServiceLanguage, ServiceRule, ServiceRuleInstruction, \
+    UserReview, MaterialTag
 from src.services.users.models import User
 
 """ ---------------------Helper Serializers--------------------- """
@@ -17,12 +20,11 @@ class UserProfileSerializer(serializers.ModelSerializer):
         fields = ['id', 'provider_id', 'username', 'profile_image', 'location']
 
     def get_location(self, obj):
-        if obj.get_provider_location():
-            return obj.get_provider_location()
-        return None
+        return obj.get_provider_location() or None
 
     def get_provider_id(self, obj):
-        return obj.get_service_provider_profile().id if obj.get_service_provider_profile() else None
+        service_provider_profile = obj.get_service_provider_profile()
+        return service_provider_profile.id if service_provider_profile else None
 
 
 """ ---------------------Service Serializers--------------------- """
@@ -34,6 +36,12 @@ class ServiceCategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'parent', 'thumbnail', 'description', 'is_active']
         ref_name = 'ServiceCategoryServices'
 
+    def validate_parent(self, parent):
+        error = (self.instance or ServiceCategory()).get_parent_error(parent)
+        if error:
+            raise serializers.ValidationError(error)
+        return parent
+
 
 class ServiceCurrencySerializer(serializers.ModelSerializer):
     class Meta:
@@ -54,6 +62,21 @@ class ServiceAvailabilitySerializer(serializers.ModelSerializer):
                   'is_active']
 
 
+class ServiceScheduleSlotSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ServiceAvailability
+        fields = ['repeat_type', 'activity_type', 'day_of_week', 'start_time', 'end_time', 'timezone']
+
+    def validate_timezone(self, value):
+        if value not in pytz.all_timezones_set:
+            raise serializers.ValidationError("Unknown timezone.")
+        return value
+
+
+class ServiceScheduleSerializer(serializers.Serializer):
+    slots = ServiceScheduleSlotSerializer(many=True, allow_empty=True)
+
+
 class ServiceLocationSerializer(serializers.ModelSerializer):
     class Meta:
         model = ServiceLocation
@@ -85,19 +108,41 @@ class UserServiceReviewSerializer(serializers.ModelSerializer):
         return data
 
 
-class ServiceSerializer(serializers.ModelSerializer):
+class ServiceSerializer(EagerLoadingSerializerMixin, serializers.ModelSerializer):
     provider = UserProfileSerializer()
     category = serializers.SerializerMethodField()
     rating = serializers.SerializerMethodField()
     schedule = serializers.SerializerMethodField()
     images = ServiceImageSerializer(many=True, read_only=True)
     currency = ServiceCurrencySerializer()
+    distance = serializers.SerializerMethodField()
 
     class Meta:
         model = Service
         fields = ['id', 'title', 'provider', 'images', 'thumbnail', 'category', 'service_type', 'schedule',
                   'description',
-                  'price_type', 'price', 'discount', 'currency', 'rating', 'is_active']
+                  'price_type', 'price', 'discount', 'effective_price', 'currency', 'rating', 'rating_avg',
+                  'rating_count', 'distance',
+                  'is_active']
+
+    select_related_fields = (
+        'provider__address__country', 'provider__service_provider_profile', 'category', 'currency'
+    )
+
+    @classmethod
+    def get_prefetch_related(cls, prefix=''):
+        return [
+            prefixed_prefetch(prefix, 'images', queryset=ServiceImage.objects.filter(is_active=True)),
+            prefixed_prefetch(
+                prefix, 'availability_slots', queryset=ServiceAvailability.objects.filter(is_active=True),
+                to_attr='active_availability_slots'
+            ),
+        ]
+
+    def get_distance(self, obj):
+        """Distance in km, only present on radius searches"""
+        distance = getattr(obj, 'distance', None)
+        return round(distance, 3) if distance is not None else None
 
     def get_rating(self, obj):
         return obj.get_total_rating()
@@ -108,7 +153,9 @@ class ServiceSerializer(serializers.ModelSerializer):
         return None
 
     def get_schedule(self, obj):
-        schedules = obj.get_service_schedule()
+        schedules = getattr(obj, 'active_availability_slots', None)
+        if schedules is None:
+            schedules = obj.get_service_schedule()
         data = []
         for schedule in schedules:
             data.append({
@@ -159,6 +206,14 @@ class ServiceRuleInstructionSerializer(serializers.ModelSerializer):
         read_only_fields = ['service_rule', 'required_material', 'created_at', 'updated_at']
 
 
+class MaterialTagSerializer(serializers.ModelSerializer):
+    services = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = MaterialTag
+        fields = ['id', 'name', 'label', 'services']
+
+
 class ServiceDetailSerializer(serializers.ModelSerializer):
     provider = UserProfileSerializer()
     images = ServiceImageSerializer(many=True, read_only=True)
@@ -174,27 +229,14 @@ class ServiceDetailSerializer(serializers.ModelSerializer):
         model = Service
         fields = [
             'id', 'title', 'provider', 'service_type', 'thumbnail', 'description', 'content', 'price_type', 'price',
-            'discount', 'currency', 'number_of_people',
+            'discount', 'effective_price', 'currency', 'number_of_people', 'rating_avg', 'rating_count',
+            'rating_histogram',
             'category', 'is_active', 'images', 'availability_slots', 'rules_and_instructions', 'location', 'languages',
             'reviews', 'created_at'
         ]
 
     def get_rules_and_instructions(self, obj):
-        rules = ServiceRule.objects.filter(service=obj)
-        data = []
-        for rule in rules:
-            instructions = ServiceRuleInstruction.objects.filter(service_rule=rule)
-            instructions_data = []
-            for instruction in instructions:
-                instructions_data.append({
-                    'required_material': instruction.required_material
-                })
-            data.append({
-                'id': rule.id,
-                'event_rule': rule.event_rule,
-                'instructions': instructions_data
-            })
-        return data
+        return ServiceRuleListSerializer(obj.servicerule_set.all(), many=True).data
 
 
 class ServiceCreateUpdateSerializer(serializers.ModelSerializer):
@@ -210,8 +252,46 @@ class ServiceCreateUpdateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("You already have a service with this title.")
         return value
 
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save_edits()
+        return instance
+
 
 class ServiceRuleInstructionCreateSerializer(serializers.Serializer):
     """Get Event Rule  and multiple required_material"""
     event_rule = serializers.CharField()
     required_material = serializers.ListField(child=serializers.CharField())
+
+
+class ServiceRuleBulkItemSerializer(ServiceRuleInstructionCreateSerializer):
+    """A rule with its materials; with an `id` it updates that existing rule"""
+    id = serializers.UUIDField(required=False)
+    event_rule = serializers.CharField(max_length=300)
+    required_material = serializers.ListField(child=serializers.CharField(max_length=50), allow_empty=True)
+
+
+class ServiceRuleBulkSerializer(serializers.Serializer):
+    rules = ServiceRuleBulkItemSerializer(many=True)
+
+    def validate_rules(self, value):
+        ids = [rule['id'] for rule in value if rule.get('id')]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("A rule can only appear once.")
+        return value
+
+
+class RuleInstructionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ServiceRuleInstruction
+        fields = ['required_material']
+
+
+class ServiceRuleListSerializer(serializers.ModelSerializer):
+    """Rules with their instructions, read from a `servicerule_set__serviceruleinstruction_set` prefetch"""
+    instructions = RuleInstructionSerializer(source='serviceruleinstruction_set', many=True, read_only=True)
+
+    class Meta:
+        model = ServiceRule
+        fields = ['id', 'event_rule', 'instructions']
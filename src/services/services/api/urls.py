@@ -9,7 +9,8 @@ from .views import (
     ServiceCurrencyView, ServiceLanguageCreateAPIView, ServiceLanguageDestroyUpdateAPIView,
     ServiceRuleInstructionCreateAPIView, UserServiceReviewCreateAPIView, ServiceCategoryCreateAPIView,
     ServiceRuleInstructionUpdateAPIView, ServiceRuleInstructionDeleteAPIView, ProviderServiceImageUpdateAPIView,
-    ProviderServiceImageDeleteAPIView
+    ProviderServiceImageDeleteAPIView, MaterialTagAutocompleteAPIView, CacheStatsAPIView, ServiceRuleBulkAPIView,
+    ServiceScheduleAPIView, ServiceOccurrenceAPIView, ServiceAutocompleteAPIView
 )
 
 app_name = "services-api"
@@ -19,8 +20,12 @@ urlpatterns = [
     path('v1/services/', ServiceListAPIView.as_view(), name='service-list'),
 
     path('v1/services/category/', ServiceCategoryCreateAPIView.as_view(), name='service-category-create'),
+    path('v1/services/materials/', MaterialTagAutocompleteAPIView.as_view(), name='material-tag-autocomplete'),
+    path('v1/services/autocomplete/', ServiceAutocompleteAPIView.as_view(), name='service-autocomplete'),
+    path('v1/services/cache-stats/', CacheStatsAPIView.as_view(), name='service-cache-stats'),
 
     path('v1/services/<str:pk>/', ServiceDetailAPIView.as_view(), name='service-detail'),
+    path('v1/services/<str:pk>/availability/', ServiceOccurrenceAPIView.as_view(), name='service-availability'),
 ]
 
 urlpatterns += [
@@ -46,6 +51,8 @@ urlpatterns += [
 urlpatterns += [
     path('v1/provider/services/<str:service_pk>/availability/', ServiceAvailabilityCreateAPIView.as_view(),
          name='provider-service-availability-create'),
+    path('v1/provider/services/<uuid:service_pk>/schedule/', ServiceScheduleAPIView.as_view(),
+         name='provider-service-schedule'),
     path('v1/provider/services/<str:service_pk>/availability/<str:pk>/',
          ServiceAvailabilityUpdateDestroyAPIView.as_view(),
          name='provider-service-availability-update-destroy'),
@@ -75,6 +82,8 @@ urlpatterns += [
 urlpatterns += [
     path('v1/provider/services/<uuid:service_pk>/rule-instruction/', ServiceRuleInstructionCreateAPIView.as_view(),
          name='provider-service-rule-instruction-create'),
+    path('v1/provider/services/<uuid:service_pk>/rules/', ServiceRuleBulkAPIView.as_view(),
+         name='provider-service-rules'),
     path('v1/provider/services/rule-instruction/<uuid:rule_pk>/update/', ServiceRuleInstructionUpdateAPIView.as_view(),
          name='provider-service-rule-instruction-update'),
     path('v1/provider/services/rule-instruction/<uuid:rule_pk>/delete/', ServiceRuleInstructionDeleteAPIView.as_view(),
@@ -1,19 +1,37 @@
+import uuid
+from datetime import timedelta
+
 from django.apps import apps
+from django.db.models import Count
+from django.http import HttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
 from rest_framework.generics import ListAPIView, RetrieveAPIView, ListCreateAPIView, RetrieveUpdateDestroyAPIView, \
-    get_object_or_404, CreateAPIView, DestroyAPIView, UpdateAPIView, RetrieveUpdateAPIView
-from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, AllowAny
+    get_object_or_404, CreateAPIView, DestroyAPIView, UpdateAPIView, RetrieveUpdateAPIView, GenericAPIView
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from src.core.cache import get_cache_stats
+from src.core.pagination import TitleCursorPagination
+from src.core.prefetch import EagerLoadingMixin
 from src.services.services.api.filters import ServiceFilter
+from src.services.services.bll import ServiceRuleError, get_service_rules, save_service_rules, ScheduleError, \
+    replace_service_schedule
+from src.services.services.cache import SERVICE_DETAIL_CACHE, get_service_detail
+from src.services.services.facets import get_service_facets
+from src.services.services.occurrences import OCCURRENCE_HORIZON_DAYS, get_service_occurrences
+from src.services.services.typeahead import TYPEAHEAD_KINDS, search_typeahead
 from src.services.services.api.serializers import ServiceSerializer, ServiceDetailSerializer, \
     ServiceCreateUpdateSerializer, ServiceImageSerializer, ServiceAvailabilitySerializer, ServiceLocationSerializer, \
     ServiceReviewSerializer, ServiceCurrencySerializer, ServiceLanguageSerializer, \
     ServiceRuleInstructionCreateSerializer, ServiceLanguageCreateSerializer, UserServiceReviewSerializer, \
-    ServiceCategorySerializer
+    ServiceCategorySerializer, MaterialTagSerializer, ServiceRuleBulkSerializer, ServiceRuleListSerializer, \
+    ServiceScheduleSerializer
 from src.services.services.models import Service, ServiceImage, ServiceLocation, ServiceAvailability, ServiceReview, \
-    ServiceCurrency, ServiceRuleInstruction, ServiceLanguage, ServiceRule, ServiceCategory
+    ServiceCurrency, ServiceLanguage, ServiceRule, ServiceCategory, MaterialTag
+from src.services.services.utils import normalize_tag_name
 
 """SERVICE SEEKER APIS"""
 
@@ -24,12 +42,22 @@ class ServiceCategoryCreateAPIView(CreateAPIView):
     permission_classes = [IsAuthenticated]
 
 
-class ServiceListAPIView(ListAPIView):
+class ServiceListAPIView(EagerLoadingMixin, ListAPIView):
     queryset = Service.objects.filter(is_active=True)
     serializer_class = ServiceSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = ServiceFilter
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = TitleCursorPagination
+
+    def list(self, request, *args, **kwargs):
+        """With `facets=1`, the page comes with counts per facet value for the whole filtered result."""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        if request.query_params.get('facets') in ('1', 'true'):
+            response.data['facets'] = get_service_facets(queryset)
+        return response
 
 
 class ServiceDetailAPIView(RetrieveAPIView):
@@ -37,17 +65,57 @@ class ServiceDetailAPIView(RetrieveAPIView):
     serializer_class = ServiceDetailSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
-    def get_object(self):
-        return get_object_or_404(Service, is_active=True, pk=self.kwargs.get('pk'))
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            service_id = uuid.UUID(str(self.kwargs.get('pk')))
+        except ValueError:
+            raise NotFound()
+
+        payload = get_service_detail(service_id)
+        if payload is None:
+            raise NotFound()
+        return HttpResponse(payload, content_type='application/json')
+
+
+class ServiceOccurrenceAPIView(APIView):
+    """
+    Next free time windows of an active service, in UTC: its availability slots expanded over the next `days`
+    (default 14, at most 60), minus accepted bookings and special offers. `duration` (minutes) drops shorter windows.
+    """
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    max_results = 100
+
+    def get(self, request, *args, **kwargs):
+        service = get_object_or_404(Service, is_active=True, pk=self.kwargs.get('pk'))
+        try:
+            days = min(max(int(request.query_params.get('days', 14)), 1), OCCURRENCE_HORIZON_DAYS)
+            duration = timedelta(minutes=max(int(request.query_params.get('duration', 0)), 0))
+        except ValueError:
+            raise ValidationError({'detail': 'days and duration must be integers.'})
+
+        windows = [
+            {'start': start, 'end': end}
+            for start, end in get_service_occurrences(service, days=days) if end - start >= duration
+        ]
+        return Response({'service': service.pk, 'slots': windows[:self.max_results]})
+
+
+class CacheStatsAPIView(APIView):
+    """Hit and miss counters of the service caches"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response({SERVICE_DETAIL_CACHE: get_cache_stats(SERVICE_DETAIL_CACHE)})
 
 
 """SERVICE SEEKER APIS"""
 
 
 # Provider Service
-class ProviderServiceListCreateAPIView(ListCreateAPIView):
+class ProviderServiceListCreateAPIView(EagerLoadingMixin, ListCreateAPIView):
     queryset = Service.objects.all()
     permission_classes = [IsAuthenticated]
+    pagination_class = TitleCursorPagination
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -55,7 +123,7 @@ class ProviderServiceListCreateAPIView(ListCreateAPIView):
         return ServiceSerializer
 
     def get_queryset(self):
-        return Service.objects.filter(provider=self.request.user)
+        return super().get_queryset().filter(provider=self.request.user)
 
     def perform_create(self, serializer):
         serializer.save(provider=self.request.user)
@@ -152,6 +220,32 @@ class ServiceAvailabilityUpdateDestroyAPIView(UpdateAPIView, DestroyAPIView):
         return Response(status=status.HTTP_200_OK, data={'message': 'Availability slot deleted successfully'})
 
 
+class ServiceScheduleAPIView(GenericAPIView):
+    """
+    Weekly schedule of a provider's service. PUT replaces the whole schedule in one request: slots are validated
+    for overlaps, then inserted, updated or deactivated in one transaction. Both methods return the active slots.
+    """
+    serializer_class = ServiceScheduleSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_service(self):
+        return get_object_or_404(Service, provider=self.request.user, pk=self.kwargs.get('service_pk'))
+
+    def get(self, request, *args, **kwargs):
+        slots = ServiceAvailability.objects.filter(service=self.get_service(), is_active=True)
+        return Response(ServiceAvailabilitySerializer(slots, many=True).data)
+
+    def put(self, request, *args, **kwargs):
+        service = self.get_service()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            slots = replace_service_schedule(service, serializer.validated_data['slots'])
+        except ScheduleError as error:
+            raise ValidationError({'slots': str(error)})
+        return Response(ServiceAvailabilitySerializer(slots, many=True).data, status=status.HTTP_200_OK)
+
+
 # Provider Service Location
 
 class ServiceLocationCreateAPIView(CreateAPIView):
@@ -184,6 +278,45 @@ class ServiceCurrencyView(ListAPIView):
     serializer_class = ServiceCurrencySerializer
 
 
+class MaterialTagAutocompleteAPIView(ListAPIView):
+    """Material tags starting with `q`, most used first"""
+    serializer_class = MaterialTagSerializer
+    permission_classes = [AllowAny]
+    pagination_class = None
+    limit = 10
+
+    def get_queryset(self):
+        prefix = normalize_tag_name(self.request.query_params.get('q', ''))
+        if not prefix:
+            return MaterialTag.objects.none()
+        return (
+            MaterialTag.objects.filter(name__startswith=prefix)
+            .annotate(services=Count('service_tags')).filter(services__gt=0)
+            .order_by('-services', 'name')[:self.limit]
+        )
+
+
+class ServiceAutocompleteAPIView(APIView):
+    """
+    Search box suggestions: service titles, categories, cities and materials with a word starting with `q`, as
+    type/id/label triples. `types` restricts them, e.g. `types=service,category`. Served from process memory.
+    """
+    permission_classes = [AllowAny]
+    default_limit = 8
+    max_limit = 20
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(max(int(request.query_params.get('limit', self.default_limit)), 1), self.max_limit)
+        except ValueError:
+            raise ValidationError({'limit': 'limit must be an integer.'})
+
+        kinds = TYPEAHEAD_KINDS
+        if request.query_params.get('types'):
+            kinds = tuple(kind for kind in request.query_params['types'].split(',') if kind in TYPEAHEAD_KINDS)
+        return Response(search_typeahead(request.query_params.get('q', ''), limit=limit, kinds=kinds))
+
+
 class ServiceReviewCreateAPIView(CreateAPIView):
     queryset = ServiceReview.objects.all()
     serializer_class = ServiceReviewSerializer
@@ -245,10 +378,7 @@ class ServiceRuleInstructionCreateAPIView(CreateAPIView):
 
     def perform_create(self, serializer):
         service = get_object_or_404(Service, provider=self.request.user, pk=self.kwargs.get('service_pk'))
-        event_rule = serializer.validated_data.get('event_rule')
-        service_rule = ServiceRule.objects.create(service=service, event_rule=event_rule)
-        for material in serializer.validated_data.get('required_material'):
-            ServiceRuleInstruction.objects.create(service_rule=service_rule, required_material=material)
+        save_service_rules(service, [serializer.validated_data])
         return Response(status=status.HTTP_201_CREATED, data={'message': 'Service rule created successfully'})
 
 
@@ -271,18 +401,8 @@ class ServiceRuleInstructionUpdateAPIView(UpdateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        service_rule.event_rule = serializer.validated_data['event_rule']
-        service_rule.save()
-
-        # Delete old instructions
-        ServiceRuleInstruction.objects.filter(service_rule=service_rule).delete()
-
-        # Create new ones
-        for material in serializer.validated_data['required_material']:
-            ServiceRuleInstruction.objects.create(
-                service_rule=service_rule,
-                required_material=material
-            )
+        # Keeps unchanged instructions, only the removed and added materials are written
+        save_service_rules(service_rule.service, [{'id': service_rule.pk, **serializer.validated_data}])
 
         return Response({'message': 'Service rule updated successfully'}, status=status.HTTP_200_OK)
 
@@ -304,3 +424,36 @@ class ServiceRuleInstructionDeleteAPIView(DestroyAPIView):
         service_rule = self.get_object()
         service_rule.delete()
         return Response({'message': 'Service rule deleted successfully'}, status=status.HTTP_204_NO_CONTENT)
+
+
+class ServiceRuleBulkAPIView(GenericAPIView):
+    """
+    Rules of a provider's service with their materials.
+    POST creates the rules without an `id` and updates the ones with one, PUT does the same and deletes the rules
+    left out. Both write everything in one transaction and return the resulting rules.
+    """
+    serializer_class = ServiceRuleBulkSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_service(self):
+        return get_object_or_404(Service, provider=self.request.user, pk=self.kwargs.get('service_pk'))
+
+    def get(self, request, *args, **kwargs):
+        rules = get_service_rules(self.get_service())
+        return Response(ServiceRuleListSerializer(rules, many=True).data)
+
+    def post(self, request, *args, **kwargs):
+        return self.save_rules(request, replace=False)
+
+    def put(self, request, *args, **kwargs):
+        return self.save_rules(request, replace=True)
+
+    def save_rules(self, request, replace):
+        service = self.get_service()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            rules = save_service_rules(service, serializer.validated_data['rules'], replace=replace)
+        except ServiceRuleError as error:
+            raise ValidationError({'rules': str(error)})
+        return Response(ServiceRuleListSerializer(rules, many=True).data, status=status.HTTP_200_OK)
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ServicesConfig(AppConfig):
@@ -7,3 +8,7 @@ class ServicesConfig(AppConfig):
 
     def ready(self):
         import src.services.services.signals
+        from src.services.services.search import setup_search_index
+
+        # There are no migrations to hold the raw search table, it is created after every migrate instead
+        post_migrate.connect(setup_search_index, sender=self, dispatch_uid="services_setup_search_index")
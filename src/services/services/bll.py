@@ -0,0 +1,610 @@
+import math
+from datetime import timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import ASin, Cast, Coalesce, Cos, Least, Power, Radians, Round, Sin, Sqrt, TruncDate
+from django.utils import timezone
+
+from src.core.cache import bump_cache_version, get_cache_version
+from src.core.intervals import find_overlap, merge_intervals
+from src.services.services.cache import evict_service_details
+from src.services.services.models import MaterialTag, Service, ServiceAvailability, ServiceAvailabilityInterval, \
+    ServiceCategory, ServiceCurrency, ServiceLocation, ServiceMaterialTag, ServiceNeighbour, ServiceReview, \
+    ServiceRule, ServiceRuleInstruction, FavoriteService, empty_rating_histogram
+from src.services.services.occurrences import invalidate_service_occurrences
+from src.services.services.search import schedule_service_index
+from src.services.services.typeahead import record_typeahead_change
+from src.services.services.utils import EARTH_RADIUS_KM, KM_PER_DEGREE, WEEK_DAYS, local_slot_to_utc_intervals, \
+    normalize_tag_name
+
+""" ---------------------Geo Search--------------------- """
+
+
+def get_distance_expression(latitude, longitude):
+    """Haversine distance in km from the point to the row's latitude/longitude, computed by the database"""
+    row_latitude = Radians(Cast('latitude', FloatField()))
+    row_longitude = Radians(Cast('longitude', FloatField()))
+    latitude, longitude = math.radians(latitude), math.radians(longitude)
+    half_chord = (
+        Power(Sin((row_latitude - Value(latitude)) / 2), 2)
+        + Value(math.cos(latitude)) * Cos(row_latitude) * Power(Sin((row_longitude - Value(longitude)) / 2), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Least(Sqrt(half_chord), Value(1.0)))
+
+
+def get_bounding_box_filter(latitude, longitude, radius_km):
+    """
+    Latitude/longitude ranges holding the whole circle, so the coordinates index narrows the rows before the exact
+    distance is computed. Near the poles every longitude is kept, across the antimeridian the range wraps around.
+    """
+    lat_delta = radius_km / KM_PER_DEGREE
+    condition = Q(latitude__gte=latitude - lat_delta, latitude__lte=latitude + lat_delta)
+    if abs(latitude) + lat_delta >= 90:
+        return condition
+
+    lon_delta = radius_km / (KM_PER_DEGREE * math.cos(math.radians(latitude)))
+    if lon_delta >= 180:
+        return condition
+    west, east = longitude - lon_delta, longitude + lon_delta
+    if west < -180:
+        return condition & (Q(longitude__gte=west + 360) | Q(longitude__lte=east))
+    if east > 180:
+        return condition & (Q(longitude__gte=west) | Q(longitude__lte=east - 360))
+    return condition & Q(longitude__gte=west, longitude__lte=east)
+
+
+def get_nearby_locations(latitude, longitude, radius_km):
+    """Active locations inside the radius, with their `distance` in km"""
+    return ServiceLocation.objects.filter(
+        get_bounding_box_filter(latitude, longitude, radius_km), is_active=True
+    ).annotate(distance=get_distance_expression(latitude, longitude)).filter(distance__lte=radius_km)
+
+
+def filter_services_by_distance(queryset, latitude, longitude, radius_km):
+    """
+    Restricts the queryset to services with an active location inside the radius, annotated with the `distance`
+    of their nearest one. Both are subqueries, the filtering stays in the database.
+    """
+    locations = get_nearby_locations(latitude, longitude, radius_km)
+    nearest = locations.filter(service_id=OuterRef('pk')).order_by('distance').values('distance')[:1]
+    return queryset.filter(pk__in=locations.values('service_id')).annotate(
+        distance=Subquery(nearest, output_field=FloatField())
+    )
+
+
+""" ---------------------Rating Aggregates--------------------- """
+
+RATING_FIELDS = ['rating_sum', 'rating_count', 'rating_avg', 'rating_histogram']
+
+
+def get_rating_aggregates(histogram):
+    """Builds the stored rating columns of a service from its 1-5 histogram"""
+    rating_count = sum(histogram.values())
+    rating_sum = sum(int(rating) * count for rating, count in histogram.items())
+    rating_avg = round(Decimal(rating_sum) / rating_count, 2) if rating_count else Decimal('0.00')
+    return {
+        'rating_sum': rating_sum,
+        'rating_count': rating_count,
+        'rating_avg': rating_avg,
+        'rating_histogram': histogram,
+    }
+
+
+def apply_service_rating_change(service_id, removed_rating=None, added_rating=None):
+    """
+    Moves one review's contribution out of and/or into the stored aggregates of a service.
+    The service row is locked for the read-modify-write so concurrent reviews can't lose updates.
+    """
+    if service_id is None or removed_rating == added_rating:
+        return
+
+    with transaction.atomic():
+        histogram = (
+            Service.objects.select_for_update().filter(pk=service_id)
+            .values_list('rating_histogram', flat=True).first()
+        )
+        if histogram is None:
+            return
+
+        histogram = {**empty_rating_histogram(), **histogram}
+        if removed_rating is not None:
+            histogram[str(removed_rating)] = max(histogram[str(removed_rating)] - 1, 0)
+        if added_rating is not None:
+            histogram[str(added_rating)] += 1
+
+        Service.objects.filter(pk=service_id).update(**get_rating_aggregates(histogram))
+
+
+def rebuild_service_ratings(queryset=None, batch_size=1000):
+    """Recomputes the stored rating aggregates of the given services from their active reviews in bulk"""
+    queryset = queryset if queryset is not None else Service.objects.all()
+
+    histograms = {}
+    reviews = (
+        ServiceReview.objects.filter(is_active=True, service__in=queryset)
+        .values('service_id', 'rating').annotate(total=Count('id')).order_by()
+    )
+    for row in reviews:
+        histogram = histograms.setdefault(row['service_id'], empty_rating_histogram())
+        histogram[str(row['rating'])] = row['total']
+
+    batch, updated = [], 0
+    for service in queryset.only('id').iterator():
+        for field, value in get_rating_aggregates(histograms.get(service.pk, empty_rating_histogram())).items():
+            setattr(service, field, value)
+        batch.append(service)
+        if len(batch) >= batch_size:
+            updated += Service.objects.bulk_update(batch, RATING_FIELDS)
+            batch = []
+
+    if batch:
+        updated += Service.objects.bulk_update(batch, RATING_FIELDS)
+    return updated
+
+
+""" ---------------------Availability Intervals--------------------- """
+
+
+def get_slot_intervals(slot):
+    """
+    UTC minute-of-week intervals covered by a slot. Daily slots repeat on every day of the week; weekly, monthly and
+    one-time slots only carry a day of the week, so they are indexed on that day.
+    """
+    days = WEEK_DAYS if slot.activity_type == 'recurring' and slot.repeat_type == 'daily' else [slot.day_of_week]
+    intervals = []
+    for day in days:
+        intervals += local_slot_to_utc_intervals(day, slot.start_time, slot.end_time, slot.timezone)
+    return intervals
+
+
+def rebuild_availability_intervals(service_ids):
+    """Replaces the stored availability intervals of the given services with the ones of their active slots"""
+    service_ids = [service_id for service_id in set(service_ids) if service_id]
+    if not service_ids:
+        return 0
+
+    intervals = {service_id: [] for service_id in service_ids}
+    for slot in ServiceAvailability.objects.filter(service_id__in=service_ids, is_active=True):
+        intervals[slot.service_id] += get_slot_intervals(slot)
+
+    with transaction.atomic():
+        ServiceAvailabilityInterval.objects.filter(service_id__in=service_ids).delete()
+        created = ServiceAvailabilityInterval.objects.bulk_create([
+            ServiceAvailabilityInterval(service_id=service_id, start_minute=start, end_minute=end)
+            for service_id, service_intervals in intervals.items()
+            for start, end in merge_intervals(service_intervals)
+        ])
+    return len(created)
+
+
+def get_available_service_filter(intervals, contained=False):
+    """
+    Q on services with stored availability overlapping any part of the given UTC minute-of-week intervals, or with
+    `contained` covering all of them. Each part is answered by a range lookup on (start_minute, end_minute).
+    """
+    service_filter = Q()
+    for start, end in intervals:
+        if contained:
+            interval_filter = Q(start_minute__lte=start, end_minute__gte=end)
+        else:
+            interval_filter = Q(start_minute__lt=end, end_minute__gt=start)
+        available = Q(pk__in=ServiceAvailabilityInterval.objects.filter(interval_filter).values('service_id'))
+        service_filter = service_filter & available if contained else service_filter | available
+    return service_filter
+
+
+""" ---------------------Material Tags--------------------- """
+
+
+def get_material_tags(labels):
+    """Returns {name: MaterialTag} for the given material labels, adding the missing ones to the dictionary"""
+    labels = {normalize_tag_name(label): label.strip() for label in labels}
+    labels.pop('', None)
+    if not labels:
+        return {}
+
+    MaterialTag.objects.bulk_create(
+        [MaterialTag(name=name, label=label[:50]) for name, label in labels.items()], ignore_conflicts=True
+    )
+    tags = {tag.name: tag for tag in MaterialTag.objects.filter(name__in=labels)}
+    record_typeahead_change('material', [tag.pk for tag in tags.values()])
+    return tags
+
+
+def sync_service_material_tags(service_ids):
+    """Makes the material tags of the given services match the materials of their rule instructions"""
+    service_ids = [service_id for service_id in set(service_ids) if service_id]
+    if not service_ids:
+        return
+
+    materials = {service_id: set() for service_id in service_ids}
+    for service_id, material in ServiceRuleInstruction.objects.filter(
+            service_rule__service_id__in=service_ids
+    ).values_list('service_rule__service_id', 'required_material'):
+        materials[service_id].add(material)
+
+    tags = get_material_tags({material for service_materials in materials.values() for material in service_materials})
+    wanted = {
+        (service_id, tags[normalize_tag_name(material)].pk)
+        for service_id, service_materials in materials.items()
+        for material in service_materials if normalize_tag_name(material) in tags
+    }
+
+    with transaction.atomic():
+        current = set(
+            ServiceMaterialTag.objects.filter(service_id__in=service_ids).values_list('service_id', 'tag_id')
+        )
+        stale = Q()
+        for service_id, tag_id in current - wanted:
+            stale |= Q(service_id=service_id, tag_id=tag_id)
+        if stale:
+            ServiceMaterialTag.objects.filter(stale).delete()
+        ServiceMaterialTag.objects.bulk_create(
+            [ServiceMaterialTag(service_id=service_id, tag_id=tag_id) for service_id, tag_id in wanted - current],
+            ignore_conflicts=True
+        )
+
+
+def get_material_service_filter(materials, match_all=False):
+    """Q on services tagged with any (or all, with `match_all`) of the given materials"""
+    names = {normalize_tag_name(material) for material in materials} - {''}
+    tagged = ServiceMaterialTag.objects.filter(tag__name__in=names)
+    if match_all:
+        tagged = tagged.values('service_id').annotate(tags=Count('tag_id')).filter(tags=len(names))
+    return Q(pk__in=tagged.values('service_id'))
+
+
+""" ---------------------Category Tree--------------------- """
+
+CATEGORY_TREE_CACHE = 'category-tree'
+_category_tree = None
+
+
+class CategoryTree:
+    """Active categories loaded in one query, each with its active children in `tree_children`"""
+
+    def __init__(self, version, categories):
+        self.version = version
+        self.nodes = {category.pk: category for category in categories}
+        self.roots = []
+        for category in categories:
+            category.tree_children = []
+        for category in categories:
+            if category.parent_id is None:
+                self.roots.append(category)
+            elif category.parent_id in self.nodes:
+                self.nodes[category.parent_id].tree_children.append(category)
+
+
+def get_category_tree():
+    """
+    The active category tree, kept in process memory and reloaded only when another write moved the shared
+    generation counter past the loaded one.
+    """
+    global _category_tree
+    version = get_cache_version(CATEGORY_TREE_CACHE)
+    if _category_tree is None or _category_tree.version != version:
+        _category_tree = CategoryTree(version, list(ServiceCategory.objects.filter(is_active=True).order_by('name')))
+    return _category_tree
+
+
+def invalidate_category_tree():
+    bump_cache_version(CATEGORY_TREE_CACHE)
+
+
+def get_category_path(category_id):
+    category = get_category_tree().nodes.get(category_id)
+    if category is not None:
+        return category.path
+    return ServiceCategory.objects.filter(pk=category_id).values_list('path', flat=True).first()
+
+
+def rebuild_category_paths(batch_size=1000):
+    """Recomputes the materialized path and depth of every category, top down"""
+    categories = list(ServiceCategory.objects.only('id', 'parent_id', 'path', 'depth'))
+    children = {}
+    for category in categories:
+        children.setdefault(category.parent_id, []).append(category)
+
+    ids = {category.pk for category in categories}
+    level = [category for category in categories if category.parent_id is None or category.parent_id not in ids]
+    for category in level:
+        category.path, category.depth = f'{category.pk.hex}/', 0
+
+    ordered = []
+    while level:
+        ordered += level
+        next_level = []
+        for parent in level:
+            for child in children.get(parent.pk, []):
+                child.path, child.depth = f'{parent.path}{child.pk.hex}/', parent.depth + 1
+                next_level.append(child)
+        level = next_level
+
+    ServiceCategory.objects.bulk_update(ordered, ['path', 'depth'], batch_size=batch_size)
+    invalidate_category_tree()
+    return len(ordered)
+
+
+""" ---------------------Service Rules--------------------- """
+
+
+class ServiceRuleError(Exception):
+    pass
+
+
+def get_service_rules(service):
+    """Rules of a service with their instructions, in two queries"""
+    return ServiceRule.objects.filter(service=service).prefetch_related('serviceruleinstruction_set')
+
+
+def diff_materials(instructions, materials):
+    """Splits a rule's instructions into the ones to delete and the materials to add, keeping unchanged ones"""
+    remaining = list(materials)
+    stale = []
+    for instruction in instructions:
+        if instruction.required_material in remaining:
+            remaining.remove(instruction.required_material)
+        else:
+            stale.append(instruction.pk)
+    return stale, remaining
+
+
+def save_service_rules(service, rules, replace=False):
+    """
+    Writes many rules with their materials in one transaction. Rules with an `id` are updated in place and their
+    instructions diffed, rules without one are created, and with `replace` the rules left out are deleted.
+    Creates and updates are bulk queries, so the derived data the model signals would refresh is refreshed here.
+    """
+    with transaction.atomic():
+        existing = {rule.pk: rule for rule in get_service_rules(service).select_for_update()}
+        unknown = [rule['id'] for rule in rules if rule.get('id') and rule['id'] not in existing]
+        if unknown:
+            raise ServiceRuleError(f"Unknown rules for this service: {', '.join(map(str, unknown))}")
+
+        new_rules, changed_rules, stale_instructions, new_instructions = [], [], [], []
+        for data in rules:
+            rule = existing.get(data.get('id'))
+            if rule is None:
+                rule = ServiceRule(service=service, event_rule=data['event_rule'])
+                new_rules.append(rule)
+                materials = data['required_material']
+            else:
+                if rule.event_rule != data['event_rule']:
+                    rule.event_rule, rule.updated_at = data['event_rule'], timezone.now()
+                    changed_rules.append(rule)
+                stale, materials = diff_materials(rule.serviceruleinstruction_set.all(), data['required_material'])
+                stale_instructions += stale
+            new_instructions += [
+                ServiceRuleInstruction(service_rule=rule, required_material=material) for material in materials
+            ]
+
+        if replace:
+            kept = {data['id'] for data in rules if data.get('id')}
+            removed = [pk for pk in existing if pk not in kept]
+            ServiceRule.objects.filter(pk__in=removed).delete()
+        if stale_instructions:
+            ServiceRuleInstruction.objects.filter(pk__in=stale_instructions).delete()
+        ServiceRule.objects.bulk_create(new_rules)
+        if changed_rules:
+            ServiceRule.objects.bulk_update(changed_rules, ['event_rule', 'updated_at'])
+        ServiceRuleInstruction.objects.bulk_create(new_instructions)
+
+        refresh_service_rule_dependents(service.pk)
+    return get_service_rules(service)
+
+
+def refresh_service_rule_dependents(service_id):
+    sync_service_material_tags([service_id])
+    schedule_service_index([service_id])
+    evict_service_details([service_id])
+
+
+""" ---------------------Weekly Schedule--------------------- """
+
+SCHEDULE_FIELDS = ['activity_type', 'repeat_type', 'end_time', 'timezone', 'is_active']
+
+
+class ScheduleError(Exception):
+    pass
+
+
+def validate_schedule(slots):
+    """Rejects a schedule whose slots repeat a (day, start time) or overlap once converted to UTC"""
+    keys = set()
+    intervals = []
+    for index, slot in enumerate(slots):
+        key = (slot.day_of_week, slot.start_time)
+        if key in keys:
+            raise ScheduleError(f"More than one slot starts on {slot.day_of_week} at {slot.start_time}.")
+        keys.add(key)
+        intervals += [(start, end, index) for start, end in get_slot_intervals(slot)]
+
+    overlap = find_overlap(intervals)
+    if overlap:
+        first, second = (slots[index] for index in overlap)
+        raise ScheduleError(
+            f"Slots {first.day_of_week} {first.start_time}-{first.end_time} and "
+            f"{second.day_of_week} {second.start_time}-{second.end_time} overlap."
+        )
+
+
+def replace_service_schedule(service, slots):
+    """
+    Makes the given slots the whole active schedule of a service in one transaction: slots are matched to the
+    stored ones on (day_of_week, start_time), the unique key, then updated, inserted or deactivated in bulk.
+    """
+    slots = [ServiceAvailability(service=service, **data) for data in slots]
+    validate_schedule(slots)
+
+    with transaction.atomic():
+        existing = {
+            (slot.day_of_week, slot.start_time): slot
+            for slot in ServiceAvailability.objects.select_for_update().filter(service=service)
+        }
+        now = timezone.now()
+        created, updated = [], []
+        for slot in slots:
+            stored = existing.pop((slot.day_of_week, slot.start_time), None)
+            if stored is None:
+                created.append(slot)
+                continue
+            slot.is_active = True
+            if any(getattr(stored, field) != getattr(slot, field) for field in SCHEDULE_FIELDS):
+                for field in SCHEDULE_FIELDS:
+                    setattr(stored, field, getattr(slot, field))
+                stored.updated_at = now
+                updated.append(stored)
+
+        for stored in existing.values():
+            if stored.is_active:
+                stored.is_active, stored.updated_at = False, now
+                updated.append(stored)
+
+        ServiceAvailability.objects.bulk_create(created)
+        if updated:
+            ServiceAvailability.objects.bulk_update(updated, [*SCHEDULE_FIELDS, 'updated_at'])
+
+        rebuild_availability_intervals([service.pk])
+        evict_service_details([service.pk])
+        invalidate_service_occurrences(service.pk)
+    return ServiceAvailability.objects.filter(service=service, is_active=True)
+
+
+""" ---------------------Prices--------------------- """
+
+
+def refresh_service_prices(currency_ids=None):
+    """
+    Recomputes the effective and base prices of the services priced in the given currencies (None for services
+    without one, all of them by default) with one UPDATE per currency, after exchange rates changed.
+    """
+    rates = ServiceCurrency.get_exchange_rates()
+    if currency_ids is None:
+        currency_ids = [None, *rates]
+
+    effective_price = Round(F('price') * (100 - F('discount')) / 100, 2)
+    updated = 0
+    for currency_id in currency_ids:
+        rate = rates.get(currency_id, Decimal(1))
+        updated += Service.objects.filter(currency_id=currency_id).update(
+            effective_price=effective_price, base_price=Round(effective_price * rate, 2)
+        )
+    return updated
+
+
+""" ---------------------Recommendations--------------------- """
+
+RECOMMENDATION_SEEDS = 50
+
+
+def get_recommended_service_ids(user, limit=10):
+    """
+    Active services most similar to the ones the user lately favorited or requested, scored by the sum of their
+    precomputed neighbour similarities in a single query. The seeds themselves and the user's own services are left
+    out. Empty until build_service_recommendations has run.
+    """
+    booking_model = apps.get_model('order', 'ServiceBookingRequest')
+    favorites = FavoriteService.objects.filter(user=user).order_by('-created_at').values('service_id')
+    bookings = booking_model.objects.filter(user=user).order_by('-created_at').values('service_id')
+    favorites, bookings = favorites[:RECOMMENDATION_SEEDS], bookings[:RECOMMENDATION_SEEDS]
+
+    rows = (
+        ServiceNeighbour.objects.filter(Q(service__in=favorites) | Q(service__in=bookings), neighbour__is_active=True)
+        .exclude(neighbour__provider=user).exclude(neighbour__in=favorites).exclude(neighbour__in=bookings)
+        .values('neighbour_id').annotate(total=Sum('score')).order_by('-total', 'neighbour_id')[:limit]
+    )
+    return [row['neighbour_id'] for row in rows]
+
+
+""" ---------------------Ranking--------------------- """
+
+RATING_PRIOR_WEIGHT = 10
+POPULARITY_HALF_LIFE_DAYS = 30
+POPULARITY_WINDOW_DAYS = 180
+POPULARITY_WEIGHTS = {'booking': 2.0, 'favorite': 1.0, 'order': 3.0}
+RANK_POPULARITY_WEIGHT = 0.5
+SCORE_FIELDS = ['rating_score', 'popularity_score', 'rank_score']
+
+
+def get_ordered_service_id():
+    """The service an order is for, its own or, for older orders, the one of its booking, advertisement or offer"""
+    return Coalesce('service_id', 'service_booking_request__service_id', 'service_advertisement_request__service_id',
+                    'special_offer__service_id')
+
+
+def get_bayesian_rating(rating_sum, rating_count, prior_mean, prior_weight=RATING_PRIOR_WEIGHT):
+    """Average rating as if the service also had `prior_weight` reviews at the average of all services"""
+    return (prior_weight * prior_mean + rating_sum) / (prior_weight + rating_count)
+
+
+def get_prior_rating_mean():
+    """Average rating over the reviews of all services"""
+    totals = Service.objects.aggregate(rating_sum=Sum('rating_sum'), rating_count=Sum('rating_count'))
+    return totals['rating_sum'] / totals['rating_count'] if totals['rating_count'] else 0
+
+
+def get_initial_service_scores():
+    """Scores of a service without reviews or activity yet, ranked as an average service until the next update"""
+    rating_score = get_bayesian_rating(0, 0, get_prior_rating_mean())
+    return {'rating_score': rating_score, 'popularity_score': 0, 'rank_score': rating_score}
+
+
+def get_popularity_scores(now):
+    """
+    {service_id: score} summing bookings, favorites and orders of the last POPULARITY_WINDOW_DAYS, each weighted by
+    its kind and halved every POPULARITY_HALF_LIFE_DAYS. Events are counted per service and day in SQL.
+    """
+    booking_model = apps.get_model('order', 'ServiceBookingRequest')
+    order_model = apps.get_model('order', 'Order')
+    since = now - timedelta(days=POPULARITY_WINDOW_DAYS)
+
+    sources = (
+        ('booking', booking_model.objects.exclude(status__in=['rejected', 'canceled']), 'service_id'),
+        ('favorite', FavoriteService.objects.all(), 'service_id'),
+        ('order', order_model.objects.exclude(order_status='cancelled').annotate(
+            ordered_service_id=get_ordered_service_id()), 'ordered_service_id'),
+    )
+    today = timezone.localdate(now)
+    scores = {}
+    for name, queryset, field in sources:
+        rows = (
+            queryset.filter(created_at__gte=since).annotate(day=TruncDate('created_at'))
+            .values(field, 'day').annotate(total=Count('id')).order_by()
+        )
+        for row in rows:
+            if row[field] is None:
+                continue
+            age = max((today - row['day']).days, 0)
+            decay = 0.5 ** (age / POPULARITY_HALF_LIFE_DAYS)
+            scores[row[field]] = scores.get(row[field], 0) + POPULARITY_WEIGHTS[name] * row['total'] * decay
+    return scores
+
+
+def update_service_scores(queryset=None, batch_size=1000, now=None):
+    """
+    Recomputes the Bayesian rating, popularity and rank scores of the given services in bulk. The rank adds the
+    log of the popularity to the smoothed rating, so activity breaks ties without drowning the rating.
+    """
+    queryset = queryset if queryset is not None else Service.objects.all()
+    now = now or timezone.now()
+
+    prior_mean = get_prior_rating_mean()
+    popularity = get_popularity_scores(now)
+
+    batch, updated = [], 0
+    for service in queryset.only('id', 'rating_sum', 'rating_count').iterator():
+        service.rating_score = get_bayesian_rating(service.rating_sum, service.rating_count, prior_mean)
+        service.popularity_score = popularity.get(service.pk, 0)
+        service.rank_score = service.rating_score + RANK_POPULARITY_WEIGHT * math.log1p(service.popularity_score)
+        batch.append(service)
+        if len(batch) >= batch_size:
+            updated += Service.objects.bulk_update(batch, SCORE_FIELDS)
+            batch = []
+
+    if batch:
+        updated += Service.objects.bulk_update(batch, SCORE_FIELDS)
+    return updated
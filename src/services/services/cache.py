@@ -0,0 +1,106 @@
+import json
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.utils.encoders import JSONEncoder
+
+from src.core.cache import record_cache_access
+from src.core.helpers import AbsoluteURLRequest
+from src.services.services.api.serializers import ServiceDetailSerializer
+from src.services.services.models import Service, ServiceImage, ServiceAvailability, ServiceLocation, \
+    ServiceLanguage, ServiceRule, ServiceRuleInstruction, ServiceReview, ServiceCategory, ServiceCurrency
+from src.services.users.models import User, Address
+
+SERVICE_DETAIL_CACHE = 'service-detail'
+# Writes that skip the signals (queryset updates, bulk writes) are picked up at the latest after this
+SERVICE_DETAIL_TIMEOUT = 60 * 60
+
+
+def get_service_detail_key(service_id):
+    return f'{SERVICE_DETAIL_CACHE}:{service_id}'
+
+
+def get_service_detail_queryset():
+    """Everything ServiceDetailSerializer reads, in a fixed number of queries"""
+    reviewer = 'reviews__reviewer'
+    return Service.objects.select_related(
+        'provider__address__country', 'provider__service_provider_profile', 'category', 'currency'
+    ).prefetch_related(
+        'images', 'availability_slots', 'location', 'languages__language',
+        f'{reviewer}__address__country', f'{reviewer}__service_provider_profile',
+        'servicerule_set__serviceruleinstruction_set',
+    )
+
+
+def get_service_detail(service_id):
+    """
+    Rendered JSON of an active service's detail, or None if there is none. Cached per service until a write to
+    anything it shows evicts it (see SERVICE_DETAIL_DEPENDENCIES).
+    """
+    key = get_service_detail_key(service_id)
+    payload = cache.get(key)
+    record_cache_access(SERVICE_DETAIL_CACHE, hit=payload is not None)
+    if payload is not None:
+        return payload
+
+    service = get_service_detail_queryset().filter(is_active=True, pk=service_id).first()
+    if service is None:
+        return None
+
+    data = ServiceDetailSerializer(service, context={'request': AbsoluteURLRequest()}).data
+    payload = json.dumps(data, cls=JSONEncoder, separators=(',', ':'))
+    cache.set(key, payload, SERVICE_DETAIL_TIMEOUT)
+    return payload
+
+
+def evict_service_details(service_ids):
+    """Drops the cached detail of the given services, now and again on commit so no reader re-caches old rows"""
+    keys = [get_service_detail_key(service_id) for service_id in set(service_ids) if service_id]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+""" ---------------------Dependency Registry--------------------- """
+
+
+def get_user_service_ids(user_id):
+    """Services showing the user, as provider or as reviewer"""
+    provided = Service.objects.filter(provider_id=user_id).values_list('pk', flat=True)
+    reviewed = ServiceReview.objects.filter(reviewer_id=user_id, service__isnull=False).values_list(
+        'service_id', flat=True
+    )
+    return [*provided, *reviewed]
+
+
+def get_instruction_service_ids(instruction):
+    return ServiceRule.objects.filter(pk=instruction.service_rule_id).values_list('service_id', flat=True)
+
+
+def get_review_service_ids(review):
+    snapshot = getattr(review, '_rating_snapshot', None) or {}
+    return [review.service_id, snapshot.get('service_id')]
+
+
+# Models shown in the service detail, each with a function returning the ids of the services a change to an
+# instance affects. Receivers evicting those entries are connected for every model listed here.
+SERVICE_DETAIL_DEPENDENCIES = {
+    Service: lambda service: [service.pk],
+    ServiceImage: lambda image: [image.service_id],
+    ServiceAvailability: lambda slot: [slot.service_id],
+    ServiceLocation: lambda location: [location.service_id],
+    ServiceLanguage: lambda language: [language.service_id],
+    ServiceRule: lambda rule: [rule.service_id],
+    ServiceRuleInstruction: get_instruction_service_ids,
+    ServiceReview: get_review_service_ids,
+    ServiceCategory: lambda category: category.services.values_list('pk', flat=True),
+    ServiceCurrency: lambda currency: currency.services.values_list('pk', flat=True),
+    User: lambda user: get_user_service_ids(user.pk),
+    Address: lambda address: get_user_service_ids(address.user_id),
+}
+
+# Fields the service detail shows of the models not shown in full. A save limited by update_fields to other
+# fields, such as the last_login of a user, evicts nothing.
+SERVICE_DETAIL_FIELDS = {
+    User: {'username', 'profile_image'},
+}
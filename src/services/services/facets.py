@@ -0,0 +1,86 @@
+from django.db.models import Case, CharField, Count, Q, Value, When
+
+from src.services.services.bll import get_category_tree
+from src.services.services.models import Service, ServiceCategory, ServiceLocation
+
+FACET_CITY_LIMIT = 20
+PRICE_BANDS = ((0, 25), (25, 50), (50, 100), (100, 250), (250, None))
+RATING_BANDS = ((4, None), (3, 4), (2, 3), (1, 2), (None, 1))
+
+
+def get_band_label(low, high):
+    if high is None:
+        return f'{low}+'
+    return f'{low or 0}-{high}'
+
+
+def get_band_expression(field, bands):
+    """A CASE labelling each row with the [low, high) band its field falls in"""
+    whens = []
+    for low, high in bands:
+        condition = Q()
+        if low is not None:
+            condition &= Q(**{f'{field}__gte': low})
+        if high is not None:
+            condition &= Q(**{f'{field}__lt': high})
+        whens.append(When(condition, then=Value(get_band_label(low, high))))
+    return Case(*whens, default=Value(None), output_field=CharField())
+
+
+def get_category_labels(category_ids):
+    nodes = get_category_tree().nodes
+    labels = {category_id: nodes[category_id].name for category_id in category_ids if category_id in nodes}
+    missing = [category_id for category_id in category_ids if category_id not in labels]
+    if missing:
+        labels.update(ServiceCategory.objects.filter(pk__in=missing).values_list('pk', 'name'))
+    return labels
+
+
+def get_service_facets(queryset):
+    """
+    Counts per category, service type, price band, rating band and city of the services matched by `queryset`.
+    The service columns are grouped together in one query, each combination counted once and summed per facet
+    here. Cities live on the locations, a service can have several, so they are counted distinctly in a second query.
+    """
+    services = Service.objects.filter(pk__in=queryset.order_by().values('pk'))
+    rows = services.annotate(
+        price_band=get_band_expression('base_price', PRICE_BANDS),
+        rating_band=get_band_expression('rating_avg', RATING_BANDS),
+    ).values('category_id', 'service_type', 'price_band', 'rating_band').annotate(count=Count('id')).order_by()
+
+    counts = {'category': {}, 'service_type': {}, 'price': {}, 'rating': {}}
+    for row in rows:
+        for facet, value in (('category', row['category_id']), ('service_type', row['service_type']),
+                             ('price', row['price_band']), ('rating', row['rating_band'])):
+            if value is not None:
+                counts[facet][value] = counts[facet].get(value, 0) + row['count']
+
+    category_labels = get_category_labels(list(counts['category']))
+    service_types = dict(Service.SERVICE_TYPE_CHOICES)
+    facets = {
+        'category': [
+            {'value': value, 'label': category_labels.get(value, ''), 'count': count}
+            for value, count in sorted(counts['category'].items(), key=lambda item: -item[1])
+        ],
+        'service_type': [
+            {'value': value, 'label': service_types.get(value, value), 'count': count}
+            for value, count in sorted(counts['service_type'].items(), key=lambda item: -item[1])
+        ],
+        'price': [
+            {'value': label, 'label': label, 'count': counts['price'][label]}
+            for label in (get_band_label(low, high) for low, high in PRICE_BANDS) if label in counts['price']
+        ],
+        'rating': [
+            {'value': label, 'label': label, 'count': counts['rating'][label]}
+            for label in (get_band_label(low, high) for low, high in RATING_BANDS) if label in counts['rating']
+        ],
+    }
+
+    cities = (
+        ServiceLocation.objects.filter(service__in=services, is_active=True).exclude(city__isnull=True)
+        .exclude(city='').values('city').annotate(count=Count('service', distinct=True)).order_by('-count', 'city')
+    )
+    facets['city'] = [
+        {'value': row['city'], 'label': row['city'], 'count': row['count']} for row in cities[:FACET_CITY_LIMIT]
+    ]
+    return facets
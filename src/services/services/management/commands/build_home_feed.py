@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from src.api.v1.feed import build_home_feed
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the cached home feed sections, meant to run on a schedule (e.g. every 15 minutes)"
+
+    def handle(self, *args, **options):
+        sections = build_home_feed()
+        self.stdout.write(self.style.SUCCESS(f"Built {len(sections)} home feed sections"))
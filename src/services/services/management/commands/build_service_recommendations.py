@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from src.services.services.recommendations import NEIGHBOURS_PER_SERVICE, build_service_neighbours
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the similar services behind the personalized home feed. Incremental by default, "
+        "meant to run periodically from a worker; --full rebuilds every service."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true')
+        parser.add_argument('--top-k', type=int, default=NEIGHBOURS_PER_SERVICE)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = build_service_neighbours(full=options['full'], top_k=options['top_k'],
+                                         batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt neighbours of {count} services"))
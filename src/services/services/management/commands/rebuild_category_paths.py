@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from src.services.services.bll import rebuild_category_paths
+
+
+class Command(BaseCommand):
+    help = "Recomputes the materialized path and depth of every service category"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = rebuild_category_paths(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt paths for {updated} categories"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from src.services.services.bll import sync_service_material_tags
+from src.services.services.models import Service
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the material tag dictionary and the material tags of every service from its rule instructions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        service_ids = list(Service.objects.values_list('pk', flat=True))
+
+        for start in range(0, len(service_ids), batch_size):
+            sync_service_material_tags(service_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt material tags for {len(service_ids)} services"))
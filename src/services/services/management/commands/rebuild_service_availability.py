@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from src.services.services.bll import rebuild_availability_intervals
+from src.services.services.models import Service
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the UTC availability intervals of every service, picking up timezone offset changes (DST)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        service_ids = list(Service.objects.values_list('pk', flat=True))
+
+        created = 0
+        for start in range(0, len(service_ids), batch_size):
+            created += rebuild_availability_intervals(service_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {created} availability intervals for {len(service_ids)} services"
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from src.services.services.bll import refresh_service_prices
+from src.services.services.models import ServiceCurrency
+
+
+class Command(BaseCommand):
+    help = "Recomputes the effective and base currency prices of every service from the current exchange rates"
+
+    def handle(self, *args, **options):
+        ServiceCurrency.invalidate_exchange_rates()
+        updated = refresh_service_prices()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt prices for {updated} services"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from src.services.services.bll import rebuild_service_ratings
+
+
+class Command(BaseCommand):
+    help = "Recomputes the stored rating aggregates of every service from its active reviews"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = rebuild_service_ratings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating aggregates for {updated} services"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from src.services.services.search import get_search_backend, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Creates the full-text search index of services if needed and reindexes every service"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if get_search_backend() is None:
+            raise CommandError("The configured database has no supported full-text search backend")
+
+        indexed = rebuild_search_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} services for search"))
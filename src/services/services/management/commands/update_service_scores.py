@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from src.services.services.bll import update_service_scores
+
+
+class Command(BaseCommand):
+    help = "Recomputes the rating, popularity and rank scores of every service, meant to run periodically"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = update_service_scores(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Updated scores for {updated} services"))
@@ -1,12 +1,21 @@
 import uuid
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Max, Value
+from django.db.models.functions import Concat, Substr
 from django.template.defaultfilters import slugify
 from django_ckeditor_5.fields import CKEditor5Field
 
 from src.core.models import Country
 from src.services.users.models import User, ServiceProvider
 
+# The path holds ten 33 character segments, so categories nest at most this deep
+MAX_CATEGORY_DEPTH = 9
+
 
 class ServiceCategory(models.Model):
     """Service Category Model"""
@@ -21,6 +30,10 @@ class ServiceCategory(models.Model):
     description = models.TextField(blank=True, null=True, help_text="Small description of the category.")
     is_active = models.BooleanField(default=True, help_text="Indicates if the category is currently active.")
 
+    # Materialized path: the ids of the ancestors and of the category itself, e.g. "<root>/<child>/".
+    path = models.CharField(max_length=330, default='', editable=False, db_index=True)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -34,6 +47,62 @@ class ServiceCategory(models.Model):
             models.UniqueConstraint(fields=['name'], name="unique_service_category_name")
         ]
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'parent' not in update_fields:
+            return super().save(*args, **kwargs)
+
+        old_path, old_depth = self.path, self.depth
+        self.path, self.depth = self.get_tree_position()
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'path', 'depth'}
+        super().save(*args, **kwargs)
+
+        if old_path and old_path != self.path:
+            move_category_descendants(old_path, self.path, self.depth - old_depth)
+
+    def clean(self):
+        super().clean()
+        error = self.get_parent_error(self.parent)
+        if error:
+            raise ValidationError({'parent': error})
+
+    def get_parent_error(self, parent):
+        """Why the category can't be placed under `parent`, or None if it can"""
+        if parent is None:
+            return None
+        if parent.pk == self.pk or f'{self.pk.hex}/' in parent.path:
+            return "A category can't be moved under itself or one of its subcategories."
+
+        subtree_depth = 0
+        if self.path:
+            deepest = ServiceCategory.objects.filter(path__startswith=self.path).aggregate(depth=Max('depth'))['depth']
+            subtree_depth = (deepest or self.depth) - self.depth
+        if parent.depth + 1 + subtree_depth > MAX_CATEGORY_DEPTH:
+            return f"Categories can't be nested more than {MAX_CATEGORY_DEPTH + 1} levels deep."
+        return None
+
+    def get_tree_position(self):
+        """Path and depth of the category under its current parent, validated by clean() beforehand"""
+        segment = f'{self.pk.hex}/'
+        if not self.parent_id:
+            return segment, 0
+
+        parent_path, parent_depth = ServiceCategory.objects.filter(pk=self.parent_id).values_list(
+            'path', 'depth'
+        ).get()
+        if self.parent_id == self.pk or segment in parent_path:
+            raise ValueError("A category can't be moved under itself or one of its subcategories.")
+        return f'{parent_path}{segment}', parent_depth + 1
+
+
+def move_category_descendants(old_path, new_path, depth_change):
+    """Rewrites the path prefix and depth of every category below `old_path` in one update"""
+    ServiceCategory.objects.filter(path__startswith=old_path).exclude(path=old_path).update(
+        path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+        depth=F('depth') + depth_change,
+    )
+
 
 class ServiceCurrency(models.Model):
     """Service Currency Model"""
@@ -42,14 +111,32 @@ class ServiceCurrency(models.Model):
     code = models.CharField(max_length=3, unique=True, help_text="Unique currency code.")
     symbol = models.CharField(max_length=5, unique=True, help_text="Unique currency symbol.")
     description = models.TextField(blank=True, null=True, help_text="Small description of the currency.")
+    exchange_rate = models.DecimalField(max_digits=14, decimal_places=6, default=1,
+                                        validators=[MinValueValidator(0.000001)],
+                                        help_text="Value of one unit in the base currency, to compare prices.")
     is_active = models.BooleanField(default=True, help_text="Indicates if the currency is currently active.")
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    EXCHANGE_RATES_CACHE_KEY = 'service-currency-rates'
+
     def __str__(self):
         return self.name
 
+    @classmethod
+    def get_exchange_rates(cls):
+        """{currency_id: exchange_rate} of every currency, cached until a currency changes"""
+        rates = cache.get(cls.EXCHANGE_RATES_CACHE_KEY)
+        if rates is None:
+            rates = dict(cls.objects.values_list('pk', 'exchange_rate'))
+            cache.set(cls.EXCHANGE_RATES_CACHE_KEY, rates, None)
+        return rates
+
+    @classmethod
+    def invalidate_exchange_rates(cls):
+        cache.delete(cls.EXCHANGE_RATES_CACHE_KEY)
+
     class Meta:
         verbose_name_plural = "Service Currencies"
         ordering = ['name']
@@ -58,6 +145,10 @@ class ServiceCurrency(models.Model):
         ]
 
 
+def empty_rating_histogram():
+    return {str(rating): 0 for rating in range(1, 6)}
+
+
 # SER M
 class Service(models.Model):
     PRICE_TYPE_CHOICES = [
@@ -70,6 +161,13 @@ class Service(models.Model):
         ('both', 'Both'),
     ]
 
+    PRICE_FIELDS = ('price', 'discount', 'currency')
+
+    # Columns written only by their own maintenance code, never by a regular save of a loaded instance
+    DENORMALIZED_FIELDS = (
+        'rating_sum', 'rating_count', 'rating_avg', 'rating_histogram', 'rating_score', 'popularity_score', 'rank_score'
+    )
+
     """Represents a service provided by service providers"""
     id = models.UUIDField(primary_key=True, editable=False, default=uuid.uuid4)
     provider = models.ForeignKey(User, on_delete=models.CASCADE, related_name='services')
@@ -99,9 +197,29 @@ class Service(models.Model):
     discount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00,
                                    validators=[MinValueValidator(0.00), MaxValueValidator(99.00)]
                                    )
+    # Kept in sync with price, discount and the currency's exchange rate on save, see set_prices
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False,
+                                          help_text="Price after discount.")
+    base_price = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False,
+                                     help_text="Price after discount in the base currency.")
 
     is_active = models.BooleanField(default=True, help_text="Indicates if the service is available for booking.")
 
+    # Maintained from active ServiceReview rows, see src.services.services.bll
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, help_text="Sum of active review ratings.")
+    rating_count = models.PositiveIntegerField(default=0, editable=False, help_text="Number of active reviews.")
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False,
+                                     help_text="Average of active review ratings.")
+    rating_histogram = models.JSONField(default=empty_rating_histogram, editable=False,
+                                        help_text="Number of active reviews per rating (1-5).")
+
+    # Recomputed in bulk by the update_service_scores command, see src.services.services.bll
+    rating_score = models.FloatField(default=0, editable=False,
+                                     help_text="Average rating smoothed towards the average of all services.")
+    popularity_score = models.FloatField(default=0, editable=False,
+                                         help_text="Recent bookings, favorites and orders, older ones weigh less.")
+    rank_score = models.FloatField(default=0, editable=False, help_text="Rating and popularity combined.")
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -113,6 +231,14 @@ class Service(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['provider', 'title'], name="unique_service_per_provider")
         ]
+        indexes = [
+            models.Index(fields=['title', 'id'], name='service_title_idx'),
+            models.Index(fields=['provider', 'title', 'id'], name='service_provider_title_idx'),
+            models.Index(fields=['rating_avg', 'rating_count'], name='service_rating_idx'),
+            models.Index(fields=['base_price', 'id'], name='service_base_price_idx'),
+            models.Index(fields=['rank_score', 'id'], name='service_rank_idx'),
+            models.Index(fields=['category', 'rank_score', 'id'], name='service_category_rank_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         base_slug = slugify(self.title)
@@ -124,15 +250,34 @@ class Service(models.Model):
         if Service.objects.filter(slug=self.slug).exists():
             self.slug = f"{self.slug}-{uuid.uuid4().hex[:5]}"
 
+        self.set_prices()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(self.PRICE_FIELDS):
+            kwargs['update_fields'] = [*update_fields, 'effective_price', 'base_price']
         super().save(*args, **kwargs)
 
+    def save_edits(self):
+        """
+        Saves the edits of a loaded instance without writing back its DENORMALIZED_FIELDS, which reviews and the
+        score updates may have changed since it was loaded. Used by the edit paths, the API and the admin.
+        """
+        self.save(update_fields=[
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.name not in self.DENORMALIZED_FIELDS
+        ])
+
     def get_discounted_price(self):
-        return round(self.price - (self.price * (self.discount / 100)), 2)
+        price = Decimal(str(self.price))
+        return round(price - price * Decimal(str(self.discount)) / 100, 2)
+
+    def set_prices(self):
+        cents = Decimal('0.01')
+        self.effective_price = Decimal(str(self.get_discounted_price())).quantize(cents)
+        rate = ServiceCurrency.get_exchange_rates().get(self.currency_id, Decimal(1))
+        self.base_price = (self.effective_price * rate).quantize(cents)
 
     def get_total_rating(self):
-        reviews = self.reviews.filter(is_active=True)
-        total_rating = sum([review.rating for review in reviews])
-        return total_rating
+        return self.rating_sum
 
     def get_service_schedule(self):
         return self.availability_slots.filter(is_active=True)
@@ -204,6 +349,24 @@ class ServiceAvailability(models.Model):
         return f"{self.service.title} available on {self.day_of_week} from {self.start_time} to {self.end_time}"
 
 
+class ServiceAvailabilityInterval(models.Model):
+    """
+    Active availability of a service as merged UTC minute-of-week intervals [start_minute, end_minute), Monday 00:00
+    UTC being minute 0. Derived from the service's availability slots and rebuilt whenever they change.
+    """
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='availability_intervals')
+    start_minute = models.PositiveIntegerField()
+    end_minute = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['start_minute', 'end_minute'], name='availability_interval_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.service_id} available from minute {self.start_minute} to {self.end_minute}"
+
+
 class ServiceLocation(models.Model):
     """Service location for providers"""
     id = models.UUIDField(primary_key=True, editable=False, default=uuid.uuid4)
@@ -222,6 +385,9 @@ class ServiceLocation(models.Model):
     class Meta:
         verbose_name_plural = "Service Locations"
         ordering = ['city', 'region', 'country']
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='service_location_coords_idx')
+        ]
 
     def __str__(self):
         return f"{self.service.title} located at {self.address}, {self.city}, {self.region}, {self.country}"
@@ -279,6 +445,58 @@ class ServiceRuleInstruction(models.Model):
         ordering = ['created_at']
 
 
+class MaterialTag(models.Model):
+    """Dictionary of normalized material names used in service rule instructions"""
+    id = models.UUIDField(primary_key=True, editable=False, default=uuid.uuid4)
+    name = models.CharField(max_length=50, unique=True, help_text="Normalized material name.")
+    label = models.CharField(max_length=50, help_text="Material name as first entered.")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.label
+
+    class Meta:
+        verbose_name_plural = "Material Tags"
+        ordering = ['name']
+
+
+class ServiceMaterialTag(models.Model):
+    """Material tags required by a service, maintained from its rule instructions"""
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='material_tags')
+    tag = models.ForeignKey(MaterialTag, on_delete=models.CASCADE, related_name='service_tags')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['service', 'tag'], name='unique_service_material_tag')
+        ]
+        indexes = [
+            models.Index(fields=['tag', 'service'], name='material_tag_service_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.service_id} requires {self.tag_id}"
+
+
+class ServiceNeighbour(models.Model):
+    """Services the same users favorited, booked, ordered or reviewed, built by src.services.services.recommendations"""
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='neighbours')
+    neighbour = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField(help_text="Cosine similarity of the two services' user interactions.")
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['service', 'neighbour'], name='unique_service_neighbour')
+        ]
+        indexes = [
+            models.Index(fields=['service', '-score'], name='service_neighbour_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.neighbour_id} is like {self.service_id}"
+
+
 class ServiceReview(models.Model):
     """Stores reviews for services"""
     id = models.UUIDField(primary_key=True, editable=False, default=uuid.uuid4)
@@ -302,7 +520,9 @@ class ServiceReview(models.Model):
         if self.service:
             self.service_title = self.service.title
             self.provider = self.service.provider
-        super().save(force_insert, force_update, using, update_fields)
+        # The save signals move the rating into the service aggregates, in the same transaction as the review
+        with transaction.atomic(using=using):
+            super().save(force_insert, force_update, using, update_fields)
 
     class Meta:
         ordering = ['-created_at']
@@ -346,6 +566,9 @@ class FavoriteService(models.Model):
     class Meta:
         unique_together = ('user', 'service')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='favorite_user_created_idx')
+        ]
         verbose_name = 'Favorite'
         verbose_name_plural = 'Favorites'
 
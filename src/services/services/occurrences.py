@@ -0,0 +1,112 @@
+from datetime import datetime, time, timedelta
+
+import pytz
+from django.apps import apps
+from django.core.cache import cache
+
+from src.core.cache import bump_cache_version, get_cache_version
+from src.core.intervals import merge_intervals, subtract_intervals
+from src.services.services.models import ServiceAvailability
+from src.services.services.utils import WEEK_DAYS, get_timezone
+
+OCCURRENCE_HORIZON_DAYS = 60
+OCCURRENCE_CACHE_TIMEOUT = 60 * 60
+
+
+def get_occurrence_cache_name(service_id):
+    return f'service-occurrences:{service_id}'
+
+
+def invalidate_service_occurrences(service_id):
+    """Called on writes to anything the occurrences of a service depend on: its slots, bookings and offers"""
+    if service_id:
+        bump_cache_version(get_occurrence_cache_name(service_id))
+
+
+def slot_occurs_on(slot, day):
+    """
+    Whether a slot starts on a local date. Daily recurring slots occur every day, monthly ones on the first of their
+    weekday in the month. Other slots only carry a weekday, so they occur on it every week.
+    """
+    if slot.activity_type == 'recurring' and slot.repeat_type == 'daily':
+        return True
+    if day.weekday() != WEEK_DAYS.index(slot.day_of_week):
+        return False
+    if slot.activity_type == 'recurring' and slot.repeat_type == 'monthly':
+        return day.day <= 7
+    return True
+
+
+def expand_slot(slot, start, end):
+    """UTC (start, end) occurrences of a slot starting between two aware datetimes"""
+    timezone = get_timezone(slot.timezone)
+    length = (
+        datetime.combine(datetime.min, slot.end_time) - datetime.combine(datetime.min, slot.start_time)
+    ) % timedelta(days=1) or timedelta(days=1)
+
+    occurrences = []
+    day = start.astimezone(timezone).date() - timedelta(days=1)
+    while day <= end.astimezone(timezone).date():
+        if slot_occurs_on(slot, day):
+            occurrence_start = timezone.localize(datetime.combine(day, slot.start_time)).astimezone(pytz.utc)
+            occurrences.append((occurrence_start, occurrence_start + length))
+        day += timedelta(days=1)
+    return occurrences
+
+
+def get_busy_intervals(service, start, end, slots):
+    """UTC intervals already taken by accepted booking requests and special offers of the service"""
+    booking_model = apps.get_model('order', 'ServiceBookingRequest')
+    offer_model = apps.get_model('order', 'SpecialOffer')
+
+    busy = list(
+        booking_model.objects.filter(
+            service=service, status='accepted', start_datetime__lt=end, end_datetime__gt=start
+        ).values_list('start_datetime', 'end_datetime')
+    )
+
+    # Offers only carry a day and local times, read in the timezone of the service's slots.
+    timezone = get_timezone(slots[0].timezone if slots else 'UTC')
+    for day, start_time, end_time in offer_model.objects.filter(
+            service=service, status='accepted',
+            service_day__gte=start.date() - timedelta(days=1), service_day__lte=end.date()
+    ).values_list('service_day', 'start_time', 'end_time'):
+        offer_start = timezone.localize(datetime.combine(day, start_time)).astimezone(pytz.utc)
+        offer_end = timezone.localize(datetime.combine(day, end_time)).astimezone(pytz.utc)
+        if offer_end <= offer_start:
+            offer_end += timedelta(days=1)
+        busy.append((offer_start, offer_end))
+    return busy
+
+
+def build_service_occurrences(service, start, end):
+    """Free UTC windows of a service between two aware datetimes: its merged slot occurrences minus busy time"""
+    slots = list(ServiceAvailability.objects.filter(service=service, is_active=True))
+    occurrences = []
+    for slot in slots:
+        occurrences += [
+            (max(occurrence_start, start), min(occurrence_end, end))
+            for occurrence_start, occurrence_end in expand_slot(slot, start, end)
+            if occurrence_end > start and occurrence_start < end
+        ]
+    return subtract_intervals(merge_intervals(occurrences), get_busy_intervals(service, start, end, slots))
+
+
+def get_service_occurrences(service, now=None, days=14):
+    """
+    Free UTC windows of a service from now for the next `days`. The whole horizon is expanded once per UTC day and
+    cached per service, under a version bumped by every write to its slots, bookings or offers.
+    """
+    now = (now or datetime.now(pytz.utc)).replace(second=0, microsecond=0)
+    horizon_start = datetime.combine(now.date(), time.min, tzinfo=pytz.utc)
+
+    version = get_cache_version(get_occurrence_cache_name(service.pk))
+    key = f'{get_occurrence_cache_name(service.pk)}:{version}:{horizon_start.date().isoformat()}'
+    occurrences = cache.get(key)
+    if occurrences is None:
+        horizon_end = horizon_start + timedelta(days=OCCURRENCE_HORIZON_DAYS + 1)
+        occurrences = build_service_occurrences(service, horizon_start, horizon_end)
+        cache.set(key, occurrences, OCCURRENCE_CACHE_TIMEOUT)
+
+    end = now + timedelta(days=min(days, OCCURRENCE_HORIZON_DAYS))
+    return [(max(start, now), min(stop, end)) for start, stop in occurrences if stop > now and start < end]
@@ -0,0 +1,150 @@
+import numpy as np
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from scipy import sparse
+
+from src.services.services.bll import get_ordered_service_id
+from src.services.services.models import FavoriteService, Service, ServiceNeighbour, ServiceReview
+
+NEIGHBOURS_PER_SERVICE = 20
+SIMILARITY_CHUNK_SIZE = 1000
+INTERACTION_WEIGHTS = {'favorite': 1.0, 'booking': 2.0, 'order': 3.0}
+
+""" ---------------------Interactions--------------------- """
+
+
+def load_interactions():
+    """
+    Every (user_id, service_id, weight, changed_at) signal of interest: favorites, live booking requests, orders
+    that were not cancelled and positive reviews (3 to 5 stars weigh 1 to 3).
+    """
+    booking_model = apps.get_model('order', 'ServiceBookingRequest')
+    order_model = apps.get_model('order', 'Order')
+
+    for user_id, service_id, changed_at in FavoriteService.objects.values_list('user_id', 'service_id', 'created_at'):
+        yield user_id, service_id, INTERACTION_WEIGHTS['favorite'], changed_at
+
+    bookings = booking_model.objects.exclude(status__in=['rejected', 'canceled'])
+    for user_id, service_id, changed_at in bookings.values_list('user_id', 'service_id', 'updated_at'):
+        yield user_id, service_id, INTERACTION_WEIGHTS['booking'], changed_at
+
+    orders = order_model.objects.exclude(order_status='cancelled').annotate(
+        ordered_service_id=get_ordered_service_id()
+    ).filter(ordered_service_id__isnull=False)
+    for user_id, service_id, changed_at in orders.values_list('user_id', 'ordered_service_id', 'updated_at'):
+        yield user_id, service_id, INTERACTION_WEIGHTS['order'], changed_at
+
+    reviews = ServiceReview.objects.filter(is_active=True, service__isnull=False, rating__gte=3)
+    for user_id, service_id, rating, changed_at in reviews.values_list('reviewer_id', 'service_id', 'rating',
+                                                                       'created_at'):
+        yield user_id, service_id, float(rating - 2), changed_at
+
+
+class InteractionMatrix:
+    """
+    Sparse users x services matrix of summed interaction weights, damped with log1p so a heavy user does not
+    dominate, with the ids behind each row and column.
+    """
+
+    def __init__(self, interactions):
+        user_index, service_index = {}, {}
+        rows, columns, weights = [], [], []
+        for user_id, service_id, weight, _ in interactions:
+            rows.append(user_index.setdefault(user_id, len(user_index)))
+            columns.append(service_index.setdefault(service_id, len(service_index)))
+            weights.append(weight)
+
+        self.user_index = user_index
+        self.service_index = service_index
+        self.service_ids = list(service_index)
+        matrix = sparse.coo_matrix(
+            (np.array(weights, dtype=np.float64), (np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64))),
+            shape=(len(user_index), len(service_index))
+        ).tocsr()
+        matrix.sum_duplicates()
+        matrix.data = np.log1p(matrix.data)
+        self.matrix = matrix
+
+
+""" ---------------------Similarity--------------------- """
+
+
+def compute_neighbours(matrix, columns, top_k=NEIGHBOURS_PER_SERVICE):
+    """
+    Top `top_k` cosine neighbours of the given service columns as {column: [(column, score)]}, best first.
+    Service vectors are L2 normalized once, then similarities come from sparse products of a chunk of rows against
+    all services, so memory stays bounded by the chunk size times the number of co-interacted services.
+    """
+    services = matrix.T.tocsr()
+    norms = np.sqrt(np.asarray(services.multiply(services).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    services = (sparse.diags(1.0 / norms) @ services).tocsr()
+    services_t = services.T.tocsc()
+
+    neighbours = {}
+    columns = list(columns)
+    for start in range(0, len(columns), SIMILARITY_CHUNK_SIZE):
+        chunk = columns[start:start + SIMILARITY_CHUNK_SIZE]
+        similarity = (services[chunk] @ services_t).tocsr()
+        for offset, column in enumerate(chunk):
+            begin, end = similarity.indptr[offset], similarity.indptr[offset + 1]
+            others, scores = similarity.indices[begin:end], similarity.data[begin:end]
+            keep = (others != column) & (scores > 0)
+            others, scores = others[keep], scores[keep]
+            if len(scores) > top_k:
+                top = np.argpartition(-scores, top_k)[:top_k]
+                others, scores = others[top], scores[top]
+            order = np.argsort(-scores, kind='stable')
+            neighbours[column] = list(zip(others[order].tolist(), scores[order].tolist()))
+    return neighbours
+
+
+""" ---------------------Building--------------------- """
+
+
+def get_last_build():
+    return ServiceNeighbour.objects.aggregate(last_build=Max('computed_at'))['last_build']
+
+
+def build_service_neighbours(full=False, top_k=NEIGHBOURS_PER_SERVICE, batch_size=1000):
+    """
+    Recomputes the stored neighbours. Incrementally, only the services of users with interactions since the last
+    build are recomputed, since only their similarities can have moved. A full build also drops services that lost
+    every interaction and catches removed interactions (unfavorites), it is meant for a nightly run.
+    Returns the number of services whose neighbours were rewritten.
+    """
+    started_at = timezone.now()
+    since = None if full else get_last_build()
+
+    interactions = list(load_interactions())
+    matrix = InteractionMatrix(interactions)
+
+    if since is None:
+        columns = list(range(len(matrix.service_ids)))
+    else:
+        changed_users = {user_id for user_id, _, _, changed_at in interactions if changed_at >= since}
+        columns = sorted({
+            matrix.service_index[service_id] for user_id, service_id, _, _ in interactions if user_id in changed_users
+        })
+
+    neighbours = compute_neighbours(matrix.matrix, columns, top_k=top_k)
+    existing = set(Service.objects.values_list('pk', flat=True))
+
+    for start in range(0, len(columns), batch_size):
+        batch = columns[start:start + batch_size]
+        service_ids = [matrix.service_ids[column] for column in batch]
+        rows = [
+            ServiceNeighbour(service_id=matrix.service_ids[column], neighbour_id=matrix.service_ids[other],
+                             score=score, computed_at=started_at)
+            for column in batch for other, score in neighbours[column]
+            if matrix.service_ids[column] in existing and matrix.service_ids[other] in existing
+        ]
+        with transaction.atomic():
+            ServiceNeighbour.objects.filter(service_id__in=service_ids).delete()
+            ServiceNeighbour.objects.bulk_create(rows, batch_size=batch_size)
+
+    if since is None:
+        ServiceNeighbour.objects.filter(computed_at__lt=started_at).delete()
+    return len(columns)
@@ -0,0 +1,264 @@
+import logging
+import re
+import uuid
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection, connections, transaction
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from src.services.services.models import Service, ServiceRuleInstruction
+from src.services.services.utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Default number of hits of a ranked search(), the list filter isn't capped
+SEARCH_RESULT_LIMIT = 500
+TOKEN_PATTERN = re.compile(r'\w+')
+
+""" ---------------------Search Documents--------------------- """
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(normalize_text(text))
+
+
+def build_search_documents(services):
+    """Returns {service_id: {'title', 'category', 'body'}} with the normalized text of each service"""
+    services = list(services)
+    materials = {}
+    for service_id, material in ServiceRuleInstruction.objects.filter(
+            service_rule__service__in=services
+    ).values_list('service_rule__service_id', 'required_material'):
+        materials.setdefault(service_id, []).append(material)
+
+    documents = {}
+    for service in services:
+        body = [service.description, service.content, *materials.get(service.pk, [])]
+        documents[service.pk] = {
+            'title': ' '.join(tokenize(service.title)),
+            'category': ' '.join(tokenize(service.category.name if service.category else '')),
+            'body': ' '.join(token for text in body for token in tokenize(text)),
+        }
+    return documents
+
+
+""" ---------------------Backends--------------------- """
+
+
+class BaseSearchBackend:
+    """
+    Keeps one ranked full-text document per service, in a table the backend owns. The table is created after
+    migrate (see apps.py), not on first use.
+    """
+    table = None
+
+    def setup(self, using=DEFAULT_DB_ALIAS):
+        with connections[using].cursor() as cursor:
+            for statement in self.get_setup_sql():
+                cursor.execute(statement)
+
+    def get_setup_sql(self):
+        raise NotImplementedError
+
+    def index(self, documents):
+        raise NotImplementedError
+
+    def remove(self, service_ids):
+        raise NotImplementedError
+
+    def get_match_sql(self, tokens, match_any=False):
+        """(sql, params) selecting the id of every matching service, meant for a `pk__in` subquery"""
+        raise NotImplementedError
+
+    def get_rank_sql(self, tokens, column, match_any=False):
+        """(sql, params) of the rank of the service whose id is `column`, higher is better"""
+        raise NotImplementedError
+
+    def search(self, tokens, limit=SEARCH_RESULT_LIMIT, match_any=False):
+        """Returns [(service_id, rank)] best match first, higher rank is better"""
+        raise NotImplementedError
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """SQLite FTS5 table ranked with bm25, title weighted over category over body"""
+    table = 'services_service_fts'
+    rank = f'bm25({table}, 0.0, 10.0, 4.0, 1.0)'
+
+    def get_setup_sql(self):
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+            f"service_id UNINDEXED, title, category, body, tokenize='unicode61 remove_diacritics 2')"
+        ]
+
+    def index(self, documents):
+        self.remove(list(documents))
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {self.table} (service_id, title, category, body) VALUES (%s, %s, %s, %s)",
+                [(service_id.hex, doc['title'], doc['category'], doc['body']) for service_id, doc in documents.items()]
+            )
+
+    def remove(self, service_ids):
+        if service_ids:
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f"DELETE FROM {self.table} WHERE service_id = %s", [(service_id.hex,) for service_id in service_ids]
+                )
+
+    @staticmethod
+    def get_query(tokens, match_any=False):
+        return (' OR ' if match_any else ' ').join(f'"{token}"*' for token in tokens)
+
+    def get_match_sql(self, tokens, match_any=False):
+        return f"SELECT service_id FROM {self.table} WHERE {self.table} MATCH %s", [self.get_query(tokens, match_any)]
+
+    def get_rank_sql(self, tokens, column, match_any=False):
+        return (
+            f"SELECT -{self.rank} FROM {self.table} WHERE {self.table} MATCH %s AND service_id = {column}",
+            [self.get_query(tokens, match_any)]
+        )
+
+    def search(self, tokens, limit=SEARCH_RESULT_LIMIT, match_any=False):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT service_id, {self.rank} AS score FROM {self.table} "
+                f"WHERE {self.table} MATCH %s ORDER BY score LIMIT %s",
+                [self.get_query(tokens, match_any), limit]
+            )
+            return [(uuid.UUID(service_id), -score) for service_id, score in cursor.fetchall()]
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """Weighted tsvector per service behind a GIN index, ranked with ts_rank_cd"""
+    table = 'services_service_search'
+
+    def get_setup_sql(self):
+        service_table = Service._meta.db_table
+        return [
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            f"service_id uuid PRIMARY KEY REFERENCES {service_table} (id) ON DELETE CASCADE, "
+            f"document tsvector NOT NULL)",
+            f"CREATE INDEX IF NOT EXISTS {self.table}_document_idx ON {self.table} USING gin (document)",
+        ]
+
+    def index(self, documents):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {self.table} (service_id, document) VALUES (%s, "
+                f"setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B') || "
+                f"setweight(to_tsvector('simple', %s), 'C')) "
+                f"ON CONFLICT (service_id) DO UPDATE SET document = EXCLUDED.document",
+                [(service_id, doc['title'], doc['category'], doc['body']) for service_id, doc in documents.items()]
+            )
+
+    def remove(self, service_ids):
+        if service_ids:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {self.table} WHERE service_id = ANY(%s)", [list(service_ids)])
+
+    @staticmethod
+    def get_query(tokens, match_any=False):
+        return (' | ' if match_any else ' & ').join(f'{token}:*' for token in tokens)
+
+    def get_match_sql(self, tokens, match_any=False):
+        return (
+            f"SELECT service_id FROM {self.table} WHERE document @@ to_tsquery('simple', %s)",
+            [self.get_query(tokens, match_any)]
+        )
+
+    def get_rank_sql(self, tokens, column, match_any=False):
+        return (
+            f"SELECT ts_rank_cd(document, to_tsquery('simple', %s)) FROM {self.table} WHERE service_id = {column}",
+            [self.get_query(tokens, match_any)]
+        )
+
+    def search(self, tokens, limit=SEARCH_RESULT_LIMIT, match_any=False):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT service_id, ts_rank_cd(document, query) AS score "
+                f"FROM {self.table}, to_tsquery('simple', %s) query "
+                f"WHERE document @@ query ORDER BY score DESC LIMIT %s",
+                [self.get_query(tokens, match_any), limit]
+            )
+            return [(service_id, score) for service_id, score in cursor.fetchall()]
+
+
+SEARCH_BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend(using=DEFAULT_DB_ALIAS):
+    """The search backend for the database, or None when the database has no full-text support"""
+    backend_class = SEARCH_BACKENDS.get(connections[using].vendor)
+    return backend_class() if backend_class is not None else None
+
+
+def setup_search_index(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Creates the search table of the database, connected to post_migrate"""
+    backend = get_search_backend(using)
+    if backend is not None:
+        backend.setup(using)
+
+
+""" ---------------------Indexing and Querying--------------------- """
+
+
+def index_services(service_ids):
+    """(Re)builds the search documents of the given services, dropping the ones that no longer exist"""
+    backend = get_search_backend()
+    if backend is None or not service_ids:
+        return
+
+    services = Service.objects.filter(pk__in=service_ids).select_related('category')
+    documents = build_search_documents(services)
+    try:
+        with transaction.atomic():
+            backend.index(documents)
+            backend.remove([service_id for service_id in service_ids if service_id not in documents])
+    except DatabaseError:
+        logger.exception("Failed to update the service search index")
+
+
+def rebuild_search_index(batch_size=500):
+    """Indexes every service from scratch, batch by batch"""
+    backend = get_search_backend()
+    if backend is None:
+        return 0
+
+    backend.setup()
+    indexed = 0
+    service_ids = list(Service.objects.values_list('pk', flat=True))
+    for start in range(0, len(service_ids), batch_size):
+        batch = Service.objects.filter(pk__in=service_ids[start:start + batch_size]).select_related('category')
+        documents = build_search_documents(batch)
+        backend.index(documents)
+        indexed += len(documents)
+    return indexed
+
+
+def schedule_service_index(service_ids):
+    """Reindexes the given services once the current transaction commits"""
+    service_ids = [service_id for service_id in service_ids if service_id]
+    if service_ids:
+        transaction.on_commit(lambda: index_services(service_ids))
+
+
+def search_service_queryset(queryset, query):
+    """
+    Restricts the queryset to services matching the query, best match first, with a `search_rank` annotation.
+    The match is a subquery on the search index, so every other filter and the pagination apply to all matches.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset
+
+    backend = get_search_backend()
+    if backend is None:
+        return queryset.filter(Q(title__icontains=query) | Q(description__icontains=query))
+
+    column = f'{connection.ops.quote_name(Service._meta.db_table)}.{connection.ops.quote_name("id")}'
+    return queryset.filter(pk__in=RawSQL(*backend.get_match_sql(tokens))).annotate(
+        search_rank=RawSQL(*backend.get_rank_sql(tokens, column), output_field=FloatField())
+    ).order_by('-search_rank', 'id')
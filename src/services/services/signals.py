@@ -0,0 +1,173 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from src.services.services.bll import apply_service_rating_change, rebuild_availability_intervals, \
+    sync_service_material_tags, invalidate_category_tree, refresh_service_prices, get_initial_service_scores
+from src.services.services.cache import SERVICE_DETAIL_DEPENDENCIES, SERVICE_DETAIL_FIELDS, evict_service_details
+from src.services.services.occurrences import invalidate_service_occurrences
+from src.services.services.models import MaterialTag, Service, ServiceAvailability, ServiceCategory, \
+    ServiceCurrency, ServiceLocation, ServiceReview, ServiceRule, ServiceRuleInstruction, move_category_descendants
+from src.services.services.search import schedule_service_index
+from src.services.services.typeahead import record_typeahead_change
+
+
+@receiver(pre_save, sender=ServiceReview, dispatch_uid="service_review_rating_snapshot")
+def service_review_rating_snapshot(sender, instance, **kwargs):
+    """Remembers the stored state of a review so its old contribution can be removed on save."""
+    instance._rating_snapshot = None
+    if not instance._state.adding:
+        instance._rating_snapshot = (
+            ServiceReview.objects.filter(pk=instance.pk).values('service_id', 'rating', 'is_active').first()
+        )
+
+
+@receiver(post_save, sender=ServiceReview, dispatch_uid="service_review_rating_update")
+def service_review_rating_update(sender, instance, created, **kwargs):
+    """Keeps the rating aggregates of the reviewed service in sync with created, edited or deactivated reviews."""
+    snapshot = getattr(instance, '_rating_snapshot', None)
+    old_service_id, old_rating = None, None
+    if snapshot and snapshot['is_active']:
+        old_service_id, old_rating = snapshot['service_id'], snapshot['rating']
+    new_rating = instance.rating if instance.is_active else None
+
+    if old_service_id == instance.service_id:
+        apply_service_rating_change(instance.service_id, removed_rating=old_rating, added_rating=new_rating)
+    else:
+        apply_service_rating_change(old_service_id, removed_rating=old_rating)
+        apply_service_rating_change(instance.service_id, added_rating=new_rating)
+
+
+@receiver(post_delete, sender=ServiceReview, dispatch_uid="service_review_rating_delete")
+def service_review_rating_delete(sender, instance, **kwargs):
+    if instance.is_active:
+        apply_service_rating_change(instance.service_id, removed_rating=instance.rating)
+
+
+""" ---------------------Scores--------------------- """
+
+
+@receiver(post_save, sender=Service, dispatch_uid="service_initial_scores")
+def service_initial_scores(sender, instance, created, **kwargs):
+    """New services get a rank right away instead of sitting at 0 until update_service_scores runs."""
+    if created:
+        scores = get_initial_service_scores()
+        Service.objects.filter(pk=instance.pk).update(**scores)
+        for name, value in scores.items():
+            setattr(instance, name, value)
+
+
+""" ---------------------Search Index--------------------- """
+
+
+@receiver(post_save, sender=Service, dispatch_uid="service_search_index_update")
+@receiver(post_delete, sender=Service, dispatch_uid="service_search_index_delete")
+def service_search_index_update(sender, instance, **kwargs):
+    schedule_service_index([instance.pk])
+
+
+@receiver(post_save, sender=ServiceCategory, dispatch_uid="service_category_search_index_update")
+def service_category_search_index_update(sender, instance, created, **kwargs):
+    """The category name is part of the search document of every service in it."""
+    if not created:
+        schedule_service_index(list(instance.services.values_list('pk', flat=True)))
+
+
+@receiver(post_save, sender=ServiceRuleInstruction, dispatch_uid="service_rule_instruction_search_index_update")
+@receiver(post_delete, sender=ServiceRuleInstruction, dispatch_uid="service_rule_instruction_search_index_delete")
+def service_rule_instruction_search_index_update(sender, instance, **kwargs):
+    """Rule materials are part of the search document of their service."""
+    schedule_service_index([get_instruction_service_id(instance)])
+
+
+def get_instruction_service_id(instance):
+    return ServiceRule.objects.filter(pk=instance.service_rule_id).values_list('service_id', flat=True).first()
+
+
+""" ---------------------Availability Intervals--------------------- """
+
+
+@receiver(post_save, sender=ServiceAvailability, dispatch_uid="service_availability_intervals_update")
+@receiver(post_delete, sender=ServiceAvailability, dispatch_uid="service_availability_intervals_delete")
+def service_availability_intervals_update(sender, instance, **kwargs):
+    rebuild_availability_intervals([instance.service_id])
+    invalidate_service_occurrences(instance.service_id)
+
+
+""" ---------------------Material Tags--------------------- """
+
+
+@receiver(post_save, sender=ServiceRuleInstruction, dispatch_uid="service_rule_instruction_material_tags_update")
+@receiver(post_delete, sender=ServiceRuleInstruction, dispatch_uid="service_rule_instruction_material_tags_delete")
+def service_rule_instruction_material_tags_update(sender, instance, **kwargs):
+    sync_service_material_tags([get_instruction_service_id(instance)])
+
+
+""" ---------------------Category Tree--------------------- """
+
+
+@receiver(post_save, sender=ServiceCategory, dispatch_uid="service_category_tree_update")
+def service_category_tree_update(sender, instance, **kwargs):
+    """Bumped again on commit, so other processes don't keep a tree they reloaded before the commit."""
+    invalidate_category_tree()
+    transaction.on_commit(invalidate_category_tree)
+
+
+@receiver(post_delete, sender=ServiceCategory, dispatch_uid="service_category_tree_delete")
+def service_category_tree_delete(sender, instance, **kwargs):
+    """Subcategories of a deleted category lose their parent (SET_NULL) and become roots."""
+    if instance.path:
+        move_category_descendants(instance.path, '', -(instance.depth + 1))
+    invalidate_category_tree()
+    transaction.on_commit(invalidate_category_tree)
+
+
+""" ---------------------Prices--------------------- """
+
+
+@receiver(post_save, sender=ServiceCurrency, dispatch_uid="service_currency_prices_update")
+def service_currency_prices_update(sender, instance, **kwargs):
+    """Base prices follow the exchange rate of their currency."""
+    ServiceCurrency.invalidate_exchange_rates()
+    transaction.on_commit(ServiceCurrency.invalidate_exchange_rates)
+    refresh_service_prices([instance.pk])
+
+
+@receiver(post_delete, sender=ServiceCurrency, dispatch_uid="service_currency_prices_delete")
+def service_currency_prices_delete(sender, instance, **kwargs):
+    """Services of a deleted currency lose it (SET_NULL) and are priced at a rate of 1."""
+    ServiceCurrency.invalidate_exchange_rates()
+    transaction.on_commit(ServiceCurrency.invalidate_exchange_rates)
+    refresh_service_prices([None])
+
+
+""" ---------------------Typeahead--------------------- """
+
+
+@receiver([post_save, post_delete], sender=Service, dispatch_uid="service_typeahead_update")
+@receiver([post_save, post_delete], sender=ServiceCategory, dispatch_uid="service_category_typeahead_update")
+@receiver([post_save, post_delete], sender=MaterialTag, dispatch_uid="material_tag_typeahead_update")
+def typeahead_update(sender, instance, **kwargs):
+    kind = {Service: 'service', ServiceCategory: 'category', MaterialTag: 'material'}[sender]
+    record_typeahead_change(kind, [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=ServiceLocation, dispatch_uid="service_location_typeahead_update")
+def service_location_typeahead_update(sender, instance, **kwargs):
+    """Cities are distinct values of the locations, the handful of them is reloaded as a whole."""
+    record_typeahead_change('city')
+
+
+""" ---------------------Service Detail Cache--------------------- """
+
+
+def service_detail_cache_evict(sender, instance, update_fields=None, **kwargs):
+    shown = SERVICE_DETAIL_FIELDS.get(sender)
+    if shown is not None and update_fields is not None and not shown & set(update_fields):
+        return
+    evict_service_details(SERVICE_DETAIL_DEPENDENCIES[sender](instance))
+
+
+for dependency in SERVICE_DETAIL_DEPENDENCIES:
+    post_save.connect(service_detail_cache_evict, sender=dependency, dispatch_uid="service_detail_cache_evict")
+    post_delete.connect(service_detail_cache_evict, sender=dependency, dispatch_uid="service_detail_cache_evict")
@@ -1,3 +1,797 @@
-from django.test import TestCase
+import gzip
+import json
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import pytz
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from src.api.v1.feed import HOME_FEED_VERSION_KEY, build_home_feed, sample_service_ids
+from src.api.v1.reference import REFERENCE_BUNDLE_CACHE, build_reference_bundle, get_reference_bundle
+from src.core.cache import get_cache_version
+from src.services.order.models import ServiceBookingRequest
+from src.services.services.models import MAX_CATEGORY_DEPTH, FavoriteService, MaterialTag, Service, \
+    ServiceAvailability, ServiceCategory, ServiceCurrency, ServiceImage, ServiceLocation, ServiceNeighbour, \
+    ServiceReview, ServiceRule, ServiceRuleInstruction
+from src.services.services.bll import get_recommended_service_ids, rebuild_service_ratings, update_service_scores
+from src.services.services.occurrences import get_service_occurrences
+from src.services.services.recommendations import build_service_neighbours
+from src.services.services.search import rebuild_search_index
+from src.services.services.typeahead import TYPEAHEAD_SCAN_FACTOR
+from src.services.testcases import ServiceAPITestCase
+from src.services.users.models import User
+
+# Maximum number of queries per endpoint, independent of the number of rows returned.
+QUERY_BUDGETS = {
+    'service-list': 3,
+    'provider-service-list': 3,
+    'home': 0,
+    'home-personalized': 9,
+}
+
+
+class ServiceQueryBudgetTestCase(ServiceAPITestCase):
+
+    def assertWithinQueryBudget(self, name, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(context.captured_queries), QUERY_BUDGETS[name],
+            '\n'.join(query['sql'] for query in context.captured_queries)
+        )
+        return response
+
+    def test_service_list_query_budget(self):
+        self.assertWithinQueryBudget('service-list', reverse('services:services-api:service-list'))
+
+    def test_provider_service_list_query_budget(self):
+        self.client.force_authenticate(self.providers[0])
+        self.assertWithinQueryBudget(
+            'provider-service-list', reverse('services:services-api:provider-service-list-create')
+        )
+
+    def test_home_query_budget(self):
+        build_home_feed()
+        self.assertWithinQueryBudget('home', reverse('api:v1:home'))
+
+    def test_personalized_home_query_budget(self):
+        build_home_feed()
+        self.client.force_authenticate(self.providers[0])
+        self.assertWithinQueryBudget('home-personalized', reverse('api:v1:home'))
+
+    def test_service_list_only_serializes_active_images_and_slots(self):
+        response = self.client.get(reverse('services:services-api:service-list'))
+        service = response.data['results'][0]
+        self.assertEqual(len(service['images']), 1)
+        self.assertEqual(len(service['schedule']), 2)
+
+
+class ServiceListPaginationTestCase(ServiceAPITestCase):
+
+    def test_keyset_pages_cover_every_service_once(self):
+        url = reverse('services:services-api:service-list') + '?page_size=5'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            seen += [service['id'] for service in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), Service.objects.filter(is_active=True).count())
+
+    def test_previous_link_returns_the_previous_page(self):
+        url = reverse('services:services-api:service-list') + '?page_size=5'
+        first_page = self.client.get(url).data
+        second_page = self.client.get(first_page['next']).data
+        self.assertEqual(self.client.get(second_page['previous']).data['results'], first_page['results'])
+
+
+class ServiceSearchTestCase(ServiceAPITestCase):
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            service = Service.objects.filter(provider=self.providers[0]).first()
+            service.title = 'Deep carpet cleaning'
+            service.description = '<p>Steam cleaning for rugs</p>'
+            service.save()
+        self.service = service
+        rebuild_search_index()
+
+    def search(self, query):
+        url = reverse('services:services-api:service-list')
+        return [result['id'] for result in self.client.get(url, {'search': query}).data['results']]
+
+    def test_search_ranks_title_matches_first(self):
+        self.assertEqual(self.search('carpet')[0], str(self.service.pk))
+
+    def test_search_matches_prefixes_and_ignores_accents(self):
+        self.assertIn(str(self.service.pk), self.search('CÁRP'))
+
+    def test_search_without_matches_returns_nothing(self):
+        self.assertEqual(self.search('plumbing'), [])
+
+    def test_search_combines_with_other_filters(self):
+        # Indexed on save, into the table created after migrate
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Service.objects.filter(provider=self.providers[1]).first()
+            other.title, other.service_type = 'Carpet repair', 'online'
+            other.save()
+        url = reverse('services:services-api:service-list')
+        results = self.client.get(url, {'search': 'carpet', 'service_type': 'online'}).data['results']
+        self.assertEqual([result['id'] for result in results], [str(other.pk)])
+
+
+class ServiceAvailabilityFilterTestCase(ServiceAPITestCase):
+
+    def filter(self, params):
+        return self.client.get(reverse('services:services-api:service-list'), params).data['results']
+
+    def test_available_between_matches_overlapping_slots(self):
+        results = self.filter({'available_from': '2026-10-19T16:30:00Z', 'available_to': '2026-10-19T18:00:00Z'})
+        self.assertEqual(len(results), Service.objects.filter(is_active=True).count())
+
+    def test_available_between_excludes_days_without_slots(self):
+        results = self.filter({'available_from': '2026-10-21T10:00:00Z', 'available_to': '2026-10-21T11:00:00Z'})
+        self.assertEqual(results, [])
+
+    def test_day_and_time_are_converted_from_the_given_timezone(self):
+        # 14:00-16:00 in Karachi (UTC+5) is 09:00-11:00 UTC, inside the 09:00-17:00 UTC slots.
+        params = {'date': 'monday', 'start_time': '14:00', 'end_time': '16:00'}
+        self.assertNotEqual(self.filter({**params, 'timezone': 'Asia/Karachi'}), [])
+        self.assertEqual(self.filter({**params, 'timezone': 'America/New_York'}), [])
+
+        response = self.client.get(reverse('services:services-api:service-list'), {**params, 'timezone': 'Mars/Base'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('timezone', response.data)
+
+    def test_intervals_follow_slot_changes(self):
+        service = Service.objects.filter(is_active=True).first()
+        service.availability_slots.update(is_active=False)
+        ServiceAvailability.objects.create(
+            service=service, day_of_week='wednesday', start_time=time(22), end_time=time(2)
+        )
+        results = self.filter({'available_from': '2026-10-22T01:00:00Z', 'available_to': '2026-10-22T01:30:00Z'})
+        self.assertEqual([result['id'] for result in results], [str(service.pk)])
+
+
+class ServiceRadiusSearchTestCase(ServiceAPITestCase):
+
+    def setUp(self):
+        self.near, self.far, self.inactive, self.east = Service.objects.filter(provider=self.providers[0])[:4]
+        # Bulk inserts skip save(), the search must not depend on anything computed there
+        ServiceLocation.objects.bulk_create([
+            ServiceLocation(service=self.near, address='Chorsu', latitude=Decimal('41.326'),
+                            longitude=Decimal('69.228')),
+            ServiceLocation(service=self.far, address='Samarkand', latitude=Decimal('39.654'),
+                            longitude=Decimal('66.975')),
+            ServiceLocation(service=self.inactive, address='Yunusabad', latitude=Decimal('41.366'),
+                            longitude=Decimal('69.288'), is_active=False),
+            ServiceLocation(service=self.east, address='Date line', latitude=Decimal('0'),
+                            longitude=Decimal('179.95')),
+        ])
+
+    def search(self, latitude, longitude, radius):
+        url = reverse('services:services-api:service-list')
+        response = self.client.get(url, {'latitude': latitude, 'longitude': longitude, 'radius': radius})
+        return [(result['id'], result['distance']) for result in response.data['results']]
+
+    def test_only_services_inside_the_radius_are_listed_nearest_first(self):
+        results = self.search(41.311, 69.279, 50)
+        self.assertEqual([service_id for service_id, _ in results], [str(self.near.pk)])
+        self.assertAlmostEqual(results[0][1], 4.57, delta=0.1)
+
+        results = self.search(41.311, 69.279, 300)
+        self.assertEqual([service_id for service_id, _ in results], [str(self.near.pk), str(self.far.pk)])
+
+    def test_radius_across_the_antimeridian(self):
+        results = self.search(0, -179.95, 20)
+        self.assertEqual([service_id for service_id, _ in results], [str(self.east.pk)])
+        self.assertAlmostEqual(results[0][1], 11.1, delta=0.1)
+
+
+class MaterialTagTestCase(ServiceAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.paint_service, cls.brush_service = Service.objects.filter(provider=cls.providers[0])[:2]
+        for service, materials in ((cls.paint_service, ['Paint ', 'Brush']), (cls.brush_service, ['brush'])):
+            rule = ServiceRule.objects.create(service=service, event_rule='Bring your own')
+            for material in materials:
+                ServiceRuleInstruction.objects.create(service_rule=rule, required_material=material)
+
+    def filter(self, params):
+        results = self.client.get(reverse('services:services-api:service-list'), params).data['results']
+        return {result['id'] for result in results}
+
+    def test_materials_are_normalized_into_one_tag(self):
+        self.assertEqual(MaterialTag.objects.get(name='brush').service_tags.count(), 2)
+
+    def test_materials_match_any_or_all(self):
+        both = {str(self.paint_service.pk), str(self.brush_service.pk)}
+        self.assertEqual(self.filter({'materials': 'paint,BRUSH'}), both)
+        self.assertEqual(
+            self.filter({'materials': 'paint,brush', 'materials_match': 'all'}), {str(self.paint_service.pk)}
+        )
+
+    def test_deleted_instructions_untag_the_service(self):
+        ServiceRuleInstruction.objects.filter(service_rule__service=self.brush_service).delete()
+        self.assertEqual(self.filter({'materials': 'brush'}), {str(self.paint_service.pk)})
+
+    def test_autocomplete_reads_the_tag_dictionary(self):
+        response = self.client.get(reverse('services:services-api:material-tag-autocomplete'), {'q': 'BR'})
+        self.assertEqual([(tag['name'], tag['services']) for tag in response.data], [('brush', 2)])
+
+
+class HomeFeedTestCase(ServiceAPITestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_home_is_built_on_first_read_and_served_from_cache(self):
+        first = self.client.get(reverse('api:v1:home')).json()
+        self.assertEqual(len(first['popular_services']), 5)
+        self.assertEqual(first['for_you'], first['my_interest'])
+        self.assertEqual(self.client.get(reverse('api:v1:home')).json(), first)
+
+    def test_rebuild_publishes_a_new_version(self):
+        build_home_feed()
+        version = cache.get(HOME_FEED_VERSION_KEY)
+        build_home_feed()
+        self.assertNotEqual(cache.get(HOME_FEED_VERSION_KEY), version)
+
+    def test_sample_returns_distinct_active_services(self):
+        sample = sample_service_ids(5)
+        self.assertEqual(len(sample), len(set(sample)))
+        self.assertEqual(Service.objects.filter(pk__in=sample, is_active=True).count(), len(sample))
+        self.assertEqual(len(sample_service_ids(100)), Service.objects.filter(is_active=True).count())
+
+
+class ReferenceBundleTestCase(ServiceAPITestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_unchanged_bundle_is_not_modified(self):
+        url = reverse('api:v1:service-helper')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_bundle_is_served_gzipped_when_accepted(self):
+        response = self.client.get(reverse('api:v1:service-helper'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('category', json.loads(gzip.decompress(response.content)))
+
+    def test_reference_edits_change_the_etag(self):
+        url = reverse('api:v1:service-helper')
+        etag = self.client.get(url)['ETag']
+        ServiceCategory.objects.create(name='Gardening')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_a_rebuild_overlapping_a_change_is_not_served(self):
+        version = get_cache_version(REFERENCE_BUNDLE_CACHE)
+        with self.captureOnCommitCallbacks(execute=True):
+            ServiceCategory.objects.create(name='Gardening')
+        # Read the data before the change, stored after it
+        build_reference_bundle(version)
+        self.assertIn(b'Gardening', get_reference_bundle()['body'])
+
+
+class CategoryTreeTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.home = ServiceCategory.objects.create(name='Home')
+        cls.cleaning = ServiceCategory.objects.create(name='Cleaning', parent=cls.home)
+        cls.windows = ServiceCategory.objects.create(name='Windows', parent=cls.cleaning)
+        cls.garden = ServiceCategory.objects.create(name='Garden')
+
+    def test_tree_is_served_nested_in_one_query(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('api:v1:service-categories'))
+        self.assertLessEqual(len(context.captured_queries), 1)
+        self.assertEqual([category['name'] for category in response.data], ['Garden', 'Home'])
+        self.assertEqual(response.data[1]['subcategories'][0]['subcategories'][0]['name'], 'Windows')
+
+    def test_moving_a_category_moves_its_subtree(self):
+        self.cleaning.parent = self.garden
+        self.cleaning.save()
+        self.windows.refresh_from_db()
+        self.assertEqual(self.windows.path, f'{self.garden.pk.hex}/{self.cleaning.pk.hex}/{self.windows.pk.hex}/')
+        self.assertEqual(self.windows.depth, 2)
+
+    def test_deleting_a_category_promotes_its_subcategories(self):
+        self.home.delete()
+        self.windows.refresh_from_db()
+        self.assertEqual(self.windows.path, f'{self.cleaning.pk.hex}/{self.windows.pk.hex}/')
+        response = self.client.get(reverse('api:v1:service-categories'))
+        self.assertEqual([category['name'] for category in response.data], ['Cleaning', 'Garden'])
+
+    def test_cycles_and_depth_are_validation_errors(self):
+        self.home.parent = self.windows
+        with self.assertRaises(ValidationError):
+            self.home.full_clean()
+
+        parent = self.windows
+        for level in range(MAX_CATEGORY_DEPTH - parent.depth):
+            parent = ServiceCategory.objects.create(name=f'Level {level}', parent=parent)
+        self.client.force_authenticate(User.objects.create(username='staff', email='staff@example.com',
+                                                           phone_number='+14155550197'))
+        response = self.client.post(reverse('services:services-api:service-category-create'),
+                                    {'name': 'Too deep', 'parent': str(parent.pk)})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('parent', response.data)
+
+    def test_category_filter_includes_subcategories(self):
+        provider = User.objects.create(username='provider', email='provider@example.com',
+                                       phone_number='+14155550199', user_type='service_provider')
+        service = Service.objects.create(provider=provider, title='Window wash', category=self.windows,
+                                         price=10, number_of_people=1)
+        response = self.client.get(reverse('services:services-api:service-list'), {'category': self.home.pk})
+        self.assertEqual([result['id'] for result in response.data['results']], [str(service.pk)])
+
+
+class ServiceDetailCacheTestCase(ServiceAPITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.service = Service.objects.filter(provider=self.providers[0]).first()
+        self.url = reverse('services:services-api:service-detail', args=[self.service.pk])
+
+    def test_second_read_is_served_from_cache(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_dependent_writes_evict_the_entry(self):
+        self.client.get(self.url)
+        rule = ServiceRule.objects.create(service=self.service, event_rule='Shoes off')
+        ServiceRuleInstruction.objects.create(service_rule=rule, required_material='Slippers')
+        rules = self.client.get(self.url).json()['rules_and_instructions']
+        self.assertEqual(rules[0]['instructions'], [{'required_material': 'Slippers'}])
+
+        self.providers[0].username = 'renamed'
+        self.providers[0].save()
+        self.assertEqual(self.client.get(self.url).json()['provider']['username'], 'renamed')
+
+    def test_other_services_stay_cached(self):
+        other = Service.objects.filter(provider=self.providers[1]).first()
+        other_url = reverse('services:services-api:service-detail', args=[other.pk])
+        self.client.get(other_url)
+        ServiceImage.objects.create(service=self.service, image='services/images/new.png')
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(other_url)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_saves_of_fields_not_shown_keep_the_entry(self):
+        self.client.get(self.url)
+        self.providers[0].last_login = timezone.now()
+        self.providers[0].save(update_fields=['last_login'])
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.url)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_stats_count_hits_and_misses(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        admin = User.objects.create(username='admin', email='admin@example.com', phone_number='+14155550198',
+                                    is_staff=True)
+        self.client.force_authenticate(admin)
+        stats = self.client.get(reverse('services:services-api:service-cache-stats')).data['service-detail']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+
+class ServiceRuleBulkTestCase(ServiceAPITestCase):
+
+    def setUp(self):
+        self.service = Service.objects.filter(provider=self.providers[0]).first()
+        self.url = reverse('services:services-api:provider-service-rules', args=[self.service.pk])
+        self.client.force_authenticate(self.providers[0])
+
+    def test_many_rules_are_created_in_one_request(self):
+        response = self.client.post(self.url, {'rules': [
+            {'event_rule': 'Shoes off', 'required_material': ['Slippers']},
+            {'event_rule': 'Bring tools', 'required_material': ['Hammer', 'Nails']},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ServiceRuleInstruction.objects.filter(service_rule__service=self.service).count(), 3)
+        self.assertTrue(MaterialTag.objects.filter(name='hammer').exists())
+
+    def test_update_keeps_unchanged_instructions(self):
+        rule = self.client.post(self.url, {'rules': [
+            {'event_rule': 'Bring tools', 'required_material': ['Hammer', 'Nails']},
+        ]}, format='json').data[0]
+        hammer = ServiceRuleInstruction.objects.get(required_material='Hammer')
+
+        response = self.client.post(self.url, {'rules': [
+            {'id': rule['id'], 'event_rule': 'Bring tools', 'required_material': ['Hammer', 'Saw']},
+        ]}, format='json')
+        self.assertEqual([item['required_material'] for item in response.data[0]['instructions']], ['Hammer', 'Saw'])
+        self.assertTrue(ServiceRuleInstruction.objects.filter(pk=hammer.pk).exists())
+
+    def test_put_replaces_the_rule_set(self):
+        self.client.post(self.url, {'rules': [{'event_rule': 'Old', 'required_material': []}]}, format='json')
+        response = self.client.put(self.url, {'rules': [{'event_rule': 'New', 'required_material': []}]},
+                                   format='json')
+        self.assertEqual([rule['event_rule'] for rule in response.data], ['New'])
+
+    def test_replacing_rules_deletes_their_instructions(self):
+        self.client.post(self.url, {'rules': [
+            {'event_rule': 'Bring tools', 'required_material': ['Hammer', 'Nails', 'Saw']},
+        ]}, format='json')
+        self.client.put(self.url, {'rules': [{'event_rule': 'Shoes off', 'required_material': []}]}, format='json')
+        self.assertFalse(ServiceRuleInstruction.objects.filter(service_rule__service=self.service).exists())
+        self.assertFalse(self.service.material_tags.exists())
+
+    def test_rules_of_other_services_are_rejected(self):
+        other = Service.objects.filter(provider=self.providers[0]).last()
+        rule = ServiceRule.objects.create(service=other, event_rule='Other')
+        response = self.client.post(self.url, {'rules': [
+            {'id': str(rule.pk), 'event_rule': 'Hijacked', 'required_material': []},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ServiceScheduleTestCase(ServiceAPITestCase):
+
+    def setUp(self):
+        self.service = Service.objects.filter(provider=self.providers[0]).first()
+        self.url = reverse('services:services-api:provider-service-schedule', args=[self.service.pk])
+        self.client.force_authenticate(self.providers[0])
+
+    def slot(self, day, start, end, **extra):
+        return {'day_of_week': day, 'start_time': start, 'end_time': end, **extra}
+
+    def test_schedule_is_replaced_in_one_request(self):
+        monday = ServiceAvailability.objects.get(service=self.service, day_of_week='monday')
+        response = self.client.put(self.url, {'slots': [
+            self.slot('monday', '09:00', '12:00'),
+            self.slot('wednesday', '10:00', '14:00'),
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(slot['day_of_week'] for slot in response.data), ['monday', 'wednesday'])
+
+        monday.refresh_from_db()
+        self.assertEqual(str(monday.end_time), '12:00:00')
+        self.assertFalse(ServiceAvailability.objects.get(service=self.service, day_of_week='tuesday').is_active)
+
+    def test_overlapping_slots_are_rejected(self):
+        response = self.client.put(self.url, {'slots': [
+            self.slot('friday', '22:00', '02:00'),
+            self.slot('saturday', '01:00', '05:00'),
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_daily_slots_overlap_every_day(self):
+        response = self.client.put(self.url, {'slots': [
+            self.slot('monday', '09:00', '12:00', activity_type='recurring', repeat_type='daily'),
+            self.slot('thursday', '11:00', '13:00'),
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_schedule_write_rebuilds_availability_intervals(self):
+        self.client.put(self.url, {'slots': [self.slot('sunday', '10:00', '11:00')]}, format='json')
+        results = self.client.get(reverse('services:services-api:service-list'), {
+            'available_from': '2026-10-25T10:15:00Z', 'available_to': '2026-10-25T10:30:00Z'
+        }).data['results']
+        self.assertEqual([result['id'] for result in results], [str(self.service.pk)])
+
+
+class ServiceOccurrenceTestCase(ServiceAPITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.service = Service.objects.filter(provider=self.providers[0]).first()
+        # Monday 2026-10-19 08:00 UTC, the fixture slots run 09:00-17:00 UTC on Mondays and Tuesdays.
+        self.now = datetime(2026, 10, 19, 8, tzinfo=pytz.utc)
+
+    def test_slots_expand_into_utc_occurrences(self):
+        occurrences = get_service_occurrences(self.service, now=self.now, days=2)
+        self.assertEqual(occurrences, [
+            (datetime(2026, 10, 19, 9, tzinfo=pytz.utc), datetime(2026, 10, 19, 17, tzinfo=pytz.utc)),
+            (datetime(2026, 10, 20, 9, tzinfo=pytz.utc), datetime(2026, 10, 20, 17, tzinfo=pytz.utc)),
+        ])
+
+    def test_accepted_bookings_are_subtracted(self):
+        ServiceBookingRequest.objects.create(
+            user=self.providers[1], service=self.service, status='accepted',
+            start_datetime=datetime(2026, 10, 19, 12, tzinfo=pytz.utc),
+            end_datetime=datetime(2026, 10, 19, 13, tzinfo=pytz.utc),
+        )
+        occurrences = get_service_occurrences(self.service, now=self.now, days=1)
+        self.assertEqual(occurrences, [
+            (datetime(2026, 10, 19, 9, tzinfo=pytz.utc), datetime(2026, 10, 19, 12, tzinfo=pytz.utc)),
+            (datetime(2026, 10, 19, 13, tzinfo=pytz.utc), datetime(2026, 10, 19, 17, tzinfo=pytz.utc)),
+        ])
+
+    def test_slot_writes_invalidate_the_cached_occurrences(self):
+        get_service_occurrences(self.service, now=self.now, days=1)
+        ServiceAvailability.objects.filter(service=self.service, day_of_week='monday').get().delete()
+        self.assertEqual(get_service_occurrences(self.service, now=self.now, days=1), [])
+
+    def test_next_available_slots_api(self):
+        url = reverse('services:services-api:service-availability', args=[self.service.pk])
+        response = self.client.get(url, {'days': 7, 'duration': 60})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['slots'])
+        for slot in response.data['slots']:
+            self.assertGreaterEqual(slot['end'] - slot['start'], timedelta(minutes=60))
+
+
+class ServiceFacetTestCase(ServiceAPITestCase):
+
+    def setUp(self):
+        cache.clear()
+        online = Service.objects.filter(provider=self.providers[0])[:2]
+        Service.objects.filter(pk__in=[service.pk for service in online]).update(
+            service_type='online', price=60, effective_price=60, base_price=60
+        )
+
+    def test_facets_come_with_the_page(self):
+        url = reverse('services:services-api:service-list')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'facets': 1, 'page_size': 2})
+        self.assertLessEqual(len(context.captured_queries), QUERY_BUDGETS['service-list'] + 3)
+
+        facets = response.data['facets']
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(facets['category'][0]['label'], 'Cleaning')
+        self.assertEqual(facets['category'][0]['count'], 12)
+        self.assertEqual({row['value']: row['count'] for row in facets['service_type']}, {'onside': 10, 'online': 2})
+        self.assertEqual({row['value']: row['count'] for row in facets['price']}, {'0-25': 10, '50-100': 2})
+
+    def test_facets_follow_the_filters(self):
+        url = reverse('services:services-api:service-list')
+        facets = self.client.get(url, {'facets': 1, 'service_type': 'online'}).data['facets']
+        self.assertEqual(facets['service_type'], [{'value': 'online', 'label': 'Online', 'count': 2}])
+        self.assertNotIn('facets', self.client.get(url).data)
+
+
+class ServicePriceTestCase(ServiceAPITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.euro = ServiceCurrency.objects.create(name='Euro', code='EUR', symbol='€', exchange_rate=2)
+        self.service = Service.objects.filter(provider=self.providers[0]).first()
+        self.service.currency, self.service.discount = self.euro, 50
+        self.service.save()
+
+    def test_prices_follow_price_discount_and_rate(self):
+        self.service.refresh_from_db()
+        self.assertEqual(self.service.effective_price, 5)
+        self.assertEqual(self.service.base_price, 10)
+
+        self.euro.exchange_rate = 3
+        self.euro.save()
+        self.service.refresh_from_db()
+        self.assertEqual(self.service.base_price, 15)
+
+    def test_price_range_and_ordering(self):
+        url = reverse('services:services-api:service-list')
+        self.euro.exchange_rate = 3
+        self.euro.save()
+        results = self.client.get(url, {'min_price': 12}).data['results']
+        self.assertEqual([result['id'] for result in results], [str(self.service.pk)])
+
+        results = self.client.get(url, {'ordering': '-price', 'max_price': 20}).data['results']
+        self.assertEqual(results[0]['id'], str(self.service.pk))
+        self.assertEqual(len(results), 12)
+
+    def test_prices_of_int_and_float_values(self):
+        service = Service.objects.create(
+            provider=self.providers[1], title='Windows', price=Decimal('12.50'), number_of_people=1
+        )
+        self.assertEqual(service.effective_price, Decimal('12.50'))
+
+        service.price, service.discount = 20, 12.5
+        service.save()
+        self.assertEqual(service.effective_price, Decimal('17.50'))
+
+
+class ServiceRatingTestCase(ServiceAPITestCase):
+
+    def setUp(self):
+        self.service, self.other = Service.objects.filter(provider=self.providers[0])[:2]
+        self.reviewers = [
+            User.objects.create(username=f'reviewer{index}', email=f'reviewer{index}@example.com',
+                                phone_number=f'+1415555030{index}')
+            for index in range(3)
+        ]
+
+    def review(self, reviewer, rating):
+        return ServiceReview.objects.create(service=self.service, reviewer=reviewer, rating=rating)
+
+    def aggregates(self, service):
+        service.refresh_from_db()
+        return service.rating_sum, service.rating_count, service.rating_avg
+
+    def test_review_writes_maintain_the_aggregates(self):
+        first = self.review(self.reviewers[0], 5)
+        second = self.review(self.reviewers[1], 2)
+        self.assertEqual(self.aggregates(self.service), (7, 2, Decimal('3.50')))
+        self.assertEqual(self.service.rating_histogram['5'], 1)
+
+        second.rating = 4
+        second.save()
+        self.assertEqual(self.aggregates(self.service), (9, 2, Decimal('4.50')))
+
+        first.is_active = False
+        first.save()
+        self.assertEqual(self.aggregates(self.service), (4, 1, Decimal('4.00')))
+
+        second.service = self.other
+        second.save()
+        self.assertEqual(self.aggregates(self.service), (0, 0, Decimal('0.00')))
+        self.assertEqual(self.aggregates(self.other), (4, 1, Decimal('4.00')))
+
+        second.delete()
+        self.assertEqual(self.aggregates(self.other), (0, 0, Decimal('0.00')))
+
+    def test_rebuild_matches_the_incremental_aggregates(self):
+        for reviewer, rating in zip(self.reviewers, (1, 3, 5)):
+            self.review(reviewer, rating)
+        incremental = self.aggregates(self.service)
+        Service.objects.filter(pk=self.service.pk).update(rating_sum=0, rating_count=0, rating_avg=0)
+        rebuild_service_ratings()
+        self.assertEqual(self.aggregates(self.service), incremental)
+
+    def test_edits_keep_the_aggregates_written_meanwhile(self):
+        stale = Service.objects.get(pk=self.service.pk)
+        self.review(self.reviewers[0], 5)
+        stale.description = 'Edited'
+        stale.save_edits()
+        self.assertEqual(self.aggregates(self.service), (5, 1, Decimal('5.00')))
+
+    def test_a_failed_rating_update_rolls_back_the_review(self):
+        with mock.patch('src.services.services.signals.apply_service_rating_change', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.review(self.reviewers[0], 5)
+        self.assertFalse(ServiceReview.objects.exists())
+
+
+class RecommendationTestCase(ServiceAPITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.services = list(Service.objects.filter(provider=self.providers[0]).order_by('title'))
+        self.customers = [
+            User.objects.create(username=f'customer{index}', email=f'customer{index}@example.com',
+                                phone_number=f'+1415555020{index}')
+            for index in range(3)
+        ]
+        # Every customer favorites the first service, two of them the second one and the other one the third.
+        for customer in self.customers:
+            FavoriteService.objects.create(user=customer, service=self.services[0])
+        for customer in self.customers[1:]:
+            FavoriteService.objects.create(user=customer, service=self.services[1])
+        FavoriteService.objects.create(user=self.customers[0], service=self.services[2])
+
+    def test_neighbours_are_ranked_by_similarity(self):
+        build_service_neighbours(full=True)
+        neighbours = list(
+            ServiceNeighbour.objects.filter(service=self.services[0]).order_by('-score')
+            .values_list('neighbour_id', flat=True)
+        )
+        self.assertEqual(neighbours, [self.services[1].pk, self.services[2].pk])
+
+    def test_for_you_comes_from_the_neighbours_of_the_user_favorites(self):
+        build_service_neighbours(full=True)
+        reader = User.objects.create(username='reader', email='reader@example.com', phone_number='+14155550300')
+        FavoriteService.objects.create(user=reader, service=self.services[2])
+        self.assertEqual(get_recommended_service_ids(reader)[0], self.services[0].pk)
+
+        self.client.force_authenticate(reader)
+        for_you = self.client.get(reverse('api:v1:home')).json()['for_you']
+        self.assertNotIn(str(self.services[2].pk), [service['id'] for service in for_you])
+        self.assertEqual(for_you[0]['id'], str(self.services[0].pk))
+
+    def test_incremental_build_only_recomputes_touched_services(self):
+        build_service_neighbours(full=True)
+        FavoriteService.objects.create(user=self.customers[1], service=self.services[3])
+        self.assertEqual(build_service_neighbours(), 3)
+
+
+class ServiceScoreTestCase(ServiceAPITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.single, self.many, self.poor = Service.objects.filter(provider=self.providers[0]).order_by('title')[:3]
+        reviewers = [
+            User.objects.create(username=f'reviewer{index}', email=f'reviewer{index}@example.com',
+                                phone_number=f'+1415555040{index}')
+            for index in range(5)
+        ]
+        ServiceReview.objects.create(service=self.single, reviewer=reviewers[0], rating=5)
+        for reviewer, rating in zip(reviewers, (4, 5, 5, 5, 5)):
+            ServiceReview.objects.create(service=self.many, reviewer=reviewer, rating=rating)
+        for reviewer in reviewers[:3]:
+            ServiceReview.objects.create(service=self.poor, reviewer=reviewer, rating=2)
+
+    def test_many_reviews_outrank_a_single_one(self):
+        update_service_scores()
+        self.single.refresh_from_db()
+        self.many.refresh_from_db()
+        self.assertGreater(self.single.rating_avg, self.many.rating_avg)
+        self.assertGreater(self.many.rating_score, self.single.rating_score)
+
+    def test_recent_activity_counts_more(self):
+        update_service_scores()
+        self.poor.refresh_from_db()
+        quiet_rank = self.poor.rank_score
+        FavoriteService.objects.create(user=self.providers[1], service=self.poor)
+        update_service_scores()
+        self.poor.refresh_from_db()
+        self.assertGreater(self.poor.rank_score, quiet_rank)
+        self.assertAlmostEqual(self.poor.popularity_score, 1.0)
+
+        update_service_scores(now=self.poor.created_at + timedelta(days=30))
+        self.poor.refresh_from_db()
+        self.assertAlmostEqual(self.poor.popularity_score, 0.5, places=1)
+
+    def test_popular_ordering_reads_the_rank(self):
+        update_service_scores()
+        url = reverse('services:services-api:service-list')
+        results = self.client.get(url, {'ordering': '-popular'}).data['results']
+        self.assertEqual(results[0]['id'], str(self.many.pk))
+        results = self.client.get(url, {'ordering': 'popular'}).data['results']
+        self.assertNotEqual(results[0]['id'], str(self.many.pk))
+
+    def test_new_services_start_at_the_average_rating(self):
+        update_service_scores()
+        service = Service.objects.create(provider=self.providers[1], title='New', price=10, number_of_people=1)
+        self.assertGreater(service.rank_score, 0)
+        self.assertEqual(Service.objects.get(pk=service.pk).rank_score, service.rank_score)
+        self.poor.refresh_from_db()
+        self.assertGreater(service.rank_score, self.poor.rank_score)
+
+
+class TypeaheadTestCase(ServiceAPITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('services:services-api:service-autocomplete')
+        self.service = Service.objects.filter(provider=self.providers[0]).first()
+
+    def suggest(self, query, **params):
+        return [(row['type'], row['label']) for row in self.client.get(self.url, {'q': query, **params}).data]
+
+    def test_prefix_matches_any_word(self):
+        self.assertEqual(self.suggest('clean', types='category'), [('category', 'Cleaning')])
+        self.assertEqual(len(self.suggest('serv')), 8)
+        self.assertEqual(len(self.suggest('serv', limit=3)), 3)
+        self.assertEqual(self.suggest('xyz'), [])
+
+    def test_writes_patch_the_index(self):
+        self.suggest('serv')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.title = 'Deep window cleaning'
+            self.service.save()
+        self.assertEqual(self.suggest('wind'), [('service', 'Deep window cleaning')])
+        self.assertEqual(self.suggest('clean')[0], ('category', 'Cleaning'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.is_active = False
+            self.service.save()
+        self.assertEqual(self.suggest('wind'), [])
+
+    def test_kinds_are_not_crowded_out_by_other_kinds(self):
+        Service.objects.bulk_create([
+            Service(provider=self.providers[1], title=f'Cleaner {index}', slug=f'cleaner-{index}', price=10,
+                    number_of_people=1)
+            for index in range(TYPEAHEAD_SCAN_FACTOR * 10)
+        ])
+        # Every 'cleaner ...' key sorts before 'cleaning'
+        self.assertEqual(self.suggest('clean', types='category'), [('category', 'Cleaning')])
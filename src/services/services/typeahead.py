@@ -0,0 +1,169 @@
+import threading
+from bisect import bisect_left, insort
+
+from django.core.cache import cache
+from django.db import transaction
+
+from src.core.cache import bump_cache_version, get_cache_version
+from src.services.services.models import MaterialTag, Service, ServiceCategory, ServiceLocation
+from src.services.services.search import tokenize
+
+TYPEAHEAD_CACHE = 'typeahead'
+TYPEAHEAD_KINDS = ('service', 'category', 'city', 'material')
+TYPEAHEAD_MAX_CHANGES = 500
+TYPEAHEAD_CHANGE_TIMEOUT = 60 * 60
+TYPEAHEAD_SCAN_FACTOR = 10
+
+_typeahead_index = None
+_typeahead_lock = threading.Lock()
+
+""" ---------------------Index--------------------- """
+
+
+def get_typeahead_keys(label):
+    """One key per word start, e.g. 'Deep Window Cleaning' -> 'deep window cleaning', 'window cleaning', 'cleaning'"""
+    tokens = tokenize(label)
+    return [' '.join(tokens[start:]) for start in range(len(tokens))]
+
+
+def load_typeahead_items(kind, ids=None):
+    """{id: label} of the suggestions of a kind, only the given ids when set. Cities are their own id."""
+    if kind == 'city':
+        cities = (
+            ServiceLocation.objects.filter(is_active=True).exclude(city__isnull=True).exclude(city='')
+            .order_by().values_list('city', flat=True).distinct()
+        )
+        return {city: city for city in cities}
+
+    queryset, field = {
+        'service': (Service.objects.filter(is_active=True), 'title'),
+        'category': (ServiceCategory.objects.filter(is_active=True), 'name'),
+        'material': (MaterialTag.objects.all(), 'label'),
+    }[kind]
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    return {str(pk): label for pk, label in queryset.values_list('pk', field)}
+
+
+class TypeaheadIndex:
+    """
+    Sorted array of (key, word position, id, label) per kind, searched by prefix with bisect. Changes build a new
+    index from a copy of the array of the changed kind, so a request reading the current one never sees it half
+    updated.
+    """
+
+    def __init__(self, version, items, entries=None):
+        self.version = version
+        self.items = items
+        if entries is None:
+            entries = {
+                kind: sorted(
+                    (key, position, item_id, label) for item_id, label in labels.items()
+                    for position, key in enumerate(get_typeahead_keys(label))
+                )
+                for kind, labels in items.items()
+            }
+        self.entries = entries
+
+    def replace(self, version, kind, labels, ids=None):
+        """A new index where the items `ids` of a kind (all of them when None) are replaced by `labels`"""
+        items = {**self.items, kind: dict(self.items[kind])}
+        kind_entries = list(self.entries[kind])
+        for item_id in (list(items[kind]) if ids is None else ids):
+            label = items[kind].pop(item_id, None)
+            if label is None:
+                continue
+            for position, key in enumerate(get_typeahead_keys(label)):
+                index = bisect_left(kind_entries, (key, position, item_id))
+                if index < len(kind_entries) and kind_entries[index][:3] == (key, position, item_id):
+                    del kind_entries[index]
+
+        for item_id, label in labels.items():
+            items[kind][item_id] = label
+            for position, key in enumerate(get_typeahead_keys(label)):
+                insort(kind_entries, (key, position, item_id, label))
+        return TypeaheadIndex(version, items, {**self.entries, kind: kind_entries})
+
+    def search(self, query, limit=8, kinds=TYPEAHEAD_KINDS):
+        """
+        Up to `limit` suggestions whose label has a word starting with the query. Labels starting with it come first,
+        then services, categories, cities and materials, shorter labels first. Each requested kind is scanned on its
+        own array, so other kinds sorting before it can't crowd its matches out of the scan window.
+        """
+        prefix = ' '.join(tokenize(query))
+        if not prefix:
+            return []
+
+        matches = {}
+        for kind in kinds:
+            entries = self.entries.get(kind, [])
+            start = bisect_left(entries, (prefix,))
+            for key, position, item_id, label in entries[start:start + limit * TYPEAHEAD_SCAN_FACTOR]:
+                if not key.startswith(prefix):
+                    break
+                if position < matches.get((kind, item_id), (position + 1,))[0]:
+                    matches[(kind, item_id)] = (position, label)
+
+        ranked = sorted(
+            matches.items(),
+            key=lambda match: (match[1][0] > 0, TYPEAHEAD_KINDS.index(match[0][0]), len(match[1][1]), match[1][1])
+        )
+        return [{'type': kind, 'id': item_id, 'label': label} for (kind, item_id), (_, label) in ranked[:limit]]
+
+
+""" ---------------------Loading and Changes--------------------- """
+
+
+def get_typeahead_index():
+    """
+    The index of this process, brought up to date with the shared change log: each write bumps the generation and
+    logs what changed under the new number, so an index a few generations behind reloads only those items. A gap
+    in the log (expired or evicted) falls back to a full load.
+    """
+    global _typeahead_index
+    version = get_cache_version(TYPEAHEAD_CACHE)
+    index = _typeahead_index
+    if index is not None and index.version == version:
+        return index
+
+    with _typeahead_lock:
+        index = _typeahead_index
+        if index is not None and index.version == version:
+            return index
+
+        if index is not None and 0 < version - index.version <= TYPEAHEAD_MAX_CHANGES:
+            keys = [f'typeahead:change:{number}' for number in range(index.version + 1, version + 1)]
+            changes = cache.get_many(keys)
+            if len(changes) == len(keys):
+                changed = {}
+                for kind, ids in changes.values():
+                    if ids is None or changed.get(kind, ()) is None:
+                        changed[kind] = None
+                    else:
+                        changed[kind] = {*changed.get(kind, ()), *ids}
+                for kind, ids in changed.items():
+                    index = index.replace(version, kind, load_typeahead_items(kind, ids), ids)
+                _typeahead_index = index
+                return index
+
+        _typeahead_index = TypeaheadIndex(version, {kind: load_typeahead_items(kind) for kind in TYPEAHEAD_KINDS})
+        return _typeahead_index
+
+
+def log_typeahead_change(kind, ids):
+    number = bump_cache_version(TYPEAHEAD_CACHE)
+    cache.set(f'typeahead:change:{number}', (kind, ids), TYPEAHEAD_CHANGE_TIMEOUT)
+
+
+def record_typeahead_change(kind, ids=None):
+    """
+    Logs that the items `ids` of a kind (all of them when None) changed. Logged again on commit, so other processes
+    don't keep what they reloaded before the commit.
+    """
+    ids = None if ids is None else [str(item_id) for item_id in ids]
+    log_typeahead_change(kind, ids)
+    transaction.on_commit(lambda: log_typeahead_change(kind, ids))
+
+
+def search_typeahead(query, limit=8, kinds=TYPEAHEAD_KINDS):
+    return get_typeahead_index().search(query, limit=limit, kinds=kinds)
@@ -0,0 +1,87 @@
+import html
+import unicodedata
+from datetime import datetime, timedelta
+
+import pytz
+from django.core.exceptions import ValidationError
+from django.utils.html import strip_tags
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+WEEK_DAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+""" ---------------------Week Minute Helpers--------------------- """
+
+
+def validate_timezone(name):
+    if name not in pytz.all_timezones_set:
+        raise ValidationError(f"Unknown timezone: {name}.")
+
+
+def get_timezone(name):
+    """The tzinfo of a stored timezone name, names are validated on write and unknown ones read as UTC"""
+    try:
+        return pytz.timezone(name or 'UTC')
+    except pytz.UnknownTimeZoneError:
+        return pytz.utc
+
+
+def utc_minute_of_week(moment):
+    """Minutes since Monday 00:00 UTC of the week the moment falls in"""
+    moment = moment.astimezone(pytz.utc)
+    return moment.weekday() * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+
+
+def split_week_interval(start, length):
+    """Splits an interval starting at a minute of the week at the week boundary, as [(start, end)]"""
+    if length >= MINUTES_PER_WEEK:
+        return [(0, MINUTES_PER_WEEK)]
+    start %= MINUTES_PER_WEEK
+    end = start + length
+    if end <= MINUTES_PER_WEEK:
+        return [(start, end)]
+    return [(start, MINUTES_PER_WEEK), (0, end - MINUTES_PER_WEEK)]
+
+
+def local_slot_to_utc_intervals(day_of_week, start_time, end_time, timezone_name, reference_date=None):
+    """
+    Converts a weekly local slot (day, start, end, timezone) into UTC minute-of-week intervals.
+    A slot ending at or before its start runs overnight. The UTC offset is the one in effect on the slot's day of the
+    reference week (the current one by default), so DST shifts are picked up whenever the intervals are rebuilt.
+    """
+    timezone = get_timezone(timezone_name)
+    reference_date = reference_date or datetime.now(timezone).date()
+    day = reference_date - timedelta(days=reference_date.weekday()) + timedelta(days=WEEK_DAYS.index(day_of_week))
+
+    start = timezone.localize(datetime.combine(day, start_time))
+    length = (end_time.hour * 60 + end_time.minute) - (start_time.hour * 60 + start_time.minute)
+    if length <= 0:
+        length += MINUTES_PER_DAY
+    return split_week_interval(utc_minute_of_week(start), length)
+
+
+def datetime_range_to_utc_intervals(start, end):
+    """Converts an aware datetime range into UTC minute-of-week intervals"""
+    length = int((end - start).total_seconds() // 60)
+    if length <= 0:
+        return []
+    return split_week_interval(utc_minute_of_week(start), length)
+
+
+""" ---------------------Text Helpers--------------------- """
+
+
+def normalize_text(text):
+    """Strips markup and accents and lowercases, so stored and queried text share one vocabulary"""
+    text = html.unescape(strip_tags(text or ''))
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in text if not unicodedata.combining(char)).lower()
+
+
+def normalize_tag_name(name):
+    """Material tag key: normalized text with whitespace collapsed, e.g. ' Paint  Brushes ' -> 'paint brushes'"""
+    return ' '.join(normalize_text(name).split())
+
@@ -10,6 +10,7 @@ from ..users.models import User
 
 class ServicesListView(ListView):
     model = Service
+    ordering = ['-rank_score', 'id']
 
     def get_context_data(self, **kwargs):
         context = super(ServicesListView, self).get_context_data(**kwargs)
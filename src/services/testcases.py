@@ -0,0 +1,33 @@
+from datetime import time
+
+from rest_framework.test import APITestCase
+
+from src.services.services.models import Service, ServiceAvailability, ServiceCategory, ServiceCurrency, ServiceImage
+from src.services.users.models import User
+
+
+class ServiceAPITestCase(APITestCase):
+    """Two providers with `services_per_provider` services each, every service with images and availabilities"""
+    services_per_provider = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        category = ServiceCategory.objects.create(name='Cleaning')
+        currency = ServiceCurrency.objects.create(name='US Dollar', code='USD', symbol='$')
+        cls.providers = [
+            User.objects.create(username=f'provider{index}', email=f'provider{index}@example.com',
+                                phone_number=f'+1415555010{index}', user_type='service_provider')
+            for index in range(2)
+        ]
+        for provider in cls.providers:
+            for index in range(cls.services_per_provider):
+                service = Service.objects.create(
+                    provider=provider, title=f'Service {index}', category=category, currency=currency,
+                    price=10, number_of_people=1
+                )
+                ServiceImage.objects.create(service=service, image='services/images/image.png')
+                ServiceImage.objects.create(service=service, image='services/images/hidden.png', is_active=False)
+                for day in ('monday', 'tuesday'):
+                    ServiceAvailability.objects.create(
+                        service=service, day_of_week=day, start_time=time(9), end_time=time(17)
+                    )
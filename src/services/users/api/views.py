@@ -6,6 +6,8 @@ from rest_framework.generics import UpdateAPIView, CreateAPIView, RetrieveUpdate
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 
+from src.core.pagination import CreatedAtCursorPagination
+from src.services.services.api.serializers import ServiceSerializer
 from src.services.services.models import FavoriteService
 from src.services.users.api.serializers import UserSerializer, UserImageSerializer, UserAddressSerializer, \
     ServiceProviderDetailSerializer, ServiceProviderSerializer, SocialMediaSerializer, InterestSerializer, \
@@ -258,6 +260,7 @@ class FavoriteServiceListCreateAPIView(ListCreateAPIView):
     queryset = FavoriteService.objects.all()
     serializer_class = FavoriteServiceSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -265,7 +268,8 @@ class FavoriteServiceListCreateAPIView(ListCreateAPIView):
         return FavoriteServiceCreateSerializer
 
     def get_queryset(self):
-        return FavoriteService.objects.filter(user=self.request.user)
+        queryset = FavoriteService.objects.filter(user=self.request.user).select_related('service')
+        return ServiceSerializer.setup_eager_loading(queryset, prefix='service__')
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)